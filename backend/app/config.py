@@ -7,12 +7,57 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "postgresql://xinyutian:xinyutian@db:5432/xinyutian"
+    db_pool_min_size: int = 2
+    db_pool_max_size: int = 10
+    db_pool_max_queries: int = 50000
+    db_pool_max_inactive_lifetime: float = 300.0
+    db_pool_acquire_timeout: float = 10.0
+    db_statement_cache_size: int = 500  # per connection; must hold every registered statement
+    db_statement_timeout_ms: int = 0  # 0 disables the server-side timeout
+    db_application_name: str = "xinyutian-backend"
+    db_slow_query_ms: float = 200.0
+    db_slow_query_explain: bool = False  # capture EXPLAIN (ANALYZE, BUFFERS) for slow read-only statements
+    
+    # Optional streaming read replica
+    database_replica_url: Optional[str] = None
+    db_replica_max_lag_seconds: float = 5.0
+    db_replica_lag_check_seconds: float = 2.0
+    db_read_your_writes_seconds: float = 5.0
     
     # JWT
     jwt_secret_key: str = "your-secret-key-change-in-production"
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 60
     jwt_refresh_expire_days: int = 7
+    jwt_backend: str = "jose"  # jose or pyjwt
+    token_cache_size: int = 10000
+    
+    # Authenticated principal cache (per worker)
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: int = 30
+    token_version_refresh_seconds: int = 10
+    
+    # Password hashing worker pool
+    password_hash_workers: int = 2
+    password_hash_max_queue: int = 32
+    
+    # List totals cache (count="cached")
+    list_count_cache_size: int = 1000
+    list_count_cache_ttl_seconds: float = 10.0
+    
+    # Product catalog mirror (per worker)
+    catalog_mirror: bool = True
+    catalog_refresh_seconds: float = 2.0  # how stale other workers' product writes may appear
+    
+    # Orders
+    business_timezone: str = "UTC"  # day boundary for ORD{YYYYMMDD}{NNN} numbers
+    order_number_block_size: int = 20
+    idempotency_key_ttl_seconds: int = 86400  # how long Idempotency-Key responses are replayed
+    idempotency_cache_size: int = 10000
+    order_partition_months_ahead: int = 3  # monthly partitions created ahead of time
+    order_events_buffer_size: int = 1000  # recent events kept for Last-Event-ID resume
+    order_events_queue_size: int = 100  # per subscriber; a subscriber this far behind is dropped
+    order_events_heartbeat_seconds: float = 15.0
     
     # AWS S3
     aws_access_key_id: Optional[str] = None
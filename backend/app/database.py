@@ -1,60 +1,437 @@
+import asyncio
+import json
+import logging
+import time
 import asyncpg
-from typing import Optional
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Union
 from contextlib import asynccontextmanager
+from decimal import Decimal
 
 from app.config import settings
+from app.metrics import Histogram
+from app.query_stats import QueryStats, row_count
+from app.statements import Statement, statements
+
+
+logger = logging.getLogger("app.database")
+
+# Identity of the caller (e.g. user id) used for read-your-writes stickiness.
+# Set by the authentication dependency for the duration of a request.
+session_key: ContextVar[Optional[Hashable]] = ContextVar("session_key", default=None)
+
+# Reports 0 lag when the replica has replayed everything it received, so an
+# idle primary is not mistaken for a lagging replica.
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::float8
+"""
+
+# A statement fails to prepare with these before migrations have run
+UNMIGRATED_ERRORS = (
+    asyncpg.UndefinedTableError,
+    asyncpg.UndefinedColumnError,
+    asyncpg.UndefinedFunctionError,
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class PreparedConnection(asyncpg.Connection):
+    """Connection that tracks what its statement cache holds.
+    
+    asyncpg keeps up to `statement_cache_size` prepared statements per
+    connection, across releases to the pool, and evicts the least recently
+    used. `cached` follows the same policy for every query run through
+    Database, so a statement evicted by others is reported as a miss when it
+    is prepared again. asyncpg's own type introspection queries take a few
+    more slots.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cached: OrderedDict = OrderedDict()
+    
+    def note_cached(self, sql: str) -> bool:
+        """Record a query run through the statement cache; whether it was cached."""
+        if sql in self.cached:
+            self.cached.move_to_end(sql)
+            return True
+        self.cached[sql] = None
+        if len(self.cached) > settings.db_statement_cache_size:
+            self.cached.popitem(last=False)
+        return False
+
+
+class Transaction:
+    """Statements issued on one primary connection inside a transaction."""
+    
+    def __init__(self, database: "Database", conn: asyncpg.Connection):
+        self._db = database
+        self._conn = conn
+    
+    async def execute(self, query: Union[str, Statement], *args):
+        """Execute a query."""
+        return await self._db._timed(self._conn, "execute", query, args, False)
+    
+    async def fetch(self, query: Union[str, Statement], *args):
+        """Fetch multiple rows."""
+        return await self._db._timed(self._conn, "fetch", query, args, False)
+    
+    async def fetchrow(self, query: Union[str, Statement], *args):
+        """Fetch a single row."""
+        return await self._db._timed(self._conn, "fetchrow", query, args, False)
+    
+    async def fetchval(self, query: Union[str, Statement], *args):
+        """Fetch a single value."""
+        return await self._db._timed(self._conn, "fetchval", query, args, False)
 
 
 class Database:
-    """Database connection pool manager."""
+    """Database connection pool manager.
+    
+    Holds the primary pool and an optional read replica pool. Queries go to
+    the primary unless the caller marks them replica-safe with
+    ``replica=True``; those are routed to the replica while it is healthy,
+    within the lag budget, and the current session has not written recently.
+    """
     
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        self.replica_pool: Optional[asyncpg.Pool] = None
+        self._init_hooks: List[Callable[[asyncpg.Connection], Awaitable[None]]] = []
+        self.acquire_wait = Histogram()
+        self.acquires = 0
+        self.acquire_timeouts = 0
+        
+        # Replica routing state
+        self.replica_lag: Optional[float] = None
+        self.replica_healthy = False
+        self.replica_reads = 0
+        self.replica_fallbacks = 0
+        self._last_writes: Dict[Hashable, float] = {}
+        self._lag_task: Optional[asyncio.Task] = None
+        
+        # Statement instrumentation
+        self.query_stats = QueryStats(slow_query_ms=settings.db_slow_query_ms)
+        self._plan_tasks: set = set()
+        self.prepared_hits = 0
+        self.prepared_misses = 0
+        self.adhoc_calls = 0
+        
+        # Codecs must be in place before statements are prepared
+        self.add_init_hook(self._set_type_codecs)
+        self.add_init_hook(self._prepare_statements)
+    
+    def add_init_hook(self, hook: Callable[[asyncpg.Connection], Awaitable[None]]):
+        """Register a coroutine run on every new pooled connection."""
+        self._init_hooks.append(hook)
+    
+    async def _init_connection(self, conn: asyncpg.Connection):
+        """Per-connection initialization."""
+        for hook in self._init_hooks:
+            await hook(conn)
+    
+    async def _set_type_codecs(self, conn: asyncpg.Connection):
+        """Decode json/jsonb values (e.g. aggregated rows) into Python objects."""
+        for type_name in ("json", "jsonb"):
+            await conn.set_type_codec(
+                type_name,
+                encoder=json.dumps,
+                decoder=lambda value: json.loads(value, parse_float=Decimal),
+                schema="pg_catalog",
+            )
+    
+    async def _prepare_statements(self, conn: PreparedConnection):
+        """Prepare every registered statement on a new connection.
+        
+        An executemany() without arguments prepares a statement into the
+        statement cache without running it. Preparing can leave the
+        protocol's implicit transaction open, holding locks on the
+        statements' tables until the connection is next used and blocking DDL
+        such as creating partitions; the explicit transaction releases them.
+        Statements that fail before migrations have run are prepared on first
+        use instead.
+        """
+        pending = iter(statements)
+        skipped = 0
+        while True:
+            try:
+                async with conn.transaction():
+                    for statement in pending:
+                        await conn.executemany(statement.sql, [])
+                        conn.note_cached(statement.sql)
+                break
+            except UNMIGRATED_ERRORS:
+                # The failure aborted the transaction; go on in a new one
+                skipped += 1
+        if skipped:
+            logger.warning("%d statements not prepared; database not migrated?", skipped)
+    
+    async def _create_pool(self, dsn: str) -> asyncpg.Pool:
+        server_settings = {"application_name": settings.db_application_name}
+        if settings.db_statement_timeout_ms:
+            server_settings["statement_timeout"] = str(settings.db_statement_timeout_ms)
+        
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=settings.db_pool_min_size,
+            max_size=settings.db_pool_max_size,
+            max_queries=settings.db_pool_max_queries,
+            max_inactive_connection_lifetime=settings.db_pool_max_inactive_lifetime,
+            statement_cache_size=settings.db_statement_cache_size,
+            max_cached_statement_lifetime=0,
+            server_settings=server_settings,
+            init=self._init_connection,
+            connection_class=PreparedConnection,
+        )
     
     async def connect(self):
-        """Create connection pool."""
+        """Create connection pools."""
         if self.pool is None:
-            self.pool = await asyncpg.create_pool(
-                settings.database_url,
-                min_size=2,
-                max_size=10,
-            )
+            self.pool = await self._create_pool(settings.database_url)
+        
+        if settings.database_replica_url and self.replica_pool is None:
+            self.replica_pool = await self._create_pool(settings.database_replica_url)
+            await self._check_replica_lag()
+            self._lag_task = asyncio.create_task(self._monitor_replica_lag())
+    
+    async def dedicated_connection(self) -> asyncpg.Connection:
+        """Open a primary connection outside the pool (e.g. for LISTEN); the caller closes it."""
+        return await asyncpg.connect(
+            settings.database_url,
+            server_settings={"application_name": settings.db_application_name},
+        )
     
     async def disconnect(self):
-        """Close connection pool."""
+        """Close connection pools."""
+        if self._lag_task:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self.replica_pool:
+            await self.replica_pool.close()
+            self.replica_pool = None
         if self.pool:
             await self.pool.close()
             self.pool = None
     
+    async def _check_replica_lag(self):
+        """Measure replica lag and decide whether reads may use it."""
+        try:
+            async with self.replica_pool.acquire(timeout=settings.db_pool_acquire_timeout) as conn:
+                self.replica_lag = await conn.fetchval(REPLICA_LAG_QUERY)
+            self.replica_healthy = self.replica_lag <= settings.db_replica_max_lag_seconds
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError):
+            self.replica_lag = None
+            self.replica_healthy = False
+    
+    async def _monitor_replica_lag(self):
+        while True:
+            await asyncio.sleep(settings.db_replica_lag_check_seconds)
+            await self._check_replica_lag()
+    
+    def _record_write(self):
+        """Pin the current session to the primary for the stickiness window."""
+        key = session_key.get()
+        if key is None or self.replica_pool is None:
+            return
+        now = time.monotonic()
+        self._last_writes[key] = now
+        if len(self._last_writes) > 10000:
+            cutoff = now - settings.db_read_your_writes_seconds
+            self._last_writes = {k: t for k, t in self._last_writes.items() if t > cutoff}
+    
+    def _use_replica(self) -> bool:
+        if self.replica_pool is None or not self.replica_healthy:
+            return False
+        key = session_key.get()
+        if key is not None:
+            last_write = self._last_writes.get(key)
+            if last_write and time.monotonic() - last_write < settings.db_read_your_writes_seconds:
+                return False
+        return True
+    
     @asynccontextmanager
-    async def connection(self):
-        """Get a connection from the pool."""
+    async def connection(self, replica: bool = False):
+        """Get a connection from the pool (the replica pool if replica-safe and usable)."""
         if self.pool is None:
             raise RuntimeError("Database not connected")
-        async with self.pool.acquire() as conn:
+        
+        pool = self.replica_pool if replica and self._use_replica() else self.pool
+        started = time.perf_counter()
+        try:
+            conn = await pool.acquire(timeout=settings.db_pool_acquire_timeout)
+        except asyncio.TimeoutError:
+            self.acquire_timeouts += 1
+            raise PoolTimeout("Timed out waiting for a database connection")
+        self.acquires += 1
+        self.acquire_wait.observe(time.perf_counter() - started)
+        
+        try:
             yield conn
+        finally:
+            await pool.release(conn)
     
-    async def execute(self, query: str, *args):
-        """Execute a query."""
+    def _count_prepared(self, conn, method: str, query: Union[str, Statement], args: tuple):
+        sql = query.sql if isinstance(query, Statement) else query
+        if method == "execute" and not args:
+            # Sent over the simple query protocol, never prepared
+            self.adhoc_calls += 1
+            return
+        cached = conn.note_cached(sql)
+        if not isinstance(query, Statement):
+            self.adhoc_calls += 1
+        elif cached:
+            self.prepared_hits += 1
+        else:
+            self.prepared_misses += 1
+    
+    async def _call(self, conn, method: str, query: Union[str, Statement], args: tuple):
+        self._count_prepared(conn, method, query, args)
+        sql = query.sql if isinstance(query, Statement) else query
+        return await getattr(conn, method)(sql, *args)
+    
+    async def _timed(self, conn, method: str, query: Union[str, Statement], args: tuple, replica: bool):
+        """Run a statement on a connection and record its timing."""
+        started = time.perf_counter()
+        result = await self._call(conn, method, query, args)
+        elapsed = time.perf_counter() - started
+        
+        # EXPLAIN ANALYZE executes the statement again, so plans are only
+        # captured for statements registered as read-only
+        explain = isinstance(query, Statement) and query.read_only
+        if isinstance(query, Statement):
+            query = query.sql
+        slow = self.query_stats.record(query, args, elapsed, row_count(method, result))
+        if slow is not None and explain and settings.db_slow_query_explain:
+            self._schedule_plan_capture(slow, query, args, replica)
+        return result
+    
+    def _schedule_plan_capture(self, stat, query: str, args: tuple, replica: bool):
+        if stat.capturing_plan:
+            return
+        stat.capturing_plan = True
+        task = asyncio.create_task(self._capture_plan(stat, query, args, replica))
+        self._plan_tasks.add(task)
+        task.add_done_callback(self._plan_tasks.discard)
+    
+    async def _capture_plan(self, stat, query: str, args: tuple, replica: bool):
+        try:
+            async with self.connection(replica=replica) as conn:
+                explain = f"EXPLAIN (ANALYZE, BUFFERS) {query}"
+                conn.note_cached(explain)
+                rows = await conn.fetch(explain, *args)
+            stat.last_plan = "\n".join(row[0] for row in rows)
+        except Exception as e:
+            stat.last_plan = f"EXPLAIN failed: {e}"
+        finally:
+            stat.capturing_plan = False
+    
+    async def _run(self, method: str, query: Union[str, Statement], args: tuple, replica: bool):
+        if replica and self._use_replica():
+            try:
+                async with self.connection(replica=True) as conn:
+                    result = await self._timed(conn, method, query, args, True)
+                self.replica_reads += 1
+                return result
+            except (OSError, PoolTimeout, asyncpg.PostgresConnectionError, asyncpg.InterfaceError):
+                # Replica unreachable: use the primary until the next
+                # successful lag check.
+                self.replica_healthy = False
+                self.replica_fallbacks += 1
+        
+        sql = query.sql if isinstance(query, Statement) else query
+        if not replica and not sql.lstrip()[:6].upper().startswith("SELECT"):
+            self._record_write()
+        
         async with self.connection() as conn:
-            return await conn.execute(query, *args)
+            return await self._timed(conn, method, query, args, False)
     
-    async def fetch(self, query: str, *args):
-        """Fetch multiple rows."""
+    @asynccontextmanager
+    async def transaction(self):
+        """Run statements atomically on a single primary connection.
+        
+        Commits when the block exits normally and rolls back on exception.
+        """
+        self._record_write()
         async with self.connection() as conn:
-            return await conn.fetch(query, *args)
+            async with conn.transaction():
+                yield Transaction(self, conn)
+    
+    async def cursor(self, query: Statement, *args, prefetch: int = 500, replica: bool = False):
+        """Stream the rows of a query through a server-side cursor.
+        
+        Runs in a read-only, repeatable read transaction so the rows form one
+        snapshot; only `prefetch` rows are held in memory at a time. The
+        connection stays checked out until iteration finishes or the
+        generator is closed.
+        """
+        async with self.connection(replica=replica) as conn:
+            async with conn.transaction(readonly=True, isolation="repeatable_read"):
+                self._count_prepared(conn, "fetch", query, args)
+                async for row in conn.cursor(query.sql, *args, prefetch=prefetch):
+                    yield row
+    
+    async def execute(self, query: Union[str, Statement], *args, replica: bool = False):
+        """Execute a query."""
+        return await self._run("execute", query, args, replica)
     
-    async def fetchrow(self, query: str, *args):
+    async def fetch(self, query: Union[str, Statement], *args, replica: bool = False):
+        """Fetch multiple rows."""
+        return await self._run("fetch", query, args, replica)
+    
+    async def fetchrow(self, query: Union[str, Statement], *args, replica: bool = False):
         """Fetch a single row."""
-        async with self.connection() as conn:
-            return await conn.fetchrow(query, *args)
+        return await self._run("fetchrow", query, args, replica)
     
-    async def fetchval(self, query: str, *args):
+    async def fetchval(self, query: Union[str, Statement], *args, replica: bool = False):
         """Fetch a single value."""
-        async with self.connection() as conn:
-            return await conn.fetchval(query, *args)
+        return await self._run("fetchval", query, args, replica)
+    
+    def stats(self) -> dict:
+        """Return pool configuration, occupancy, acquire and replica metrics."""
+        size = idle = 0
+        if self.pool is not None:
+            size = self.pool.get_size()
+            idle = self.pool.get_idle_size()
+        stats = {
+            "connected": self.pool is not None,
+            "min_size": settings.db_pool_min_size,
+            "max_size": settings.db_pool_max_size,
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "acquires": self.acquires,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait": self.acquire_wait.snapshot(),
+            "statements": {
+                "registered": len(statements),
+                "cache_size": settings.db_statement_cache_size,
+                "prepared_hits": self.prepared_hits,
+                "prepared_misses": self.prepared_misses,
+                "adhoc_calls": self.adhoc_calls,
+            },
+        }
+        if self.replica_pool is not None:
+            replica_size = self.replica_pool.get_size()
+            replica_idle = self.replica_pool.get_idle_size()
+            stats["replica"] = {
+                "healthy": self.replica_healthy,
+                "lag_seconds": self.replica_lag,
+                "size": replica_size,
+                "in_use": replica_size - replica_idle,
+                "idle": replica_idle,
+                "reads": self.replica_reads,
+                "fallbacks": self.replica_fallbacks,
+            }
+        return stats
 
 
 # Global database instance
 db = Database()
-
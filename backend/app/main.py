@@ -1,10 +1,21 @@
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.config import settings
-from app.database import db
-from app.routers import auth_router, products_router, orders_router, dealers_router, files_router
+from app.database import db, PoolTimeout
+from app.services.catalog import catalog
+from app.services.order_events import order_events
+from app.services.order_partitions import maintain_partitions
+from app.services.refresh_token import revoked_families
+from app.services.pagination import InvalidCursor
+from app.services.password import password_pool, PasswordPoolSaturated
+from app.routers import (
+    auth_router, products_router, orders_router, dealers_router, files_router, admin_router,
+    analytics_router,
+)
 
 
 @asynccontextmanager
@@ -12,9 +23,17 @@ async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     # Startup
     await db.connect()
+    await revoked_families.load()
+    await catalog.load()
+    partitions = asyncio.create_task(maintain_partitions())
+    order_events.start()
     yield
-    # Shutdown
+    # Shutdown; open event streams keep the server waiting until its
+    # --timeout-graceful-shutdown cancels them, and any left end here
+    partitions.cancel()
+    await order_events.stop()
     await db.disconnect()
+    password_pool.shutdown()
 
 
 app = FastAPI(
@@ -34,12 +53,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(PasswordPoolSaturated)
+async def password_pool_saturated_handler(request: Request, exc: PasswordPoolSaturated):
+    """Shed load quickly when the password worker pool is saturated."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    """Shed load when no database connection is available in time."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    """Reject pagination cursors that cannot be decoded."""
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"detail": str(exc)},
+    )
+
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(products_router)
 app.include_router(orders_router)
 app.include_router(dealers_router)
 app.include_router(files_router)
+app.include_router(admin_router)
+app.include_router(analytics_router)
 
 
 @app.get("/health")
@@ -56,4 +106,5 @@ async def health_check():
     return {
         "status": "healthy",
         "database": db_status,
+        "pool": db.stats(),
     }
@@ -0,0 +1,131 @@
+"""Per-statement timing and fingerprint statistics."""
+import logging
+import re
+from typing import Dict, Optional, Sequence
+
+from app.metrics import Histogram
+
+logger = logging.getLogger("app.db.slow_query")
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*\?\s*,)+\s*\?\s*\)", re.I)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(query: str) -> str:
+    """Normalize a statement so that textual variants of one query group together.
+    
+    Comments and whitespace are collapsed and literals replaced with `?`;
+    bind parameters ($1, $2, ...) are kept as they already are placeholders.
+    """
+    text = _COMMENT_RE.sub(" ", query)
+    text = _STRING_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("IN (?)", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def param_shapes(args: Sequence) -> str:
+    """Describe bind parameters by type (and length for sequences), not value."""
+    shapes = []
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            shapes.append(f"{type(arg).__name__}[{len(arg)}]")
+        else:
+            shapes.append(type(arg).__name__)
+    return "(" + ", ".join(shapes) + ")"
+
+
+def row_count(method: str, result) -> int:
+    """Number of rows returned or affected by a Database call."""
+    if method == "fetch":
+        return len(result)
+    if method in ("fetchrow", "fetchval"):
+        return 0 if result is None else 1
+    # execute() returns a command tag such as "UPDATE 3"
+    tail = result.rsplit(" ", 1)[-1] if isinstance(result, str) else ""
+    return int(tail) if tail.isdigit() else 0
+
+
+class QueryStat:
+    """Aggregated statistics for one query fingerprint."""
+    
+    def __init__(self, query: str):
+        self.query = query
+        self.calls = 0
+        self.rows = 0
+        self.total = 0.0
+        self.latency = Histogram()
+        self.slow_calls = 0
+        self.last_plan: Optional[str] = None
+        self.capturing_plan = False
+    
+    def snapshot(self) -> dict:
+        latency = self.latency.snapshot()
+        return {
+            "query": self.query,
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": latency["avg_ms"],
+            "p95_ms": latency["p95_ms"],
+            "max_ms": latency["max_ms"],
+            "slow_calls": self.slow_calls,
+            "last_plan": self.last_plan,
+        }
+
+
+class QueryStats:
+    """Registry of per-fingerprint query statistics."""
+    
+    def __init__(self, slow_query_ms: float, max_fingerprints: int = 2000):
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self._fingerprints: Dict[str, str] = {}
+        self._stats: Dict[str, QueryStat] = {}
+    
+    def _fingerprint(self, query: str) -> str:
+        fp = self._fingerprints.get(query)
+        if fp is None:
+            if len(self._fingerprints) >= self.max_fingerprints * 4:
+                self._fingerprints.clear()
+            fp = self._fingerprints[query] = fingerprint(query)
+        return fp
+    
+    def record(self, query: str, args: Sequence, elapsed: float, rows: int) -> Optional[QueryStat]:
+        """Record one execution; returns the stat entry if the call was slow."""
+        fp = self._fingerprint(query)
+        stat = self._stats.get(fp)
+        if stat is None:
+            if len(self._stats) >= self.max_fingerprints:
+                # Keep the table bounded; unseen shapes land in one bucket.
+                fp = "<other>"
+                stat = self._stats.setdefault(fp, QueryStat(fp))
+            else:
+                stat = self._stats[fp] = QueryStat(fp)
+        
+        stat.calls += 1
+        stat.rows += rows
+        stat.total += elapsed
+        stat.latency.observe(elapsed)
+        
+        if elapsed * 1000 >= self.slow_query_ms:
+            stat.slow_calls += 1
+            logger.warning(
+                "Slow query (%.1f ms, %d rows) %s params=%s",
+                elapsed * 1000, rows, fp, param_shapes(args),
+            )
+            return stat
+        return None
+    
+    def top(self, sort: str = "total_ms", limit: int = 50) -> list:
+        """Return the heaviest fingerprints."""
+        rows = [stat.snapshot() for stat in self._stats.values()]
+        rows.sort(key=lambda row: row[sort], reverse=True)
+        return rows[:limit]
+    
+    def reset(self) -> None:
+        """Clear all collected statistics."""
+        self._stats.clear()
@@ -4,6 +4,8 @@ from app.routers.products import router as products_router
 from app.routers.orders import router as orders_router
 from app.routers.dealers import router as dealers_router
 from app.routers.files import router as files_router
+from app.routers.admin import router as admin_router
+from app.routers.analytics import router as analytics_router
 
 __all__ = [
     "auth_router",
@@ -11,5 +13,7 @@ __all__ = [
     "orders_router",
     "dealers_router",
     "files_router",
+    "admin_router",
+    "analytics_router",
 ]
 
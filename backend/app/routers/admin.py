@@ -0,0 +1,51 @@
+"""Admin diagnostics routes."""
+from fastapi import APIRouter, Depends, Query, status
+
+from app.database import db
+from app.services.auth import principal_cache, verified_token_cache
+from app.services.catalog import catalog
+from app.services.idempotency import idempotency
+from app.services.order_events import order_events
+from app.services.pagination import count_cache
+from app.services.password import password_pool
+from app.routers.auth import require_admin
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"])
+
+
+@router.get("/diagnostics")
+async def get_diagnostics(
+    current_user: dict = Depends(require_admin),
+):
+    """Get connection pool, cache and worker pool metrics (admin only)."""
+    return {
+        "database": db.stats(),
+        "principal_cache": principal_cache.stats(),
+        "token_cache": verified_token_cache.stats(),
+        "count_cache": count_cache.stats(),
+        "catalog": catalog.stats(),
+        "idempotency": idempotency.stats(),
+        "order_events": order_events.stats(),
+        "password_pool": password_pool.stats(),
+    }
+
+
+@router.get("/queries")
+async def get_query_stats(
+    sort: str = Query("total_ms", pattern="^(total_ms|calls|mean_ms|max_ms|rows)$"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(require_admin),
+):
+    """Get per-fingerprint query statistics (admin only)."""
+    return {
+        "slow_query_ms": db.query_stats.slow_query_ms,
+        "queries": db.query_stats.top(sort=sort, limit=limit),
+    }
+
+
+@router.delete("/queries", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_query_stats(
+    current_user: dict = Depends(require_admin),
+):
+    """Reset query statistics (admin only)."""
+    db.query_stats.reset()
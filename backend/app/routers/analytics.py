@@ -0,0 +1,75 @@
+"""Sales analytics routes."""
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+
+from app.schemas.analytics import SalesReport
+from app.services import analytics as analytics_service
+from app.services.order_number import order_numbers
+from app.routers.auth import require_admin
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+
+async def _sales_report(
+    start: Optional[date],
+    end: Optional[date],
+    interval: str,
+    breakdown: Optional[str] = None
+) -> SalesReport:
+    """Build a report; the range defaults to the 30 business days up to today."""
+    end = end or order_numbers.business_day()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end",
+        )
+    
+    buckets = await analytics_service.get_sales(start, end, interval, breakdown)
+    return SalesReport(start=start, end=end, interval=interval, breakdown=breakdown, buckets=buckets)
+
+
+@router.get("/sales", response_model=SalesReport)
+async def get_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    current_user: dict = Depends(require_admin),
+):
+    """Get order count, units and revenue per interval (admin only)."""
+    return await _sales_report(start, end, interval)
+
+
+@router.get("/sales/by-dealer", response_model=SalesReport)
+async def get_sales_by_dealer(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    current_user: dict = Depends(require_admin),
+):
+    """Get sales per interval and dealer (admin only)."""
+    return await _sales_report(start, end, interval, "dealer")
+
+
+@router.get("/sales/by-product", response_model=SalesReport)
+async def get_sales_by_product(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    current_user: dict = Depends(require_admin),
+):
+    """Get sales per interval and product (admin only)."""
+    return await _sales_report(start, end, interval, "product")
+
+
+@router.get("/sales/by-category", response_model=SalesReport)
+async def get_sales_by_category(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    current_user: dict = Depends(require_admin),
+):
+    """Get sales per interval and product category (admin only)."""
+    return await _sales_report(start, end, interval, "category")
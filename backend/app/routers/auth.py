@@ -5,13 +5,19 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Cookie
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from app.config import settings
+from app.database import session_key
 from app.schemas.auth import (
     LoginRequest, LoginResponse, TokenResponse, 
     CurrentUserResponse, RefreshRequest, UserInfo, DealerInfo
 )
 from app.services.auth import (
-    authenticate_user, create_access_token, create_refresh_token,
-    decode_token, get_user_with_dealer
+    authenticate_user, create_access_token, decode_token, get_user_with_dealer, get_principal,
+    build_token_claims, principal_from_claims, revoke_user_tokens, token_versions
+)
+from app.services.refresh_token import (
+    issue_refresh_token, rotate_refresh_token, revoke_refresh_families,
+    revoke_user_refresh_tokens
 )
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
@@ -44,7 +50,24 @@ async def get_current_user(
             detail="Invalid token payload",
         )
     
-    user = await get_user_with_dealer(UUID(user_id))
+    user_id = UUID(user_id)
+    session_key.set(user_id)
+    
+    # Tokens carrying a version are authorized from their claims alone,
+    # provided the version has not been bumped since they were issued.
+    token_version = payload.get("ver")
+    if token_version is not None:
+        current_version = await token_versions.get(user_id)
+        if current_version is not None:
+            if token_version != current_version:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token has been revoked",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            return principal_from_claims(payload)
+    
+    user = await get_principal(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,6 +80,13 @@ async def get_current_user(
             detail="User account is inactive",
         )
     
+    if token_version is not None and token_version != user["token_version"]:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     return user
 
 
@@ -104,6 +134,17 @@ def require_approved_dealer(current_user: dict = Depends(get_current_user)) -> d
     return current_user
 
 
+def set_refresh_cookie(response: Response, refresh_token: str) -> None:
+    """Set refresh token in httpOnly cookie."""
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        httponly=True,
+        max_age=settings.jwt_refresh_expire_days * 24 * 60 * 60,
+        samesite="lax",
+    )
+
+
 @router.post("/login", response_model=LoginResponse)
 async def login(request: LoginRequest, response: Response):
     """Authenticate user and return tokens."""
@@ -119,18 +160,10 @@ async def login(request: LoginRequest, response: Response):
     full_user = await get_user_with_dealer(user["id"])
     
     # Create tokens
-    token_data = {"sub": str(user["id"]), "role": user["role"]}
+    token_data = build_token_claims(full_user)
     access_token = create_access_token(token_data)
-    refresh_token = create_refresh_token(token_data)
-    
-    # Set refresh token in httpOnly cookie
-    response.set_cookie(
-        key="refresh_token",
-        value=refresh_token,
-        httponly=True,
-        max_age=7 * 24 * 60 * 60,  # 7 days
-        samesite="lax",
-    )
+    refresh_token = await issue_refresh_token(token_data)
+    set_refresh_cookie(response, refresh_token)
     
     # Build user info
     dealer_info = None
@@ -154,14 +187,29 @@ async def login(request: LoginRequest, response: Response):
 
 
 @router.post("/logout")
-async def logout(response: Response):
-    """Logout and clear refresh token cookie."""
+async def logout(
+    response: Response,
+    request: Optional[RefreshRequest] = None,
+    refresh_token: Optional[str] = Cookie(None),
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+):
+    """Logout, revoke issued tokens and clear refresh token cookie."""
+    if current_user:
+        await revoke_user_tokens(current_user["id"])
+        await revoke_user_refresh_tokens(current_user["id"])
+    else:
+        token = request.refresh_token if request else refresh_token
+        payload = decode_token(token) if token else None
+        if payload and payload.get("type") == "refresh" and payload.get("fid"):
+            await revoke_refresh_families([UUID(payload["fid"])])
+    
     response.delete_cookie("refresh_token")
     return {"message": "Logged out successfully"}
 
 
 @router.post("/refresh", response_model=TokenResponse)
 async def refresh_token(
+    response: Response,
     request: Optional[RefreshRequest] = None,
     refresh_token: Optional[str] = Cookie(None),
 ):
@@ -175,19 +223,30 @@ async def refresh_token(
         )
     
     payload = decode_token(token)
-    if not payload or payload.get("type") != "refresh":
+    if not payload or payload.get("type") != "refresh" or not payload.get("jti"):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token",
         )
     
-    user_id = payload.get("sub")
-    role = payload.get("role")
+    # Re-read the user so new tokens carry current dealer claims and version
+    user = await get_principal(UUID(payload["sub"]))
+    if not user or not user.get("is_active"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+        )
     
     # Create new tokens
-    token_data = {"sub": user_id, "role": role}
+    token_data = build_token_claims(user)
+    new_refresh_token = await rotate_refresh_token(payload, token_data)
+    if not new_refresh_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token has been revoked",
+        )
     new_access_token = create_access_token(token_data)
-    new_refresh_token = create_refresh_token(token_data)
+    set_refresh_cookie(response, new_refresh_token)
     
     return TokenResponse(
         access_token=new_access_token,
@@ -198,6 +257,14 @@ async def refresh_token(
 @router.get("/me", response_model=CurrentUserResponse)
 async def get_me(current_user: dict = Depends(get_current_user)):
     """Get current authenticated user information."""
+    # Claims-based principals only carry ids and status; load full details
+    current_user = await get_principal(current_user["id"])
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+        )
+    
     dealer_info = None
     if current_user.get("dealer"):
         dealer_info = DealerInfo(**current_user["dealer"])
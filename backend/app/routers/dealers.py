@@ -18,6 +18,8 @@ async def list_dealers(
     page_size: int = Query(20, ge=1, le=100),
     status_filter: Optional[str] = Query(None, alias="status"),
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|cached|none)$"),
     current_user: dict = Depends(require_admin),
 ):
     """List dealers (admin only)."""
@@ -26,6 +28,8 @@ async def list_dealers(
         page_size=page_size,
         status=status_filter,
         search=search,
+        cursor=cursor,
+        count=count,
     )
     
     return PaginatedResponse[DealerResponse](
@@ -34,6 +38,9 @@ async def list_dealers(
         page=result["page"],
         page_size=result["page_size"],
         pages=result["pages"],
+        has_next=result["has_next"],
+        cursor=result["cursor"],
+        next_cursor=result["next_cursor"],
     )
 
 
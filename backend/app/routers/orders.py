@@ -1,12 +1,18 @@
 """Order routes."""
+from datetime import date
 from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from fastapi.responses import StreamingResponse
 
-from app.schemas.order import OrderCreate, OrderResponse, OrderStatusUpdate, OrderStatsResponse
+from app.schemas.order import (
+    OrderCreate, OrderResponse, OrderStatusUpdate, OrderStatsResponse,
+    OrderStatusBatch, OrderStatusBatchResponse,
+)
 from app.schemas.common import PaginatedResponse
 from app.services import order as order_service
+from app.services import order_events
 from app.services import dealer as dealer_service
 from app.routers.auth import get_current_user, require_admin, require_approved_dealer
 
@@ -19,9 +25,16 @@ async def list_orders(
     page_size: int = Query(20, ge=1, le=100),
     status_filter: Optional[str] = Query(None, alias="status"),
     order_no: Optional[str] = None,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|cached|none)$"),
     current_user: dict = Depends(get_current_user),
 ):
-    """List orders (filtered by role - dealers see own orders only)."""
+    """List orders (filtered by role - dealers see own orders only).
+    
+    `order_no` matches order numbers by prefix; `search` matches part of the
+    order number, shipping address or dealer company name.
+    """
     dealer_id = None
     
     # Dealers can only see their own orders
@@ -40,6 +53,9 @@ async def list_orders(
         dealer_id=dealer_id,
         status=status_filter,
         order_no=order_no,
+        search=search,
+        cursor=cursor,
+        count=count,
     )
     
     return PaginatedResponse[OrderResponse](
@@ -48,6 +64,9 @@ async def list_orders(
         page=result["page"],
         page_size=result["page_size"],
         pages=result["pages"],
+        has_next=result["has_next"],
+        cursor=result["cursor"],
+        next_cursor=result["next_cursor"],
     )
 
 
@@ -60,6 +79,77 @@ async def get_order_stats(
     return OrderStatsResponse(**stats)
 
 
+@router.get("/export")
+async def export_orders(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    dealer_id: Optional[UUID] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """Stream orders with items as CSV or NDJSON (dealers export their own orders)."""
+    # Dealers can only export their own orders
+    if current_user.get("role") != "admin":
+        dealer = current_user.get("dealer")
+        if not dealer:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Dealer account required",
+            )
+        dealer_id = dealer["id"]
+    
+    if start and end and start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end",
+        )
+    
+    chunks = order_service.export_orders(
+        fmt=format,
+        dealer_id=dealer_id,
+        status=status_filter,
+        start=start,
+        end=end,
+    )
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
+
+
+@router.get("/events")
+async def order_events_stream(
+    last_event_id: Optional[str] = Header(None, max_length=64),
+    current_user: dict = Depends(get_current_user),
+):
+    """Stream order changes as Server-Sent Events (dealers get their own orders).
+    
+    Events are `created`, `status_changed` and `cancelled`. Reconnecting
+    with `Last-Event-ID` resumes after that event; a `reset` event means
+    events were missed and the client should reload its orders.
+    """
+    dealer_id = None
+    
+    # Dealers only receive events for their own orders
+    if current_user.get("role") != "admin":
+        dealer = current_user.get("dealer")
+        if not dealer:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Dealer account required",
+            )
+        dealer_id = str(dealer["id"])
+    
+    return StreamingResponse(
+        order_events.stream(dealer_id=dealer_id, last_event_id=last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: UUID,
@@ -89,9 +179,16 @@ async def get_order(
 @router.post("", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_order(
     order: OrderCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
     current_user: dict = Depends(require_approved_dealer),
 ):
-    """Create a new order (approved dealers only)."""
+    """Create a new order (approved dealers only).
+    
+    Retries that send the same `Idempotency-Key` header get the original
+    order back (marked with `Idempotent-Replayed: true`) instead of creating
+    a duplicate; reusing a key for a different order is rejected.
+    """
     dealer = current_user.get("dealer")
     if not dealer:
         raise HTTPException(
@@ -109,16 +206,62 @@ async def create_order(
         for item in order.items
     ]
     
-    result = await order_service.create_order(
-        dealer_id=dealer["id"],
-        items=items,
-        shipping_address=order.shipping_address,
-        notes=order.notes,
-    )
+    if idempotency_key is None:
+        result = await order_service.create_order(
+            dealer_id=dealer["id"],
+            items=items,
+            shipping_address=order.shipping_address,
+            notes=order.notes,
+        )
+        return OrderResponse(**result)
+    
+    try:
+        result, replayed = await order_service.create_order_once(
+            dealer_id=dealer["id"],
+            idempotency_key=idempotency_key,
+            items=items,
+            shipping_address=order.shipping_address,
+            notes=order.notes,
+        )
+    except order_service.IdempotencyKeyMismatch as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
     
     return OrderResponse(**result)
 
 
+@router.post("/status:batch", response_model=OrderStatusBatchResponse)
+async def update_order_statuses(
+    batch: OrderStatusBatch,
+    current_user: dict = Depends(require_admin),
+):
+    """Update the status of many orders at once (admin only).
+    
+    Allowed changes are pending -> confirmed -> shipped -> delivered, and
+    pending -> cancelled. Changes that are not allowed, or name a missing
+    order, are reported per order and do not fail the batch.
+    """
+    try:
+        results = await order_service.update_order_statuses([
+            {"order_id": change.order_id, "status": change.status}
+            for change in batch.changes
+        ])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    
+    return OrderStatusBatchResponse(
+        updated=sum(result["updated"] for result in results),
+        results=results,
+    )
+
+
 @router.put("/{order_id}/status", response_model=OrderResponse)
 async def update_order_status(
     order_id: UUID,
@@ -126,14 +269,19 @@ async def update_order_status(
     current_user: dict = Depends(require_admin),
 ):
     """Update order status (admin only)."""
-    order = await order_service.get_order_by_id(order_id)
-    if not order:
+    try:
+        result = await order_service.update_order_status(order_id, status_update.status)
+    except order_service.InvalidTransition as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found",
         )
     
-    result = await order_service.update_order_status(order_id, status_update.status)
     return OrderResponse(**result)
 
 
@@ -167,5 +315,12 @@ async def cancel_order(
         )
     
     result = await order_service.cancel_order(order_id)
+    if not result:
+        # Status changed since it was read
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only pending orders can be cancelled",
+        )
+    
     return OrderResponse(**result)
 
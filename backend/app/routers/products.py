@@ -19,6 +19,8 @@ async def list_products(
     page_size: int = Query(20, ge=1, le=100),
     category: Optional[str] = None,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|cached|none)$"),
     current_user: Optional[dict] = Depends(get_current_user_optional),
 ):
     """List products with pagination and filtering."""
@@ -33,6 +35,8 @@ async def list_products(
         category=category,
         search=search,
         is_active=is_active,
+        cursor=cursor,
+        count=count,
     )
     
     return PaginatedResponse[ProductResponse](
@@ -41,6 +45,9 @@ async def list_products(
         page=result["page"],
         page_size=result["page_size"],
         pages=result["pages"],
+        has_next=result["has_next"],
+        cursor=result["cursor"],
+        next_cursor=result["next_cursor"],
     )
 
 
@@ -102,7 +109,7 @@ async def update_product(
     current_user: dict = Depends(require_admin),
 ):
     """Update a product (admin only)."""
-    existing = await product_service.get_product_by_id(product_id)
+    existing = await product_service.get_product_by_id(product_id, cached=False)
     if not existing:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -144,7 +151,7 @@ async def upload_product_image(
     current_user: dict = Depends(require_admin),
 ):
     """Upload product image (admin only)."""
-    product = await product_service.get_product_by_id(product_id)
+    product = await product_service.get_product_by_id(product_id, cached=False)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
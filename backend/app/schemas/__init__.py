@@ -5,6 +5,7 @@ from app.schemas.user import UserCreate, UserUpdate, UserResponse
 from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse
 from app.schemas.order import OrderCreate, OrderItemCreate, OrderResponse, OrderItemResponse
 from app.schemas.dealer import DealerCreate, DealerUpdate, DealerResponse
+from app.schemas.analytics import SalesBucket, SalesReport
 
 __all__ = [
     "PaginatedResponse",
@@ -13,5 +14,6 @@ __all__ = [
     "ProductCreate", "ProductUpdate", "ProductResponse",
     "OrderCreate", "OrderItemCreate", "OrderResponse", "OrderItemResponse",
     "DealerCreate", "DealerUpdate", "DealerResponse",
+    "SalesBucket", "SalesReport",
 ]
 
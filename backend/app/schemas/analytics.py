@@ -0,0 +1,24 @@
+"""Analytics schemas."""
+from typing import Optional, List
+from pydantic import BaseModel
+from datetime import date
+from decimal import Decimal
+
+
+class SalesBucket(BaseModel):
+    """Sales in one interval bucket, for one breakdown key if any."""
+    bucket: date
+    key: Optional[str] = None
+    label: Optional[str] = None
+    order_count: int
+    units: int
+    revenue: Decimal
+
+
+class SalesReport(BaseModel):
+    """Sales report over a date range."""
+    start: date
+    end: date
+    interval: str
+    breakdown: Optional[str] = None
+    buckets: List[SalesBucket]
@@ -1,17 +1,26 @@
 """Common schemas for pagination and shared types."""
-from typing import TypeVar, Generic, List
+from typing import TypeVar, Generic, List, Optional
 from pydantic import BaseModel
 
 T = TypeVar('T')
 
 
 class PaginatedResponse(BaseModel, Generic[T]):
-    """Generic paginated response."""
+    """Generic paginated response.
+
+    Pages are addressed either by `page` or by an opaque `cursor`; pass
+    `next_cursor` back as `cursor` to fetch the following page. `page` and
+    `pages` are null in cursor mode; `total` and `pages` are null when the
+    request asked for no count.
+    """
     items: List[T]
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     page_size: int
-    pages: int
+    pages: Optional[int] = None
+    has_next: bool = False
+    cursor: Optional[str] = None
+    next_cursor: Optional[str] = None
 
 
 class MessageResponse(BaseModel):
@@ -58,6 +58,32 @@ class OrderStatusUpdate(BaseModel):
     status: str = Field(..., pattern="^(pending|confirmed|shipped|delivered|cancelled)$")
 
 
+class OrderStatusChange(BaseModel):
+    """One order status change in a batch."""
+    order_id: UUID
+    status: str = Field(..., pattern="^(pending|confirmed|shipped|delivered|cancelled)$")
+
+
+class OrderStatusBatch(BaseModel):
+    """Batch order status update schema."""
+    changes: List[OrderStatusChange] = Field(..., min_length=1, max_length=1000)
+
+
+class OrderStatusResult(BaseModel):
+    """Outcome of one change in a batch."""
+    order_id: UUID
+    status: Optional[str] = None
+    previous_status: Optional[str] = None
+    updated: bool
+    error: Optional[str] = None
+
+
+class OrderStatusBatchResponse(BaseModel):
+    """Batch order status update response."""
+    updated: int
+    results: List[OrderStatusResult]
+
+
 class OrderStatsResponse(BaseModel):
     """Order statistics response."""
     status_counts: dict
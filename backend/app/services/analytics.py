@@ -0,0 +1,123 @@
+"""Sales analytics over the daily sales facts.
+
+`dealer_sales_daily` and `product_sales_daily` hold order count, units and
+revenue per business day and dealer or product, excluding cancelled
+orders. Triggers on `orders` and `order_items` keep them current in the
+writing transaction, so a report reads O(days x keys) pre-aggregated rows
+and rolls them up to weeks or months in the same statement, however many
+orders there are.
+
+For product and category breakdowns, an order counts once for every
+product it contains, so category order counts may include an order more
+than once.
+"""
+from datetime import date
+from typing import List, Optional
+
+from app.database import db
+from app.statements import statements
+
+
+INTERVALS = ("day", "week", "month")
+BREAKDOWNS = ("dealer", "product", "category")
+
+# $1/$2: inclusive date range, $3: interval
+SALES_TOTALS = statements.register("sales.totals", """
+    SELECT date_trunc($3, day)::date AS bucket,
+           NULL::text AS key, NULL::text AS label,
+           SUM(order_count)::int AS order_count, SUM(units)::int AS units, SUM(revenue) AS revenue
+    FROM dealer_sales_daily
+    WHERE day BETWEEN $1 AND $2
+    GROUP BY 1
+    ORDER BY 1
+""", read_only=True)
+
+SALES_BY_DEALER = statements.register("sales.by_dealer", """
+    SELECT date_trunc($3, s.day)::date AS bucket,
+           s.dealer_id::text AS key, d.company_name AS label,
+           SUM(s.order_count)::int AS order_count, SUM(s.units)::int AS units, SUM(s.revenue) AS revenue
+    FROM dealer_sales_daily s
+    JOIN dealers d ON d.id = s.dealer_id
+    WHERE s.day BETWEEN $1 AND $2
+    GROUP BY 1, s.dealer_id, d.company_name
+    ORDER BY 1, revenue DESC
+""", read_only=True)
+
+SALES_BY_PRODUCT = statements.register("sales.by_product", """
+    SELECT date_trunc($3, s.day)::date AS bucket,
+           s.product_id::text AS key, p.name AS label,
+           SUM(s.order_count)::int AS order_count, SUM(s.units)::int AS units, SUM(s.revenue) AS revenue
+    FROM product_sales_daily s
+    JOIN products p ON p.id = s.product_id
+    WHERE s.day BETWEEN $1 AND $2
+    GROUP BY 1, s.product_id, p.name
+    ORDER BY 1, revenue DESC
+""", read_only=True)
+
+SALES_BY_CATEGORY = statements.register("sales.by_category", """
+    SELECT date_trunc($3, s.day)::date AS bucket,
+           p.category AS key, p.category AS label,
+           SUM(s.order_count)::int AS order_count, SUM(s.units)::int AS units, SUM(s.revenue) AS revenue
+    FROM product_sales_daily s
+    JOIN products p ON p.id = s.product_id
+    WHERE s.day BETWEEN $1 AND $2
+    GROUP BY 1, p.category
+    ORDER BY 1, revenue DESC
+""", read_only=True)
+
+BREAKDOWN_STATEMENTS = {
+    None: SALES_TOTALS,
+    "dealer": SALES_BY_DEALER,
+    "product": SALES_BY_PRODUCT,
+    "category": SALES_BY_CATEGORY,
+}
+
+
+async def get_sales(
+    start: date,
+    end: date,
+    interval: str = "day",
+    breakdown: Optional[str] = None
+) -> List[dict]:
+    """Order count, units and revenue per interval bucket, optionally per breakdown key.
+    
+    Buckets with no sales are omitted; week and month buckets start on the
+    Monday or the first of the month, which may precede `start`.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown interval: {interval}")
+    if breakdown is not None and breakdown not in BREAKDOWNS:
+        raise ValueError(f"Unknown breakdown: {breakdown}")
+    
+    rows = await db.fetch(BREAKDOWN_STATEMENTS[breakdown], start, end, interval, replica=True)
+    return [dict(row) for row in rows]
+
+
+async def rebuild_sales_facts() -> int:
+    """Recompute the sales facts from orders; returns the number of fact rows.
+    
+    Writes to orders and order items wait for the rebuild; reads continue.
+    """
+    async with db.transaction() as tx:
+        await tx.execute("LOCK TABLE orders, order_items IN SHARE ROW EXCLUSIVE MODE")
+        await tx.execute("DELETE FROM dealer_sales_daily")
+        await tx.execute("DELETE FROM product_sales_daily")
+        dealers = await tx.execute("""
+            INSERT INTO dealer_sales_daily (day, dealer_id, order_count, units, revenue)
+            SELECT order_stats_day(o.created_at), o.dealer_id, COUNT(*),
+                   COALESCE(SUM((SELECT SUM(i.quantity) FROM order_items i WHERE i.order_id = o.id)), 0),
+                   SUM(o.total_amount)
+            FROM orders o
+            WHERE o.status <> 'cancelled'
+            GROUP BY 1, 2
+        """)
+        products = await tx.execute("""
+            INSERT INTO product_sales_daily (day, product_id, order_count, units, revenue)
+            SELECT order_stats_day(o.created_at), i.product_id, COUNT(DISTINCT o.id),
+                   SUM(i.quantity), SUM(i.subtotal)
+            FROM orders o
+            JOIN order_items i ON i.order_id = o.id
+            WHERE o.status <> 'cancelled'
+            GROUP BY 1, 2
+        """)
+    return int(dealers.split()[-1]) + int(products.split()[-1])
@@ -1,27 +1,175 @@
 """Authentication service with JWT tokens and password hashing."""
+import asyncio
+import hashlib
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from uuid import UUID
 
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.config import settings
 from app.database import db
+from app.services.cache import TTLCache
+from app.services.jwt_backend import jwt_backend, TokenError
+from app.services.password import password_pool
+from app.statements import statements
 
 
+LOAD_TOKEN_VERSIONS = statements.register(
+    "users.token_versions",
+    "SELECT id, token_version FROM users",
+    read_only=True,
+)
+
+TOKEN_VERSION_CLOCK = statements.register(
+    "token_versions.clock", "SELECT version FROM token_version_clock", read_only=True
+)
+
+# Users whose token version changed after $1; NULL token_version if deleted
+TOKEN_VERSION_CHANGES = statements.register("token_versions.changes", """
+    SELECT c.version AS clock, c.user_id, u.token_version
+    FROM token_version_changes c
+    LEFT JOIN users u ON u.id = c.user_id
+    WHERE c.version > $1
+""", read_only=True)
+
+GET_USER_FOR_LOGIN = statements.register("users.get_for_login", """
+    SELECT id, username, email, password_hash, role, is_active
+    FROM users WHERE username = $1
+""", read_only=True)
+
+GET_USER = statements.register("users.get_by_id", """
+    SELECT id, username, email, role, is_active, created_at, updated_at
+    FROM users WHERE id = $1
+""", read_only=True)
+
+GET_USER_WITH_DEALER = statements.register("users.get_with_dealer", """
+    SELECT u.id, u.username, u.email, u.role, u.is_active, u.created_at, u.updated_at,
+           u.token_version,
+           d.id as dealer_id, d.company_name, d.contact_name, d.phone, d.address, d.status as dealer_status
+    FROM users u
+    LEFT JOIN dealers d ON d.user_id = u.id
+    WHERE u.id = $1
+""", read_only=True)
+
+BUMP_TOKEN_VERSION = statements.register("users.bump_token_version", """
+    UPDATE users SET token_version = token_version + 1
+    WHERE id = $1
+    RETURNING token_version
+""")
+
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Authenticated principals keyed by user id. Writes to users/dealers in this
+# worker invalidate explicitly; the TTL bounds staleness across workers.
+principal_cache = TTLCache(
+    maxsize=settings.principal_cache_size,
+    ttl=settings.principal_cache_ttl_seconds,
+)
+
+
+class TokenVersionMap:
+    """In-memory map of user id to current token version.
+    
+    Access tokens carry the version they were issued under; a mismatch means
+    the token was revoked. Local bumps apply immediately. Bumps made by other
+    workers are picked up periodically by fetching only the users changed
+    since the last refresh (migration 015), so a refresh costs one indexed
+    read however many users there are.
+    """
+    
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.clock: Optional[int] = None
+        self._versions: dict = {}
+        self._refreshed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+    
+    async def get(self, user_id: UUID) -> Optional[int]:
+        """Get the current token version, catching up when stale."""
+        if self._is_stale():
+            async with self._lock:
+                if self._is_stale():
+                    await self.refresh()
+        return self._versions.get(user_id)
+    
+    def _is_stale(self) -> bool:
+        return (
+            self._refreshed_at is None
+            or time.monotonic() - self._refreshed_at > self.refresh_interval
+        )
+    
+    async def refresh(self) -> None:
+        """Load every token version the first time, then only the changes since."""
+        if self.clock is None:
+            # Clock first: users changed while loading are fetched again
+            clock = await db.fetchval(TOKEN_VERSION_CLOCK)
+            rows = await db.fetch(LOAD_TOKEN_VERSIONS)
+            self._versions = {row["id"]: row["token_version"] for row in rows}
+            self.clock = clock
+        else:
+            for row in await db.fetch(TOKEN_VERSION_CHANGES, self.clock):
+                if row["token_version"] is None:
+                    self._versions.pop(row["user_id"], None)
+                else:
+                    self._versions[row["user_id"]] = row["token_version"]
+                self.clock = max(self.clock, row["clock"])
+        self._refreshed_at = time.monotonic()
+    
+    def set(self, user_id: UUID, version: int) -> None:
+        """Record a known token version."""
+        self._versions[user_id] = version
+    
+    def discard(self, user_id: UUID) -> None:
+        """Forget a user (e.g. after deletion)."""
+        self._versions.pop(user_id, None)
+
+
+token_versions = TokenVersionMap(settings.token_version_refresh_seconds)
+
+# Verified token payloads keyed by token digest; entries never outlive `exp`.
+verified_token_cache = TTLCache(maxsize=settings.token_cache_size)
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt."""
-    return pwd_context.hash(password)
 
+async def hash_password(password: str) -> str:
+    """Hash a password using bcrypt in the password worker pool."""
+    return await password_pool.run(pwd_context.hash, password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash in the password worker pool."""
+    return await password_pool.run(pwd_context.verify, plain_password, hashed_password)
+
+
+def build_token_claims(user: dict) -> dict:
+    """Build JWT claims that let requests be authorized without a DB lookup."""
+    dealer = user.get("dealer")
+    return {
+        "sub": str(user["id"]),
+        "role": user["role"],
+        "dealer_id": str(dealer["id"]) if dealer else None,
+        "dealer_status": dealer["status"] if dealer else None,
+        "ver": user.get("token_version", 0),
+    }
+
+
+def principal_from_claims(payload: dict) -> dict:
+    """Build a minimal principal from verified access token claims."""
+    dealer = None
+    if payload.get("dealer_id"):
+        dealer = {
+            "id": UUID(payload["dealer_id"]),
+            "status": payload.get("dealer_status"),
+        }
+    return {
+        "id": UUID(payload["sub"]),
+        "role": payload.get("role"),
+        "is_active": True,
+        "token_version": payload.get("ver"),
+        "dealer": dealer,
+    }
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -32,40 +180,44 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.jwt_expire_minutes)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+    return jwt_backend.encode(to_encode)
 
 
-def create_refresh_token(data: dict) -> str:
-    """Create a JWT refresh token (7 days expiry)."""
+def create_refresh_token(data: dict, expire: Optional[datetime] = None) -> str:
+    """Create a JWT refresh token (jwt_refresh_expire_days expiry by default)."""
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(days=7)
+    if expire is None:
+        expire = datetime.now(timezone.utc) + timedelta(days=settings.jwt_refresh_expire_days)
     to_encode.update({"exp": expire, "type": "refresh"})
-    return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+    return jwt_backend.encode(to_encode)
 
 
 def decode_token(token: str) -> Optional[dict]:
-    """Decode and validate a JWT token."""
-    try:
-        payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+    """Decode and validate a JWT token, reusing previously verified payloads."""
+    key = hashlib.sha256(token.encode()).digest()
+    payload = verified_token_cache.get(key)
+    if payload is not None:
         return payload
-    except JWTError:
+    
+    try:
+        payload = jwt_backend.decode(token)
+    except TokenError:
         return None
+    
+    exp = payload.get("exp")
+    if exp is not None:
+        verified_token_cache.set(key, payload, ttl=exp - time.time())
+    return payload
 
 
 async def authenticate_user(username: str, password: str) -> Optional[dict]:
     """Authenticate user with username and password."""
-    user = await db.fetchrow(
-        """
-        SELECT id, username, email, password_hash, role, is_active
-        FROM users WHERE username = $1
-        """,
-        username
-    )
+    user = await db.fetchrow(GET_USER_FOR_LOGIN, username)
     
     if not user:
         return None
     
-    if not verify_password(password, user["password_hash"]):
+    if not await verify_password(password, user["password_hash"]):
         return None
     
     if not user["is_active"]:
@@ -76,28 +228,13 @@ async def authenticate_user(username: str, password: str) -> Optional[dict]:
 
 async def get_user_by_id(user_id: UUID) -> Optional[dict]:
     """Get user by ID."""
-    user = await db.fetchrow(
-        """
-        SELECT id, username, email, role, is_active, created_at, updated_at
-        FROM users WHERE id = $1
-        """,
-        user_id
-    )
+    user = await db.fetchrow(GET_USER, user_id)
     return dict(user) if user else None
 
 
 async def get_user_with_dealer(user_id: UUID) -> Optional[dict]:
     """Get user with dealer information if applicable."""
-    user = await db.fetchrow(
-        """
-        SELECT u.id, u.username, u.email, u.role, u.is_active, u.created_at, u.updated_at,
-               d.id as dealer_id, d.company_name, d.contact_name, d.phone, d.address, d.status as dealer_status
-        FROM users u
-        LEFT JOIN dealers d ON d.user_id = u.id
-        WHERE u.id = $1
-        """,
-        user_id
-    )
+    user = await db.fetchrow(GET_USER_WITH_DEALER, user_id)
     
     if not user:
         return None
@@ -119,3 +256,31 @@ async def get_user_with_dealer(user_id: UUID) -> Optional[dict]:
     
     return result
 
+
+
+async def get_principal(user_id: UUID) -> Optional[dict]:
+    """Get user with dealer information, served from the principal cache."""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    
+    principal = await get_user_with_dealer(user_id)
+    if principal:
+        principal_cache.set(user_id, principal)
+        token_versions.set(user_id, principal["token_version"])
+    return principal
+
+
+def invalidate_principal(user_id: UUID) -> None:
+    """Drop a cached principal after its user or dealer row changed."""
+    principal_cache.invalidate(user_id)
+
+
+async def revoke_user_tokens(user_id: UUID) -> None:
+    """Invalidate all access tokens previously issued to a user."""
+    version = await db.fetchval(BUMP_TOKEN_VERSION, user_id)
+    invalidate_principal(user_id)
+    if version is None:
+        token_versions.discard(user_id)
+    else:
+        token_versions.set(user_id, version)
@@ -0,0 +1,263 @@
+"""In-process mirror of the product catalog.
+
+The catalog is a few thousand products and changes rarely, so each worker
+keeps all of it in memory: one compact record per product, plus the
+(created_at, id) ordering of every listing (all or active products, overall
+and per category). Product listings without a search, category filters,
+pagination and lookups by id are served from there without a query.
+
+Every statement that writes to `products` bumps `catalog_version` and
+records it against the products it touched (migration 012). The mirror
+keeps the version it has caught up to and refreshes incrementally: it
+fetches only the products changed since, and moves them in or out of the
+orderings. Writes through this worker invalidate the mirror so the next
+read catches up; writes through other workers are seen within
+`settings.catalog_refresh_seconds`.
+
+Until the mirror is loaded at startup (or with `settings.catalog_mirror`
+off), product reads go to the database. If startup could not load it
+because migrations have not run yet, reads retry the load at most every
+`settings.catalog_refresh_seconds`.
+"""
+import asyncio
+import logging
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+import asyncpg
+
+from app.config import settings
+from app.database import db
+from app.services.pagination import COUNT_MODES, build_page, decode_cursor
+from app.statements import statements
+
+
+logger = logging.getLogger("app.catalog")
+
+PRODUCT_FIELDS = (
+    "id", "name", "category", "price", "unit", "min_order_quantity", "description",
+    "image_url", "stock", "is_active", "created_at", "updated_at",
+)
+
+ID, CATEGORY, IS_ACTIVE, CREATED_AT = (
+    PRODUCT_FIELDS.index(field) for field in ("id", "category", "is_active", "created_at")
+)
+
+# NULL created_at sorts first in `created_at DESC`, as the listing query does
+LATEST = datetime.max.replace(tzinfo=timezone.utc)
+
+CATALOG_VERSION = statements.register(
+    "catalog.version", "SELECT version FROM catalog_version", read_only=True
+)
+
+LOAD_CATALOG = statements.register(
+    "catalog.load",
+    f"SELECT {', '.join(PRODUCT_FIELDS)} FROM products",
+    read_only=True,
+)
+
+# Products changed after $1 with their current row; NULL columns if deleted
+CATALOG_CHANGES = statements.register("catalog.changes", f"""
+    SELECT c.version AS catalog_version, c.product_id,
+           {', '.join('p.' + field for field in PRODUCT_FIELDS)}
+    FROM product_catalog_changes c
+    LEFT JOIN products p ON p.id = c.product_id
+    WHERE c.version > $1
+""", read_only=True)
+
+# A listing: (category or None for all, active products only)
+Listing = Tuple[Optional[str], bool]
+
+
+class CatalogMirror:
+    """Every product in memory, with the ordering of each listing.
+    
+    Orderings hold ascending (created_at, id) keys; pages walk them from
+    the end, newest first, as the listing query orders them.
+    """
+    
+    def __init__(self, enabled: bool, refresh_interval: float):
+        self.enabled = enabled
+        self.refresh_interval = refresh_interval
+        self.version: Optional[int] = None
+        self._records: Dict[UUID, tuple] = {}
+        self._orderings: Dict[Listing, List[tuple]] = {}
+        self._refreshed_at: Optional[float] = None
+        self._load_failed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.loads = 0
+        self.refreshes = 0
+        self.changes = 0
+        self.reads = 0
+    
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+    
+    async def load(self) -> None:
+        """Load the whole catalog (nothing if the mirror is disabled)."""
+        if not self.enabled:
+            return
+        async with self._lock:
+            # Version first: products written while loading are fetched
+            # again by the next refresh
+            try:
+                version = await db.fetchval(CATALOG_VERSION)
+                rows = await db.fetch(LOAD_CATALOG)
+            except asyncpg.UndefinedTableError as e:
+                logger.warning("catalog mirror not loaded: %s", e)
+                self._load_failed_at = time.monotonic()
+                return
+            self._load_failed_at = None
+            self._records = {row["id"]: tuple(row) for row in rows}
+            self._orderings = {}
+            for record in self._records.values():
+                for listing in self._listings(record):
+                    self._orderings.setdefault(listing, []).append(self._sort_key(record))
+            for ordering in self._orderings.values():
+                ordering.sort()
+            self.version = version
+            self._refreshed_at = time.monotonic()
+            self.loads += 1
+    
+    async def ready(self) -> bool:
+        """Whether reads can be served from the mirror, retrying a failed load."""
+        if (
+            self._load_failed_at is not None
+            and time.monotonic() - self._load_failed_at > self.refresh_interval
+        ):
+            await self.load()
+        return self.loaded
+    
+    def unload(self) -> None:
+        """Drop the mirror; reads go to the database until the next load."""
+        self._load_failed_at = None
+        self.version = None
+        self._records = {}
+        self._orderings = {}
+    
+    def invalidate(self) -> None:
+        """Catch up before the next read (after a write through this worker)."""
+        self._refreshed_at = None
+    
+    async def refresh(self) -> None:
+        """Apply the products changed since the mirrored version."""
+        async with self._lock:
+            await self._catch_up()
+    
+    async def _catch_up(self) -> None:
+        if not self.loaded:
+            return
+        rows = await db.fetch(CATALOG_CHANGES, self.version)
+        for row in rows:
+            self._remove(row["product_id"])
+            if row["id"] is not None:
+                self._add(tuple(row[field] for field in PRODUCT_FIELDS))
+            self.version = max(self.version, row["catalog_version"])
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+        self.changes += len(rows)
+    
+    def _is_stale(self) -> bool:
+        return (
+            self._refreshed_at is None
+            or time.monotonic() - self._refreshed_at > self.refresh_interval
+        )
+    
+    async def _read(self) -> None:
+        if self._is_stale():
+            async with self._lock:
+                if self._is_stale():
+                    await self._catch_up()
+        self.reads += 1
+    
+    @staticmethod
+    def _listings(record: tuple) -> List[Listing]:
+        listings = [(None, False), (record[CATEGORY], False)]
+        if record[IS_ACTIVE]:
+            listings += [(None, True), (record[CATEGORY], True)]
+        return listings
+    
+    @staticmethod
+    def _sort_key(record: tuple) -> tuple:
+        return (record[CREATED_AT] or LATEST, record[ID])
+    
+    def _add(self, record: tuple) -> None:
+        self._records[record[ID]] = record
+        key = self._sort_key(record)
+        for listing in self._listings(record):
+            insort(self._orderings.setdefault(listing, []), key)
+    
+    def _remove(self, product_id: UUID) -> None:
+        record = self._records.pop(product_id, None)
+        if record is None:
+            return
+        key = self._sort_key(record)
+        for listing in self._listings(record):
+            ordering = self._orderings[listing]
+            del ordering[bisect_left(ordering, key)]
+            if not ordering:
+                del self._orderings[listing]
+    
+    def _product(self, product_id: UUID) -> dict:
+        return dict(zip(PRODUCT_FIELDS, self._records[product_id]))
+    
+    async def get(self, product_id: UUID) -> Optional[dict]:
+        """A product by id, or None."""
+        await self._read()
+        return self._product(product_id) if product_id in self._records else None
+    
+    async def page(
+        self,
+        category: Optional[str] = None,
+        active_only: bool = False,
+        page: int = 1,
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        count: str = "exact"
+    ) -> dict:
+        """One page of a listing, shaped like `paginate` results.
+        
+        Totals are exact in every count mode except "none".
+        """
+        if count not in COUNT_MODES:
+            raise ValueError(f"Unknown count mode: {count}")
+        await self._read()
+        
+        ordering = self._orderings.get((category, active_only), [])
+        if cursor:
+            created_at, product_id = decode_cursor(cursor)
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            end = bisect_left(ordering, (created_at, product_id))
+        else:
+            end = max(len(ordering) - (page - 1) * page_size, 0)
+        # One extra row tells whether another page follows
+        keys = ordering[max(end - page_size - 1, 0):end]
+        rows = [self._product(key[1]) for key in reversed(keys)]
+        total = None if count == "none" else len(ordering)
+        return build_page(rows, total, page, page_size, cursor)
+    
+    def stats(self) -> dict:
+        """Mirror size, version and refresh counters."""
+        return {
+            "enabled": self.enabled,
+            "loaded": self.loaded,
+            "version": self.version,
+            "products": len(self._records),
+            "listings": len(self._orderings),
+            "loads": self.loads,
+            "refreshes": self.refreshes,
+            "changes_applied": self.changes,
+            "reads": self.reads,
+        }
+
+
+# Global catalog mirror for this worker, loaded at startup
+catalog = CatalogMirror(
+    enabled=settings.catalog_mirror,
+    refresh_interval=settings.catalog_refresh_seconds,
+)
@@ -3,7 +3,78 @@ from typing import Optional
 from uuid import UUID
 
 from app.database import db
+from app.services.pagination import count_cache, paginate
+from app.services.query import Filter, ListQuery
+from app.services.auth import invalidate_principal, token_versions
 from app.services.user import create_user
+from app.statements import statements
+
+
+# Account statuses; only approved dealers may place orders
+DEALER_STATUSES = ("pending", "approved", "suspended")
+
+DEALER_COLUMNS = """d.id, d.user_id, d.company_name, d.contact_name, d.phone, d.address, d.status, d.created_at,
+           u.username, u.email, u.is_active"""
+
+DEALER_SELECT = f"""
+    SELECT {DEALER_COLUMNS}
+    FROM dealers d
+    JOIN users u ON u.id = d.user_id
+"""
+
+INSERT_DEALER = statements.register("dealers.insert", """
+    INSERT INTO dealers (user_id, company_name, contact_name, phone, address, status)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    RETURNING id, user_id, company_name, contact_name, phone, address, status, created_at
+""")
+
+GET_DEALER = statements.register("dealers.get_by_id", DEALER_SELECT + "WHERE d.id = $1", read_only=True)
+
+GET_DEALER_BY_USER = statements.register(
+    "dealers.get_by_user_id", DEALER_SELECT + "WHERE d.user_id = $1", read_only=True
+)
+
+# NULL parameters leave the column unchanged
+UPDATE_DEALER = statements.register("dealers.update", """
+    UPDATE dealers SET
+        company_name = COALESCE($2, company_name),
+        contact_name = COALESCE($3, contact_name),
+        phone = COALESCE($4, phone),
+        address = COALESCE($5, address)
+    WHERE id = $1
+    RETURNING user_id
+""")
+
+UPDATE_DEALER_STATUS = statements.register("dealers.update_status", """
+    WITH d AS (
+        UPDATE dealers SET status = $1
+        WHERE id = $2
+        RETURNING user_id
+    )
+    UPDATE users u SET token_version = u.token_version + 1
+    FROM d
+    WHERE u.id = d.user_id
+    RETURNING u.id AS user_id, u.token_version
+""")
+
+GET_DEALER_USER_ID = statements.register(
+    "dealers.get_user_id", "SELECT user_id FROM dealers WHERE id = $1", read_only=True
+)
+
+DELETE_USER = statements.register("users.delete", "DELETE FROM users WHERE id = $1")
+
+DEALER_LIST = ListQuery(
+    "dealers.list",
+    table="dealers",
+    columns=DEALER_COLUMNS,
+    source="dealers d JOIN users u ON u.id = d.user_id",
+    filters=[
+        Filter("status", "d.status = {0}"),
+        Filter("search", "(d.company_name ILIKE {0} OR d.contact_name ILIKE {0} OR u.email ILIKE {0})"),
+    ],
+    sorts={"newest": "d.created_at DESC, d.id DESC"},
+    keyset=("d.created_at", "d.id"),
+)
 
 
 async def create_dealer(
@@ -22,13 +93,10 @@ async def create_dealer(
     
     # Create dealer record
     dealer = await db.fetchrow(
-        """
-        INSERT INTO dealers (user_id, company_name, contact_name, phone, address, status)
-        VALUES ($1, $2, $3, $4, $5, $6)
-        RETURNING id, user_id, company_name, contact_name, phone, address, status, created_at
-        """,
+        INSERT_DEALER,
         user["id"], company_name, contact_name, phone, address, status
     )
+    count_cache.invalidate("dealers")
     
     dealer_dict = dict(dealer)
     dealer_dict["user"] = user
@@ -37,16 +105,7 @@ async def create_dealer(
 
 async def get_dealer_by_id(dealer_id: UUID) -> Optional[dict]:
     """Get dealer by ID with user information."""
-    dealer = await db.fetchrow(
-        """
-        SELECT d.id, d.user_id, d.company_name, d.contact_name, d.phone, d.address, d.status, d.created_at,
-               u.username, u.email, u.is_active
-        FROM dealers d
-        JOIN users u ON u.id = d.user_id
-        WHERE d.id = $1
-        """,
-        dealer_id
-    )
+    dealer = await db.fetchrow(GET_DEALER, dealer_id)
     
     if not dealer:
         return None
@@ -64,16 +123,7 @@ async def get_dealer_by_id(dealer_id: UUID) -> Optional[dict]:
 
 async def get_dealer_by_user_id(user_id: UUID) -> Optional[dict]:
     """Get dealer by user ID."""
-    dealer = await db.fetchrow(
-        """
-        SELECT d.id, d.user_id, d.company_name, d.contact_name, d.phone, d.address, d.status, d.created_at,
-               u.username, u.email, u.is_active
-        FROM dealers d
-        JOIN users u ON u.id = d.user_id
-        WHERE d.user_id = $1
-        """,
-        user_id
-    )
+    dealer = await db.fetchrow(GET_DEALER_BY_USER, user_id)
     
     if not dealer:
         return None
@@ -97,55 +147,30 @@ async def update_dealer(
     address: Optional[str] = None
 ) -> Optional[dict]:
     """Update dealer information."""
-    updates = []
-    params = []
-    param_count = 1
-    
-    field_map = {
-        "company_name": company_name,
-        "contact_name": contact_name,
-        "phone": phone,
-        "address": address,
-    }
-    
-    for field, value in field_map.items():
-        if value is not None:
-            updates.append(f"{field} = ${param_count}")
-            params.append(value)
-            param_count += 1
-    
-    if not updates:
+    fields = (company_name, contact_name, phone, address)
+    if all(value is None for value in fields):
         return await get_dealer_by_id(dealer_id)
     
-    params.append(dealer_id)
-    
-    query = f"""
-        UPDATE dealers SET {', '.join(updates)}
-        WHERE id = ${param_count}
-        RETURNING id
-    """
-    
-    result = await db.fetchrow(query, *params)
+    result = await db.fetchrow(UPDATE_DEALER, dealer_id, *fields)
+    count_cache.invalidate("dealers")
     if not result:
         return None
     
+    invalidate_principal(result["user_id"])
     return await get_dealer_by_id(dealer_id)
 
 
 async def update_dealer_status(dealer_id: UUID, status: str) -> Optional[dict]:
     """Update dealer status (pending/approved/suspended)."""
-    result = await db.fetchrow(
-        """
-        UPDATE dealers SET status = $1
-        WHERE id = $2
-        RETURNING id
-        """,
-        status, dealer_id
-    )
+    # Tokens carry the dealer status, so a status change also revokes them
+    result = await db.fetchrow(UPDATE_DEALER_STATUS, status, dealer_id)
+    count_cache.invalidate("dealers")
     
     if not result:
         return None
     
+    invalidate_principal(result["user_id"])
+    token_versions.set(result["user_id"], result["token_version"])
     return await get_dealer_by_id(dealer_id)
 
 
@@ -153,87 +178,44 @@ async def list_dealers(
     page: int = 1,
     page_size: int = 20,
     status: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = "exact"
 ) -> dict:
-    """List dealers with pagination and filtering."""
-    offset = (page - 1) * page_size
-    
-    conditions = []
-    params = []
-    param_count = 1
-    
-    if status:
-        conditions.append(f"d.status = ${param_count}")
-        params.append(status)
-        param_count += 1
-    
-    if search:
-        conditions.append(f"(d.company_name ILIKE ${param_count} OR d.contact_name ILIKE ${param_count} OR u.email ILIKE ${param_count})")
-        params.append(f"%{search}%")
-        param_count += 1
-    
-    where_clause = ""
-    if conditions:
-        where_clause = "WHERE " + " AND ".join(conditions)
-    
-    # Get total count
-    count_query = f"""
-        SELECT COUNT(*) FROM dealers d
-        JOIN users u ON u.id = d.user_id
-        {where_clause}
-    """
-    total = await db.fetchval(count_query, *params)
-    
-    # Get dealers
-    params.extend([page_size, offset])
-    query = f"""
-        SELECT d.id, d.user_id, d.company_name, d.contact_name, d.phone, d.address, d.status, d.created_at,
-               u.username, u.email, u.is_active
-        FROM dealers d
-        JOIN users u ON u.id = d.user_id
-        {where_clause}
-        ORDER BY d.created_at DESC
-        LIMIT ${param_count} OFFSET ${param_count + 1}
-    """
-    
-    dealers = await db.fetch(query, *params)
-    
-    items = []
-    for d in dealers:
-        item = dict(d)
+    """List dealers with page or cursor pagination and filtering."""
+    filters = {
+        "status": status or None,
+        "search": f"%{search}%" if search else None,
+    }
+    result = await paginate(
+        DEALER_LIST, filters,
+        page=page, page_size=page_size, cursor=cursor, count=count
+    )
+    
+    for item in result["items"]:
         item["user"] = {
             "id": item.pop("user_id"),
             "username": item.pop("username"),
             "email": item.pop("email"),
             "is_active": item.pop("is_active"),
         }
-        items.append(item)
-    
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "pages": (total + page_size - 1) // page_size if total > 0 else 1
-    }
+    
+    return result
 
 
 async def delete_dealer(dealer_id: UUID) -> bool:
     """Delete a dealer and associated user."""
     # Get user_id first
-    dealer = await db.fetchrow(
-        "SELECT user_id FROM dealers WHERE id = $1",
-        dealer_id
-    )
+    dealer = await db.fetchrow(GET_DEALER_USER_ID, dealer_id)
     
     if not dealer:
         return False
     
     # Delete user (cascades to dealer)
-    result = await db.execute(
-        "DELETE FROM users WHERE id = $1",
-        dealer["user_id"]
-    )
+    result = await db.execute(DELETE_USER, dealer["user_id"])
+    count_cache.invalidate("users", "dealers")
+    invalidate_principal(dealer["user_id"])
+    token_versions.discard(dealer["user_id"])
     
     return "DELETE 1" in result
 
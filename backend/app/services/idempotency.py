@@ -0,0 +1,191 @@
+"""Idempotency keys for retried writes.
+
+Clients send the same `Idempotency-Key` with every retry of a write. The
+first request to complete stores its response in `idempotency_keys` in the
+same transaction as the write, and later requests with the key get that
+response back instead of writing again. Responses are kept for
+`settings.idempotency_key_ttl_seconds`.
+
+Within a worker, completed keys are answered from an LRU without a database
+round trip, and a retry arriving while the first request is still running
+waits for it. Across workers, the key row inserted by the first request
+blocks the second request's insert until the first commits or rolls back.
+"""
+import asyncio
+import json
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.database import db, Transaction
+from app.services.cache import TTLCache
+from app.statements import statements
+
+
+# Claims a new key, or takes over one whose response has expired. Blocks
+# while another transaction holds an uncommitted claim on the same key.
+CLAIM_KEY = statements.register("idempotency_keys.claim", """
+    INSERT INTO idempotency_keys AS k (scope, key, request_hash, expires_at)
+    VALUES ($1, $2, $3, CURRENT_TIMESTAMP + make_interval(secs => $4))
+    ON CONFLICT (scope, key) DO UPDATE
+    SET request_hash = EXCLUDED.request_hash, response = NULL,
+        created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+    WHERE k.expires_at <= CURRENT_TIMESTAMP
+    RETURNING expires_at
+""")
+
+STORE_RESPONSE = statements.register("idempotency_keys.store_response", """
+    UPDATE idempotency_keys SET response = $3
+    WHERE scope = $1 AND key = $2
+""")
+
+GET_KEY = statements.register("idempotency_keys.get", """
+    SELECT request_hash, response, expires_at
+    FROM idempotency_keys
+    WHERE scope = $1 AND key = $2 AND expires_at > CURRENT_TIMESTAMP
+""", read_only=True)
+
+PURGE_EXPIRED = statements.register("idempotency_keys.purge_expired", """
+    DELETE FROM idempotency_keys
+    WHERE (scope, key) IN (
+        SELECT scope, key FROM idempotency_keys
+        WHERE expires_at <= CURRENT_TIMESTAMP
+        LIMIT $1
+    )
+""")
+
+
+class IdempotencyKeyMismatch(ValueError):
+    """Raised when a key is reused for a request with a different body."""
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _serialize(response: Any) -> str:
+    return json.dumps(response, default=_json_default, ensure_ascii=False)
+
+
+class IdempotencyStore:
+    """Runs each (scope, key) write once and replays its stored response."""
+    
+    def __init__(self, ttl: float, cache_size: int, purge_interval: float = 60.0, purge_batch: int = 1000):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.purge_batch = purge_batch
+        self._cache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._purged_at = time.monotonic()
+        self.replays = 0
+        self.waits = 0
+    
+    async def run(
+        self,
+        scope: str,
+        key: str,
+        request_hash: str,
+        write: Callable[[Transaction], Awaitable[Any]],
+    ) -> Tuple[Any, bool]:
+        """Run `write` once per key; returns (response, replayed).
+        
+        `write` is called with the transaction that records the key and
+        returns a JSON-serializable response. A replayed response has its
+        UUIDs, decimals and timestamps as strings. Raises
+        IdempotencyKeyMismatch if the key was used with another request hash.
+        If `write` fails, nothing is recorded and the key can be retried.
+        """
+        cache_key = (scope, key)
+        while True:
+            entry = self._cache.get(cache_key)
+            if entry is not None:
+                return self._replay(entry, request_hash)
+            pending = self._in_flight.get(cache_key)
+            if pending is None:
+                break
+            # The first request either stored a response or failed; check again
+            self.waits += 1
+            await asyncio.shield(pending)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[cache_key] = future
+        try:
+            return await self._execute(scope, key, request_hash, write)
+        finally:
+            del self._in_flight[cache_key]
+            future.set_result(None)
+    
+    def cached(self, scope: str, key: str, request_hash: str) -> Optional[Any]:
+        """The response this worker already holds for the key, or None.
+        
+        Lets callers skip preparation work for a replay; raises
+        IdempotencyKeyMismatch like `run`.
+        """
+        entry = self._cache.get((scope, key))
+        if entry is None:
+            return None
+        response, _ = self._replay(entry, request_hash)
+        return response
+    
+    def _replay(self, entry: tuple, request_hash: str) -> Tuple[Any, bool]:
+        stored_hash, response = entry
+        if stored_hash != request_hash:
+            raise IdempotencyKeyMismatch("Idempotency key was already used for a different request")
+        self.replays += 1
+        return response, True
+    
+    def _remember(self, cache_key: tuple, entry: tuple, expires_at: datetime) -> None:
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        if remaining > 0:
+            self._cache.set(cache_key, entry, ttl=min(remaining, self.ttl))
+    
+    async def _execute(self, scope: str, key: str, request_hash: str, write) -> Tuple[Any, bool]:
+        cache_key = (scope, key)
+        while True:
+            async with db.transaction() as tx:
+                expires_at = await tx.fetchval(CLAIM_KEY, scope, key, request_hash, float(self.ttl))
+                if expires_at is not None:
+                    response = await write(tx)
+                    stored = _serialize(response)
+                    await tx.execute(STORE_RESPONSE, scope, key, stored)
+            
+            if expires_at is not None:
+                # Cached as it reads back from the table, so replays look the same
+                self._remember(cache_key, (request_hash, json.loads(stored)), expires_at)
+                await self._purge_expired()
+                return response, False
+            
+            # Completed by another request (possibly in another worker). If it
+            # expired in the meantime, claim it again.
+            row = await db.fetchrow(GET_KEY, scope, key)
+            if row is not None:
+                entry = (row["request_hash"], json.loads(row["response"]))
+                self._remember(cache_key, entry, row["expires_at"])
+                return self._replay(entry, request_hash)
+    
+    async def _purge_expired(self) -> None:
+        """Delete a batch of expired keys, at most once per purge interval."""
+        now = time.monotonic()
+        if now - self._purged_at < self.purge_interval:
+            return
+        self._purged_at = now
+        await db.execute(PURGE_EXPIRED, self.purge_batch)
+    
+    def stats(self) -> dict:
+        """Return cache, replay and in-flight counters."""
+        return {
+            **self._cache.stats(),
+            "in_flight": len(self._in_flight),
+            "replays": self.replays,
+            "waits": self.waits,
+        }
+
+
+# Global idempotency store for this worker
+idempotency = IdempotencyStore(
+    ttl=settings.idempotency_key_ttl_seconds,
+    cache_size=settings.idempotency_cache_size,
+)
@@ -0,0 +1,82 @@
+"""JWT signing/verification backends selectable by configuration."""
+from abc import ABC, abstractmethod
+
+from app.config import settings
+
+
+class TokenError(Exception):
+    """Raised when a token fails signature or claims verification."""
+
+
+class JWTBackend(ABC):
+    """Abstract JWT backend interface."""
+    
+    def __init__(self, secret_key: str, algorithm: str):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+    
+    @abstractmethod
+    def encode(self, claims: dict) -> str:
+        """Sign claims and return the compact token."""
+        pass
+    
+    @abstractmethod
+    def decode(self, token: str) -> dict:
+        """Verify a token and return its claims, raising TokenError if invalid."""
+        pass
+
+
+class JoseBackend(JWTBackend):
+    """python-jose implementation (default)."""
+    
+    def __init__(self, secret_key: str, algorithm: str):
+        super().__init__(secret_key, algorithm)
+        from jose import JWTError, jwt
+        self._jwt = jwt
+        self._error = JWTError
+    
+    def encode(self, claims: dict) -> str:
+        return self._jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+    
+    def decode(self, token: str) -> dict:
+        try:
+            return self._jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except self._error as e:
+            raise TokenError(str(e)) from e
+
+
+class PyJWTBackend(JWTBackend):
+    """PyJWT implementation (requires the optional PyJWT package)."""
+    
+    def __init__(self, secret_key: str, algorithm: str):
+        super().__init__(secret_key, algorithm)
+        import jwt
+        self._jwt = jwt
+        self._error = jwt.PyJWTError
+    
+    def encode(self, claims: dict) -> str:
+        return self._jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+    
+    def decode(self, token: str) -> dict:
+        try:
+            return self._jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except self._error as e:
+            raise TokenError(str(e)) from e
+
+
+JWT_BACKENDS = {
+    "jose": JoseBackend,
+    "pyjwt": PyJWTBackend,
+}
+
+
+def get_jwt_backend() -> JWTBackend:
+    """Get JWT backend based on configuration."""
+    backend_class = JWT_BACKENDS.get(settings.jwt_backend)
+    if backend_class is None:
+        raise ValueError(f"Unknown JWT backend: {settings.jwt_backend}")
+    return backend_class(settings.jwt_secret_key, settings.jwt_algorithm)
+
+
+# Global JWT backend instance
+jwt_backend = get_jwt_backend()
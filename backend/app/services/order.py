@@ -1,27 +1,281 @@
 """Order service for order management."""
-from typing import Optional, List
-from uuid import UUID
+import csv
+import hashlib
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, List, Tuple
+from uuid import UUID, uuid4
 from decimal import Decimal
-from datetime import datetime, timezone
 
-from app.database import db
+import asyncpg
+
+from app.database import db, Transaction
+from app.services.idempotency import IdempotencyKeyMismatch, idempotency
+from app.services.order_events import CHANNEL, encode, order_event, publish
+from app.services.order_number import order_numbers
+from app.services.order_stats import status_totals
+from app.services.pagination import count_cache, paginate
+from app.services.query import Filter, ListQuery
+from app.statements import statements
+
+
+# The order and all of its line items (in request order) in one statement,
+# so it needs no transaction of its own. $12/$13: the `created` event's
+# channel and payload, delivered when the statement's transaction commits.
+CREATE_ORDER = statements.register("orders.create", """
+    WITH new_order AS (
+        INSERT INTO orders (id, order_no, dealer_id, status, total_amount, shipping_address, notes)
+        VALUES ($1, $2, $3, 'pending', $4, $5, $6)
+        RETURNING id, order_no, dealer_id, status, total_amount, shipping_address, notes, created_at, updated_at
+    ),
+    new_items AS (
+        INSERT INTO order_items (order_id, product_id, product_name, quantity, unit_price, subtotal, order_created_at)
+        SELECT o.id, item.product_id, item.product_name, item.quantity, item.unit_price, item.subtotal, o.created_at
+        FROM new_order o,
+             unnest($7::uuid[], $8::varchar[], $9::int[], $10::numeric[], $11::numeric[])
+                 WITH ORDINALITY AS item(product_id, product_name, quantity, unit_price, subtotal, position)
+        ORDER BY item.position
+        RETURNING id, order_id, product_id, product_name, quantity, unit_price, subtotal
+    ),
+    notified AS (
+        SELECT pg_notify($12, $13)
+    )
+    SELECT o.*,
+           COALESCE((
+               SELECT jsonb_agg(jsonb_build_object(
+                   'id', i.id, 'order_id', i.order_id, 'product_id', i.product_id,
+                   'product_name', i.product_name, 'quantity', i.quantity,
+                   'unit_price', i.unit_price, 'subtotal', i.subtotal
+               ))
+               FROM new_items i
+           ), '[]'::jsonb) AS items
+    FROM new_order o, notified
+""")
+
+
+# Order header, dealer company and items (as a jsonb array) in one row
+ORDER_DETAIL_COLUMNS = """
+    o.id, o.order_no, o.dealer_id, o.status, o.total_amount,
+    o.shipping_address, o.notes, o.created_at, o.updated_at,
+    d.company_name as dealer_company,
+    COALESCE((
+        SELECT jsonb_agg(jsonb_build_object(
+            'id', i.id, 'order_id', i.order_id, 'product_id', i.product_id,
+            'product_name', i.product_name, 'quantity', i.quantity,
+            'unit_price', i.unit_price, 'subtotal', i.subtotal
+        ))
+        FROM order_items i WHERE i.order_id = o.id
+    ), '[]'::jsonb) AS items
+"""
+
+
+def _order_detail_sql(source: str, where: str = "") -> str:
+    """Order detail rows from `source`, the orders table or a CTE of updated orders."""
+    return f"""
+        SELECT {ORDER_DETAIL_COLUMNS}
+        FROM {source} o
+        JOIN dealers d ON d.id = o.dealer_id
+        {where}
+    """
+
+
+GET_ORDER = statements.register(
+    "orders.get_by_id", _order_detail_sql("orders", "WHERE o.id = $1"), read_only=True
+)
+
+GET_ORDER_BY_NO = statements.register(
+    "orders.get_by_order_no",
+    _order_detail_sql("orders", "WHERE o.order_no = $1"),
+    read_only=True,
+)
+
+# $2/$3: created_at range implied by the number's date, so a partitioned
+# orders table reads one or two monthly partitions
+GET_ORDER_BY_NO_IN_RANGE = statements.register(
+    "orders.get_by_order_no_in_range",
+    _order_detail_sql("orders", "WHERE o.order_no = $1 AND o.created_at >= $2 AND o.created_at < $3"),
+    read_only=True,
+)
+
+# Allowed status changes; cancelling is only possible while pending
+TRANSITIONS = {
+    "pending": ("confirmed", "cancelled"),
+    "confirmed": ("shipped",),
+    "shipped": ("delivered",),
+    "delivered": (),
+    "cancelled": (),
+}
+
+TRANSITIONS_SQL = "(VALUES " + ", ".join(
+    f"('{from_status}', '{to_status}')"
+    for from_status, targets in TRANSITIONS.items()
+    for to_status in targets
+) + ") AS allowed(from_status, to_status)"
+
+
+class InvalidTransition(ValueError):
+    """Raised when an order cannot move from its status to the requested one."""
+
+
+UPDATE_ORDER_STATUS = statements.register("orders.update_status", f"""
+    WITH updated AS (
+        UPDATE orders o SET status = $1, updated_at = CURRENT_TIMESTAMP
+        FROM {TRANSITIONS_SQL}
+        WHERE o.id = $2 AND allowed.from_status = o.status AND allowed.to_status = $1
+        RETURNING o.*
+    )
+""" + _order_detail_sql("updated"))
+
+GET_ORDER_STATUS = statements.register(
+    "orders.get_status", "SELECT status FROM orders WHERE id = $1", read_only=True
+)
+
+# Every requested change in one UPDATE; orders whose current status does
+# not allow the change are left alone. The final SELECT reads the snapshot
+# from before the update, so `previous_status` is the status the change
+# was validated against.
+UPDATE_ORDER_STATUSES = statements.register("orders.update_statuses", f"""
+    WITH request AS (
+        SELECT * FROM unnest($1::uuid[], $2::varchar[]) WITH ORDINALITY AS r(id, status, position)
+    ),
+    updated AS (
+        UPDATE orders o SET status = request.status, updated_at = CURRENT_TIMESTAMP
+        FROM request, {TRANSITIONS_SQL}
+        WHERE o.id = request.id
+          AND allowed.from_status = o.status AND allowed.to_status = request.status
+        RETURNING o.id
+    )
+    SELECT request.id, request.status AS requested_status, o.status AS previous_status,
+           updated.id IS NOT NULL AS updated, o.order_no, o.dealer_id
+    FROM request
+    LEFT JOIN orders o ON o.id = request.id
+    LEFT JOIN updated ON updated.id = request.id
+    ORDER BY request.position
+""")
+
+CANCEL_ORDER = statements.register("orders.cancel", """
+    WITH updated AS (
+        UPDATE orders SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+        WHERE id = $1 AND status = 'pending'
+        RETURNING *
+    )
+""" + _order_detail_sql("updated"))
+
+RECENT_ORDERS = statements.register("orders.recent", """
+    SELECT o.id, o.order_no, o.status, o.total_amount, o.created_at,
+           d.company_name as dealer_company
+    FROM orders o
+    JOIN dealers d ON d.id = o.dealer_id
+    ORDER BY o.created_at DESC
+    LIMIT 5
+""", read_only=True)
+
+ORDER_LIST = ListQuery(
+    "orders.list",
+    table="orders",
+    columns="""o.id, o.order_no, o.dealer_id, o.status, o.total_amount,
+               o.shipping_address, o.notes, o.created_at, o.updated_at,
+               d.company_name as dealer_company""",
+    source="orders o JOIN dealers d ON d.id = o.dealer_id",
+    count_source="orders o",
+    filters=[
+        Filter("dealer_id", "o.dealer_id = {0}"),
+        Filter("status", "o.status = {0}"),
+        # Prefix match on the text_pattern_ops index
+        Filter("order_no", "o.order_no LIKE {0}"),
+        # Substring match on the trigram indexes; the dealer ids are computed
+        # once so every branch of the OR can use an index.
+        Filter("search", """(
+            o.order_no ILIKE {0}
+            OR o.shipping_address ILIKE {0}
+            OR o.dealer_id = ANY(ARRAY(SELECT id FROM dealers WHERE company_name ILIKE {0}))
+        )"""),
+    ],
+    sorts={"newest": "o.created_at DESC, o.id DESC"},
+    keyset=("o.created_at", "o.id"),
+)
+
+ORDER_EXPORT = ListQuery(
+    "orders.export",
+    table="orders",
+    columns=ORDER_DETAIL_COLUMNS,
+    source="orders o JOIN dealers d ON d.id = o.dealer_id",
+    filters=[
+        Filter("dealer_id", "o.dealer_id = {0}"),
+        Filter("status", "o.status = {0}"),
+        Filter("since", "o.created_at >= {0}"),
+        Filter("until", "o.created_at < {0}"),
+    ],
+    sorts={"oldest": "o.created_at, o.id"},
+    keyset=("o.created_at", "o.id"),
+)
+
+EXPORT_CSV_COLUMNS = [
+    "order_no", "created_at", "dealer_company", "status", "total_amount",
+    "shipping_address", "notes", "product_name", "quantity", "unit_price", "subtotal",
+]
+
+
+# Unique constraints a new order's number can collide with. A partitioned
+# orders table only enforces (order_no, created_at) unique, so numbers are
+# kept unique across partitions by the trigger-maintained order_numbers
+# table (migration 013), in the inserting transaction.
+ORDER_NO_CONSTRAINTS = {"orders_order_no_key", "order_numbers_pkey"}
+
+# Numbers tried per order before the collision is raised
+ORDER_NO_ATTEMPTS = 3
 
 
 async def generate_order_no() -> str:
     """Generate unique order number: ORD{YYYYMMDD}{NNN}."""
-    today = datetime.now(timezone.utc).strftime("%Y%m%d")
-    
-    # Get today's order count
-    count = await db.fetchval(
-        """
-        SELECT COUNT(*) FROM orders 
-        WHERE order_no LIKE $1
-        """,
-        f"ORD{today}%"
+    return await order_numbers.allocate()
+
+
+async def _with_order_no(write: Callable[[str], Awaitable[Any]]) -> Any:
+    """Run `write` with a new order number, moving past numbers already taken."""
+    for attempt in range(1, ORDER_NO_ATTEMPTS + 1):
+        order_no = await generate_order_no()
+        try:
+            return await write(order_no)
+        except asyncpg.UniqueViolationError as e:
+            if e.constraint_name not in ORDER_NO_CONSTRAINTS or attempt == ORDER_NO_ATTEMPTS:
+                raise
+            await order_numbers.skip_taken(order_no)
+
+
+def _order_totals(items: List[dict]) -> tuple:
+    unit_prices = [Decimal(str(item["unit_price"])) for item in items]
+    subtotals = [price * item["quantity"] for price, item in zip(unit_prices, items)]
+    return unit_prices, subtotals, sum(subtotals, Decimal(0))
+
+
+async def _insert_order(
+    conn,
+    order_no: str,
+    dealer_id: UUID,
+    items: List[dict],
+    shipping_address: str,
+    notes: Optional[str]
+) -> dict:
+    """Insert an order with its items through `conn` (the database or a transaction)."""
+    unit_prices, subtotals, total_amount = _order_totals(items)
+    order_id = uuid4()
+    event = order_event("created", {
+        "id": order_id, "order_no": order_no, "dealer_id": dealer_id, "status": "pending",
+    })
+    order = await conn.fetchrow(
+        CREATE_ORDER,
+        order_id, order_no, dealer_id, total_amount, shipping_address, notes,
+        [item["product_id"] for item in items],
+        [item["product_name"] for item in items],
+        [item["quantity"] for item in items],
+        unit_prices,
+        subtotals,
+        CHANNEL,
+        encode(event)
     )
-    
-    next_num = (count or 0) + 1
-    return f"ORD{today}{next_num:03d}"
+    return _order_from_row(order)
 
 
 async def create_order(
@@ -30,142 +284,176 @@ async def create_order(
     shipping_address: str,
     notes: Optional[str] = None
 ) -> dict:
-    """Create a new order with items."""
-    order_no = await generate_order_no()
-    
-    # Calculate total amount
-    total_amount = sum(
-        Decimal(str(item["unit_price"])) * item["quantity"] 
-        for item in items
-    )
-    
-    # Create order
-    order = await db.fetchrow(
-        """
-        INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address, notes)
-        VALUES ($1, $2, 'pending', $3, $4, $5)
-        RETURNING id, order_no, dealer_id, status, total_amount, shipping_address, notes, created_at, updated_at
-        """,
-        order_no, dealer_id, total_amount, shipping_address, notes
-    )
+    """Create a new order with items.
     
-    order_dict = dict(order)
+    The order and all of its items are written by a single statement, in
+    one round trip whatever the number of items.
+    """
+    async def write(order_no: str) -> dict:
+        return await _insert_order(db, order_no, dealer_id, items, shipping_address, notes)
     
-    # Create order items
-    order_items = []
-    for item in items:
-        subtotal = Decimal(str(item["unit_price"])) * item["quantity"]
-        order_item = await db.fetchrow(
-            """
-            INSERT INTO order_items (order_id, product_id, product_name, quantity, unit_price, subtotal)
-            VALUES ($1, $2, $3, $4, $5, $6)
-            RETURNING id, order_id, product_id, product_name, quantity, unit_price, subtotal
-            """,
-            order_dict["id"], item["product_id"], item["product_name"], 
-            item["quantity"], Decimal(str(item["unit_price"])), subtotal
-        )
-        order_items.append(dict(order_item))
+    order = await _with_order_no(write)
+    count_cache.invalidate("orders")
+    return order
+
+
+def _request_hash(items: List[dict], shipping_address: str, notes: Optional[str]) -> str:
+    body = {"items": items, "shipping_address": shipping_address, "notes": notes}
+    encoded = json.dumps(body, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+async def create_order_once(
+    dealer_id: UUID,
+    idempotency_key: str,
+    items: List[dict],
+    shipping_address: str,
+    notes: Optional[str] = None
+) -> Tuple[dict, bool]:
+    """Create an order at most once per dealer and idempotency key.
     
-    order_dict["items"] = order_items
-    return order_dict
+    Returns (order, replayed). A retry gets the order created by the first
+    request without writing again; raises IdempotencyKeyMismatch if the key
+    was used for a different order body.
+    """
+    async def write(order_no: str) -> Tuple[dict, bool]:
+        async def insert(tx: Transaction) -> dict:
+            return await _insert_order(tx, order_no, dealer_id, items, shipping_address, notes)
+        return await idempotency.run(scope, idempotency_key, request_hash, insert)
+    
+    scope = f"orders:{dealer_id}"
+    request_hash = _request_hash(items, shipping_address, notes)
+    order = idempotency.cached(scope, idempotency_key, request_hash)
+    if order is not None:
+        return order, True
+    
+    # Numbered up front so the claim transaction never waits on the
+    # allocator; a replay from the database leaves a gap in the numbering.
+    order, replayed = await _with_order_no(write)
+    if not replayed:
+        count_cache.invalidate("orders")
+    return order, replayed
+
+
+def _order_from_row(row) -> dict:
+    """Convert an order detail row, decoding its aggregated items."""
+    order = dict(row)
+    order["items"] = [
+        {
+            **item,
+            "id": UUID(item["id"]),
+            "order_id": UUID(item["order_id"]),
+            "product_id": UUID(item["product_id"]),
+        }
+        for item in order["items"]
+    ]
+    return order
 
 
 async def get_order_by_id(order_id: UUID) -> Optional[dict]:
     """Get order by ID with items."""
-    order = await db.fetchrow(
-        """
-        SELECT o.id, o.order_no, o.dealer_id, o.status, o.total_amount, 
-               o.shipping_address, o.notes, o.created_at, o.updated_at,
-               d.company_name as dealer_company
-        FROM orders o
-        JOIN dealers d ON d.id = o.dealer_id
-        WHERE o.id = $1
-        """,
-        order_id
-    )
-    
-    if not order:
-        return None
-    
-    order_dict = dict(order)
-    
-    # Get order items
-    items = await db.fetch(
-        """
-        SELECT id, order_id, product_id, product_name, quantity, unit_price, subtotal
-        FROM order_items WHERE order_id = $1
-        """,
-        order_id
-    )
-    order_dict["items"] = [dict(item) for item in items]
-    
-    return order_dict
+    order = await db.fetchrow(GET_ORDER, order_id)
+    return _order_from_row(order) if order else None
 
 
 async def get_order_by_order_no(order_no: str) -> Optional[dict]:
     """Get order by order number with items."""
-    order = await db.fetchrow(
-        """
-        SELECT o.id, o.order_no, o.dealer_id, o.status, o.total_amount, 
-               o.shipping_address, o.notes, o.created_at, o.updated_at,
-               d.company_name as dealer_company
-        FROM orders o
-        JOIN dealers d ON d.id = o.dealer_id
-        WHERE o.order_no = $1
-        """,
-        order_no
-    )
-    
-    if not order:
-        return None
-    
-    order_dict = dict(order)
-    
-    # Get order items
-    items = await db.fetch(
-        """
-        SELECT id, order_id, product_id, product_name, quantity, unit_price, subtotal
-        FROM order_items WHERE order_id = $1
-        """,
-        order_dict["id"]
-    )
-    order_dict["items"] = [dict(item) for item in items]
-    
-    return order_dict
+    day = _order_no_day(order_no)
+    order = None
+    if day is not None:
+        # Created on the numbered business day, or just after midnight if
+        # the number was allocated just before it
+        order = await db.fetchrow(
+            GET_ORDER_BY_NO_IN_RANGE,
+            order_no, _business_midnight(day), _business_midnight(day + timedelta(days=2))
+        )
+    if order is None:
+        order = await db.fetchrow(GET_ORDER_BY_NO, order_no)
+    return _order_from_row(order) if order else None
+
+
+def _status_event(order: dict) -> dict:
+    return order_event("cancelled" if order["status"] == "cancelled" else "status_changed", order)
 
 
 async def update_order_status(order_id: UUID, status: str) -> Optional[dict]:
-    """Update order status."""
-    order = await db.fetchrow(
-        """
-        UPDATE orders SET status = $1, updated_at = CURRENT_TIMESTAMP
-        WHERE id = $2
-        RETURNING id, order_no, dealer_id, status, total_amount, shipping_address, notes, created_at, updated_at
-        """,
-        status, order_id
-    )
+    """Update order status and return the updated order with items.
     
+    Returns None if the order does not exist; raises InvalidTransition if
+    its current status does not allow the change. The change event is
+    published in the same transaction.
+    """
+    async with db.transaction() as tx:
+        order = await tx.fetchrow(UPDATE_ORDER_STATUS, status, order_id)
+        if order:
+            order = _order_from_row(order)
+            await publish([_status_event(order)], tx)
     if not order:
-        return None
+        current = await db.fetchval(GET_ORDER_STATUS, order_id)
+        if current is None:
+            return None
+        raise InvalidTransition(f"Cannot change order status from {current} to {status}")
     
-    return await get_order_by_id(order_id)
+    count_cache.invalidate("orders")
+    return order
 
 
-async def cancel_order(order_id: UUID) -> Optional[dict]:
-    """Cancel an order (only if pending)."""
-    order = await db.fetchrow(
-        """
-        UPDATE orders SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
-        WHERE id = $1 AND status = 'pending'
-        RETURNING id
-        """,
-        order_id
-    )
-    
-    if not order:
-        return None
+async def update_order_statuses(changes: List[dict]) -> List[dict]:
+    """Apply status changes to many orders in one statement.
     
-    return await get_order_by_id(order_id)
+    Each change is a dict with `order_id` and `status`. Returns one result
+    per change, in order, telling whether it was applied. Change events are
+    published in the same transaction.
+    """
+    order_ids = [change["order_id"] for change in changes]
+    if len(set(order_ids)) != len(order_ids):
+        raise ValueError("Each order may appear only once per batch")
+    
+    async with db.transaction() as tx:
+        rows = await tx.fetch(
+            UPDATE_ORDER_STATUSES,
+            order_ids, [change["status"] for change in changes]
+        )
+        await publish([
+            _status_event({**row, "status": row["requested_status"]})
+            for row in rows if row["updated"]
+        ], tx)
+    
+    results = []
+    for row in rows:
+        error = None
+        if row["previous_status"] is None:
+            error = "Order not found"
+        elif not row["updated"]:
+            error = f"Cannot change order status from {row['previous_status']} to {row['requested_status']}"
+        results.append({
+            "order_id": row["id"],
+            "status": row["requested_status"] if row["updated"] else row["previous_status"],
+            "previous_status": row["previous_status"],
+            "updated": row["updated"],
+            "error": error,
+        })
+    
+    if any(result["updated"] for result in results):
+        count_cache.invalidate("orders")
+    return results
+
+
+async def cancel_order(order_id: UUID) -> Optional[dict]:
+    """Cancel an order (only if pending) and return it with items."""
+    async with db.transaction() as tx:
+        order = await tx.fetchrow(CANCEL_ORDER, order_id)
+        if not order:
+            return None
+        order = _order_from_row(order)
+        await publish([_status_event(order)], tx)
+    count_cache.invalidate("orders")
+    return order
+
+
+def _escape_like(value: str) -> str:
+    """Match `value` literally inside a LIKE pattern."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
 async def list_orders(
@@ -173,102 +461,110 @@ async def list_orders(
     page_size: int = 20,
     dealer_id: Optional[UUID] = None,
     status: Optional[str] = None,
-    order_no: Optional[str] = None
+    order_no: Optional[str] = None,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = "exact"
 ) -> dict:
-    """List orders with pagination and filtering."""
-    offset = (page - 1) * page_size
-    
-    conditions = []
-    params = []
-    param_count = 1
-    
-    if dealer_id:
-        conditions.append(f"o.dealer_id = ${param_count}")
-        params.append(dealer_id)
-        param_count += 1
-    
-    if status:
-        conditions.append(f"o.status = ${param_count}")
-        params.append(status)
-        param_count += 1
-    
-    if order_no:
-        conditions.append(f"o.order_no ILIKE ${param_count}")
-        params.append(f"%{order_no}%")
-        param_count += 1
+    """List orders with page or cursor pagination and filtering.
     
-    where_clause = ""
-    if conditions:
-        where_clause = "WHERE " + " AND ".join(conditions)
-    
-    # Get total count
-    count_query = f"SELECT COUNT(*) FROM orders o {where_clause}"
-    total = await db.fetchval(count_query, *params)
-    
-    # Get orders
-    params.extend([page_size, offset])
-    query = f"""
-        SELECT o.id, o.order_no, o.dealer_id, o.status, o.total_amount, 
-               o.shipping_address, o.notes, o.created_at, o.updated_at,
-               d.company_name as dealer_company
-        FROM orders o
-        JOIN dealers d ON d.id = o.dealer_id
-        {where_clause}
-        ORDER BY o.created_at DESC
-        LIMIT ${param_count} OFFSET ${param_count + 1}
+    `order_no` matches order numbers starting with it (so a full number
+    matches exactly); `search` matches a substring of the order number,
+    shipping address or dealer company name.
     """
-    
-    orders = await db.fetch(query, *params)
-    
-    return {
-        "items": [dict(o) for o in orders],
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "pages": (total + page_size - 1) // page_size if total > 0 else 1
+    filters = {
+        "dealer_id": dealer_id,
+        "status": status or None,
+        # Order numbers are generated in upper case
+        "order_no": f"{_escape_like(order_no.upper())}%" if order_no else None,
+        "search": f"%{_escape_like(search)}%" if search else None,
     }
+    return await paginate(
+        ORDER_LIST, filters,
+        page=page, page_size=page_size, cursor=cursor, count=count
+    )
 
 
 async def get_order_stats() -> dict:
     """Get order statistics for dashboard."""
-    # Total orders by status
-    status_counts = await db.fetch(
-        """
-        SELECT status, COUNT(*) as count
-        FROM orders
-        GROUP BY status
-        """
-    )
-    
-    # Total revenue
-    total_revenue = await db.fetchval(
-        "SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE status != 'cancelled'"
-    )
-    
-    # Today's orders
-    today_orders = await db.fetchval(
-        """
-        SELECT COUNT(*) FROM orders 
-        WHERE DATE(created_at) = CURRENT_DATE
-        """
-    )
+    # Counts and revenue from the per-day rollup
+    totals = await status_totals(order_numbers.business_day())
     
     # Recent orders
-    recent_orders = await db.fetch(
-        """
-        SELECT o.id, o.order_no, o.status, o.total_amount, o.created_at,
-               d.company_name as dealer_company
-        FROM orders o
-        JOIN dealers d ON d.id = o.dealer_id
-        ORDER BY o.created_at DESC
-        LIMIT 5
-        """
-    )
+    recent_orders = await db.fetch(RECENT_ORDERS, replica=True)
     
     return {
-        "status_counts": {row["status"]: row["count"] for row in status_counts},
-        "total_revenue": float(total_revenue),
-        "today_orders": today_orders,
+        "status_counts": {status: row["count"] for status, row in totals.items()},
+        "total_revenue": float(sum(
+            row["revenue"] for status, row in totals.items() if status != "cancelled"
+        )),
+        "today_orders": sum(row["today"] for row in totals.values()),
         "recent_orders": [dict(o) for o in recent_orders]
     }
 
+
+def _order_no_day(order_no: str) -> Optional[date]:
+    """Business day in an ORD{YYYYMMDD}{NNN} number, or None."""
+    try:
+        return datetime.strptime(order_no[3:11], "%Y%m%d").date() if order_no.startswith("ORD") else None
+    except ValueError:
+        return None
+
+
+def _business_midnight(day: date) -> datetime:
+    return datetime.combine(day, time(), tzinfo=order_numbers.timezone)
+
+
+async def export_orders(
+    fmt: str = "csv",
+    dealer_id: Optional[UUID] = None,
+    status: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    chunk_rows: int = 200
+) -> AsyncIterator[str]:
+    """Stream orders with their items, oldest first, as CSV or NDJSON text chunks.
+    
+    CSV has one line per order item (orders without items get one line with
+    empty item columns); NDJSON has one order per line with an `items`
+    array. `start` and `end` are inclusive business days. Rows come from a
+    server-side cursor, so memory use does not grow with the export.
+    """
+    filters = {
+        "dealer_id": dealer_id,
+        "status": status or None,
+        "since": _business_midnight(start) if start else None,
+        "until": _business_midnight(end + timedelta(days=1)) if end else None,
+    }
+    present, params = ORDER_EXPORT.bind(filters)
+    rows = db.cursor(ORDER_EXPORT.select(present), *params, replica=True)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(EXPORT_CSV_COLUMNS)
+    # Send the header (or nothing) at once so the client sees the response start
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    
+    pending = 0
+    async for row in rows:
+        order = dict(row)
+        if fmt == "csv":
+            header = [order[column] for column in EXPORT_CSV_COLUMNS[:7]]
+            for item in order["items"] or [{}]:
+                writer.writerow(header + [item.get(column) for column in EXPORT_CSV_COLUMNS[7:]])
+        else:
+            buffer.write(json.dumps(order, default=str, ensure_ascii=False))
+            buffer.write("\n")
+        
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    
+    if pending:
+        yield buffer.getvalue()
@@ -0,0 +1,290 @@
+"""Order change events over Postgres LISTEN/NOTIFY.
+
+Writes publish a compact JSON event per order on the `order_events`
+channel: `created`, `status_changed` or `cancelled`, with the order's id,
+number, dealer and new status. Each write sends its events in the
+transaction that makes the change, so they are delivered if and only if it
+commits, and every listener sees them in commit order.
+
+Each worker holds one LISTEN connection, outside the pool, and fans events
+out to its subscribers (the SSE streams of `GET /api/orders/events`), each
+through a bounded queue. A subscriber whose queue is full is too slow: it
+is dropped and its stream ends, and the client reconnects.
+
+The last `settings.order_events_buffer_size` events are kept so a
+reconnecting client can resume after its Last-Event-ID. If that event is no
+longer buffered, or the listener itself lost its connection and may have
+missed events, the client receives a `reset` event and should reload
+instead.
+"""
+import asyncio
+import json
+import logging
+import secrets
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Set, Union
+
+import asyncpg
+
+from app.config import settings
+from app.database import db, Transaction
+from app.statements import statements
+
+
+logger = logging.getLogger("app.order_events")
+
+CHANNEL = "order_events"
+
+# One notification per payload, in one round trip
+PUBLISH = statements.register("order_events.publish", """
+    SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload
+""")
+
+# Queue markers: the stream ends, or the client must reload
+DROPPED = object()
+RESET = {"type": "reset"}
+
+# Delay before reconnecting a lost LISTEN connection
+RECONNECT_DELAY_SECONDS = 1.0
+
+
+def order_event(kind: str, order: dict) -> dict:
+    """Event for an order (any mapping with id, order_no, dealer_id and status)."""
+    return {
+        "id": secrets.token_hex(8),
+        "type": kind,
+        "order_id": str(order["id"]),
+        "order_no": order["order_no"],
+        "dealer_id": str(order["dealer_id"]),
+        "status": order["status"],
+        "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+    }
+
+
+def encode(event: dict) -> str:
+    """NOTIFY payload of an event."""
+    return json.dumps(event, separators=(",", ":"))
+
+
+async def publish(events: List[dict], tx: Optional[Transaction] = None) -> None:
+    """NOTIFY each event; inside `tx`, they are delivered when it commits."""
+    if not events:
+        return
+    await (tx or db).execute(PUBLISH, CHANNEL, [encode(event) for event in events])
+
+
+class Subscription:
+    """Events for one stream: all orders, or one dealer's."""
+    
+    def __init__(self, dealer_id: Optional[str], queue_size: int):
+        self.dealer_id = dealer_id
+        self.ended = False
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+    
+    def wants(self, event: dict) -> bool:
+        return event is RESET or self.dealer_id is None or event.get("dealer_id") == self.dealer_id
+    
+    def offer(self, event: dict) -> bool:
+        """Queue an event without waiting; False if the queue is full."""
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    def end(self) -> None:
+        """Discard queued events and end the stream."""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(DROPPED)
+    
+    async def next(self, timeout: float) -> Optional[dict]:
+        """Next event, or None after `timeout` seconds without one or once ended."""
+        try:
+            event = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is DROPPED:
+            self.ended = True
+            return None
+        return event
+
+
+class OrderEventHub:
+    """Receives order events on one LISTEN connection and fans them out."""
+    
+    def __init__(self, buffer_size: int, queue_size: int, heartbeat: float):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._subscribers: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.reconnects = 0
+    
+    def start(self) -> None:
+        """Start listening in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+    
+    async def stop(self) -> None:
+        """Stop listening and end every stream."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.end_streams()
+    
+    def end_streams(self) -> None:
+        """End every open stream (clients reconnect and resume)."""
+        for subscription in self._subscribers:
+            subscription.end()
+        self._subscribers.clear()
+    
+    async def _listen(self) -> None:
+        reconnecting = False
+        while True:
+            try:
+                conn = await db.dedicated_connection()
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning("order events: cannot connect: %s", e)
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+                continue
+            
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _: lost.set())
+            try:
+                await conn.add_listener(CHANNEL, self._on_notify)
+                self.connected = True
+                if reconnecting:
+                    # Events published while disconnected are gone
+                    self._reset()
+                await self._watch(conn, lost)
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning("order events: connection lost: %s", e)
+            finally:
+                self.connected = False
+                if not conn.is_closed():
+                    conn.terminate()
+            if lost.is_set():
+                logger.warning("order events: connection closed, reconnecting")
+            reconnecting = True
+            self.reconnects += 1
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+    
+    async def _watch(self, conn, lost: asyncio.Event) -> None:
+        # A dead peer may never close the socket; ping it when idle
+        while not lost.is_set():
+            try:
+                await asyncio.wait_for(lost.wait(), self.heartbeat)
+            except asyncio.TimeoutError:
+                await conn.fetchval("SELECT 1", timeout=self.heartbeat)
+    
+    def _on_notify(self, conn, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("order events: ignoring malformed payload %r", payload[:100])
+            return
+        self.received += 1
+        self._buffer.append(event)
+        self._fan_out(event)
+    
+    def _fan_out(self, event: dict) -> None:
+        for subscription in list(self._subscribers):
+            if not subscription.wants(event):
+                continue
+            if subscription.offer(event):
+                self.delivered += 1
+            else:
+                self._drop(subscription)
+    
+    def _drop(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        subscription.end()
+        self.dropped += 1
+    
+    def _reset(self) -> None:
+        self._buffer.clear()
+        self._fan_out(RESET)
+    
+    def _since(self, last_event_id: str) -> Optional[List[dict]]:
+        """Buffered events after `last_event_id`, or None if it is not buffered."""
+        events = list(self._buffer)
+        for position in range(len(events) - 1, -1, -1):
+            if events[position]["id"] == last_event_id:
+                return events[position + 1:]
+        return None
+    
+    @asynccontextmanager
+    async def subscribe(
+        self,
+        dealer_id: Optional[str] = None,
+        last_event_id: Optional[str] = None
+    ) -> AsyncIterator[Subscription]:
+        """Subscribe to all events, or one dealer's, resuming after `last_event_id`."""
+        subscription = Subscription(dealer_id, self.queue_size)
+        if last_event_id:
+            missed = self._since(last_event_id)
+            missed = missed and [event for event in missed if subscription.wants(event)]
+            if missed is None or len(missed) >= self.queue_size:
+                subscription.offer(RESET)
+            else:
+                for event in missed:
+                    subscription.offer(event)
+        # Replayed and registered without awaiting in between, so no event
+        # is missed or repeated
+        self._subscribers.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._subscribers.discard(subscription)
+    
+    def stats(self) -> dict:
+        """Listener state and fan-out counters."""
+        return {
+            "connected": self.connected,
+            "subscribers": len(self._subscribers),
+            "buffered": len(self._buffer),
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+def format_event(event: Union[dict, None]) -> str:
+    """An event as an SSE message; None as a keep-alive comment."""
+    if event is None:
+        return ": keep-alive\n\n"
+    if event is RESET:
+        return "event: reset\ndata: {}\n\n"
+    data = json.dumps(event, separators=(",", ":"))
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+async def stream(dealer_id: Optional[str] = None, last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+    """SSE text for a subscription, with keep-alives while idle."""
+    async with order_events.subscribe(dealer_id, last_event_id) as subscription:
+        yield f"retry: {int(RECONNECT_DELAY_SECONDS * 1000)}\n\n"
+        while True:
+            event = await subscription.next(order_events.heartbeat)
+            if subscription.ended:
+                return
+            yield format_event(event)
+
+
+# Global hub for this worker
+order_events = OrderEventHub(
+    buffer_size=settings.order_events_buffer_size,
+    queue_size=settings.order_events_queue_size,
+    heartbeat=settings.order_events_heartbeat_seconds,
+)
@@ -0,0 +1,98 @@
+"""Order number allocation.
+
+Order numbers have the form ORD{YYYYMMDD}{NNN}, where the date is the
+business day in `settings.business_timezone` and NNN restarts at 001 each
+day (growing past three digits if needed). Each worker reserves a block of
+numbers from `order_number_counters` with one atomic upsert and hands them
+out from memory, so most orders need no extra round trip and concurrent
+workers never receive the same number.
+
+Numbers are unique but not gap-free: a restarted worker abandons the rest of
+its block, and numbers from different workers interleave. Orders numbered
+outside the allocator can leave a day's counter behind; a writer that finds
+its number taken calls `skip_taken` and tries again with a fresh one.
+"""
+import asyncio
+from datetime import date, datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+from app.database import db
+from app.statements import statements
+
+
+RESERVE_BLOCK = statements.register("order_number_counters.reserve", """
+    INSERT INTO order_number_counters (day, last_value)
+    VALUES ($1, $2)
+    ON CONFLICT (day) DO UPDATE
+    SET last_value = order_number_counters.last_value + EXCLUDED.last_value
+    RETURNING last_value
+""")
+
+
+# Moves a day's counter past the numbers its orders already use ($2: the
+# day's prefix pattern), for orders numbered outside the allocator
+ADVANCE_PAST_TAKEN = statements.register("order_number_counters.advance", """
+    INSERT INTO order_number_counters (day, last_value)
+    SELECT $1, COALESCE(MAX(substring(order_no FROM 12)::int), 0)
+    FROM orders
+    WHERE order_no LIKE $2 AND order_no ~ '^ORD[0-9]{11,}$'
+    ON CONFLICT (day) DO UPDATE
+    SET last_value = GREATEST(order_number_counters.last_value, EXCLUDED.last_value)
+""")
+
+
+class OrderNumberAllocator:
+    """Hands out order numbers from blocks reserved in the database."""
+    
+    def __init__(self, block_size: int, timezone: str):
+        self.block_size = block_size
+        self.timezone = ZoneInfo(timezone)
+        self._lock = asyncio.Lock()
+        self._day: Optional[date] = None
+        self._next = 0
+        self._last = -1
+        self.reservations = 0
+    
+    def business_day(self) -> date:
+        """Current date in the business timezone."""
+        return datetime.now(self.timezone).date()
+    
+    async def _reserve(self, day: date) -> None:
+        # Runs outside any caller transaction: a rolled back reservation
+        # would let another worker receive the same block.
+        last = await db.fetchval(RESERVE_BLOCK, day, self.block_size)
+        self._day = day
+        self._next = last - self.block_size + 1
+        self._last = last
+        self.reservations += 1
+    
+    async def allocate(self) -> str:
+        """Return the next unused order number for the current business day."""
+        day = self.business_day()
+        async with self._lock:
+            if day != self._day or self._next > self._last:
+                await self._reserve(day)
+            number = self._next
+            self._next += 1
+        return f"ORD{day:%Y%m%d}{number:03d}"
+    
+    async def skip_taken(self, order_no: str) -> None:
+        """Continue after the numbers in use on the day of `order_no`, found taken.
+        
+        Abandons the rest of the current block for that day, so the next
+        allocation reserves a block past every existing order's number.
+        """
+        day = datetime.strptime(order_no[3:11], "%Y%m%d").date()
+        async with self._lock:
+            await db.execute(ADVANCE_PAST_TAKEN, day, f"ORD{day:%Y%m%d}%")
+            if self._day == day:
+                self._next = self._last + 1
+
+
+# Global allocator for this worker
+order_numbers = OrderNumberAllocator(
+    block_size=settings.order_number_block_size,
+    timezone=settings.business_timezone,
+)
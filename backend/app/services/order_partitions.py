@@ -0,0 +1,198 @@
+"""Monthly range partitions of orders and order_items.
+
+Once `python -m scripts.partition_orders convert` has run, `orders` is
+partitioned by `created_at` month and `order_items` by the month of its
+order (`order_items.order_created_at`) with the same bounds, so a month of
+orders and its items are created, detached and archived together. Months
+start at midnight in `settings.business_timezone`.
+
+Each worker creates partitions for `settings.order_partition_months_ahead`
+future months at startup and re-checks periodically, so new orders always
+have a partition to go to. Queries bounded by `created_at` (order lists and
+cursors, exports, lookups by order number) read only the partitions in
+range; lookups by id probe each partition's primary key.
+
+Partitioned unique keys must include the partition key, so `orders` itself
+only enforces (order_no, created_at) unique. Order numbers stay unique
+across all months through `order_numbers`, written by triggers on `orders`;
+the numbers of detached months stay taken.
+
+Before the tables are converted, maintenance does nothing.
+"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime, time
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+from app.database import db
+from app.statements import statements
+
+
+logger = logging.getLogger("app.order_partitions")
+
+# Partition key of each partitioned table
+PARTITION_KEYS = {"orders": "created_at", "order_items": "order_created_at"}
+
+PARTITION_NAME = re.compile(r"^(orders|order_items)_y(\d{4})m(\d{2})$")
+
+# Foreign key from order_items to orders; dropped from archived item months
+ITEMS_ORDER_FKEY = "order_items_order_fkey"
+
+# Serializes partition DDL across workers (arbitrary advisory lock key)
+PARTITION_LOCK_KEY = 72026101
+
+# How often each worker checks that future partitions exist
+MAINTENANCE_INTERVAL_SECONDS = 6 * 3600
+
+# Creating a partition locks its parent exclusively, and queries on the
+# parent queue behind the DDL while it waits; give up instead (the months
+# ahead leave time to retry)
+PARTITION_LOCK_TIMEOUT = "5s"
+
+IS_PARTITIONED = statements.register("order_partitions.is_partitioned", """
+    SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('orders'))
+""", read_only=True)
+
+LIST_PARTITIONS = statements.register("order_partitions.list", """
+    SELECT parent.relname AS parent, child.relname AS name,
+           pg_get_expr(child.relpartbound, child.oid) AS bounds,
+           GREATEST(child.reltuples, 0)::bigint AS estimated_rows
+    FROM pg_inherits i
+    JOIN pg_class parent ON parent.oid = i.inhparent
+    JOIN pg_class child ON child.oid = i.inhrelid
+    WHERE parent.oid IN (to_regclass('orders'), to_regclass('order_items'))
+    ORDER BY parent.relname, child.relname
+""", read_only=True)
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month `months` after the month of `month`."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month:%Y}m{month:%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Month of a partition named by `partition_name`, or None."""
+    match = PARTITION_NAME.match(name)
+    return date(int(match.group(2)), int(match.group(3)), 1) if match else None
+
+
+def parent_table(name: str) -> str:
+    """Partitioned table of a monthly partition name (other names unchanged)."""
+    match = PARTITION_NAME.match(name)
+    return match.group(1) if match else name
+
+
+def month_bound(month: date) -> str:
+    """Start of `month` in the business timezone, as a timestamptz literal."""
+    return datetime.combine(month, time(), ZoneInfo(settings.business_timezone)).isoformat()
+
+
+def current_month() -> date:
+    return datetime.now(ZoneInfo(settings.business_timezone)).date().replace(day=1)
+
+
+async def is_partitioned() -> bool:
+    """Whether `orders` has been converted to a partitioned table."""
+    return await db.fetchval(IS_PARTITIONED)
+
+
+async def _create_partitions(conn, first: date, last: date, parents: Dict[str, str]) -> List[str]:
+    await conn.execute("SELECT pg_advisory_xact_lock($1)", PARTITION_LOCK_KEY)
+    await conn.execute(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'")
+    created = []
+    month = first.replace(day=1)
+    while month <= last:
+        bounds = f"FROM ('{month_bound(month)}') TO ('{month_bound(add_months(month, 1))}')"
+        # Orders first: the items partition's foreign key references them
+        for table in PARTITION_KEYS:
+            name = partition_name(table, month)
+            if await conn.fetchval("SELECT to_regclass($1)", name) is None:
+                await conn.execute(f"CREATE TABLE {name} PARTITION OF {parents[table]} FOR VALUES {bounds}")
+                created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+async def create_partitions(
+    first: date,
+    last: date,
+    parents: Optional[Dict[str, str]] = None,
+    conn=None
+) -> List[str]:
+    """Create the missing monthly partitions from `first` through `last`; returns their names.
+    
+    `parents` maps each table to the partitioned table to attach to (the
+    table itself by default; the conversion uses its shadow tables). With
+    `conn`, runs in the caller's transaction.
+    """
+    parents = parents or {table: table for table in PARTITION_KEYS}
+    if conn is not None:
+        return await _create_partitions(conn, first, last, parents)
+    async with db.transaction() as tx:
+        return await _create_partitions(tx, first, last, parents)
+
+
+async def ensure_partitions(months_ahead: int = settings.order_partition_months_ahead) -> List[str]:
+    """Create partitions through `months_ahead` months after the current one."""
+    if not await is_partitioned():
+        return []
+    month = current_month()
+    return await create_partitions(month, add_months(month, months_ahead))
+
+
+async def list_partitions() -> List[dict]:
+    """Attached partitions of orders and order_items with their bounds and estimated rows."""
+    return [dict(row) for row in await db.fetch(LIST_PARTITIONS)]
+
+
+async def detach_partitions(before: date, archive_schema: str = "archive") -> List[str]:
+    """Detach the months before the month of `before` and move them to `archive_schema`.
+    
+    Each month's items partition is detached first and loses its foreign key
+    to orders, so the orders partition can follow. Partitions are detached
+    concurrently, without blocking reads or writes of other months. The
+    rollups keep the archived months' totals, but a rollup rebuild only
+    counts attached partitions.
+    """
+    cutoff = before.replace(day=1)
+    attached = {row["name"] for row in await list_partitions()}
+    months = sorted({
+        month for month in map(partition_month, attached)
+        if month is not None and month < cutoff
+    })
+    
+    detached = []
+    if months:
+        await db.execute(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}")
+    for month in months:
+        for table in ("order_items", "orders"):
+            name = partition_name(table, month)
+            if name not in attached:
+                continue
+            # Cannot run inside a transaction block
+            await db.execute(f"ALTER TABLE {table} DETACH PARTITION {name} CONCURRENTLY")
+            if table == "order_items":
+                await db.execute(f"ALTER TABLE {name} DROP CONSTRAINT IF EXISTS {ITEMS_ORDER_FKEY}")
+            await db.execute(f"ALTER TABLE {name} SET SCHEMA {archive_schema}")
+            detached.append(f"{archive_schema}.{name}")
+    return detached
+
+
+async def maintain_partitions(interval: float = MAINTENANCE_INTERVAL_SECONDS):
+    """Ensure future partitions now and every `interval` seconds (run as a task)."""
+    while True:
+        try:
+            created = await ensure_partitions()
+            if created:
+                logger.info("created order partitions: %s", ", ".join(created))
+        except Exception:
+            logger.exception("order partition maintenance failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,58 @@
+"""Per-day order statistics rollup.
+
+`order_daily_stats` holds the order count and revenue per business day and
+status. Triggers on `orders` keep it current in the same transaction as the
+write, so every writer (including raw SQL) is covered and the dashboard
+reads a few rows per day instead of scanning orders.
+
+Days are taken in `settings.business_timezone` by the `order_stats_day`
+database function. After changing the timezone, or to repair drift, run
+`python -m scripts.rebuild_order_stats`.
+"""
+from datetime import date
+from typing import Dict
+
+from app.config import settings
+from app.database import db
+from app.statements import statements
+
+
+STATS_BY_STATUS = statements.register("order_daily_stats.by_status", """
+    SELECT status,
+           SUM(order_count)::int AS count,
+           SUM(revenue) AS revenue,
+           COALESCE(SUM(order_count) FILTER (WHERE day = $1), 0)::int AS today
+    FROM order_daily_stats
+    GROUP BY status
+    HAVING SUM(order_count) > 0
+""", read_only=True)
+
+
+async def status_totals(today: date) -> Dict[str, dict]:
+    """Order count, revenue and today's count per status."""
+    rows = await db.fetch(STATS_BY_STATUS, today, replica=True)
+    return {row["status"]: dict(row) for row in rows}
+
+
+async def rebuild_order_stats() -> int:
+    """Recompute the rollup from orders; returns the number of rollup rows.
+    
+    Writes to orders wait for the rebuild, so no change is lost or counted
+    twice; reads continue.
+    """
+    tz = settings.business_timezone.replace("'", "''")
+    async with db.transaction() as tx:
+        await tx.execute("LOCK TABLE orders IN SHARE ROW EXCLUSIVE MODE")
+        await tx.execute(f"""
+            CREATE OR REPLACE FUNCTION order_stats_day(ts TIMESTAMP WITH TIME ZONE) RETURNS DATE
+            LANGUAGE sql IMMUTABLE
+            AS $$ SELECT (ts AT TIME ZONE '{tz}')::date $$
+        """)
+        await tx.execute("DELETE FROM order_daily_stats")
+        result = await tx.execute("""
+            INSERT INTO order_daily_stats (day, status, order_count, revenue)
+            SELECT order_stats_day(created_at), status, COUNT(*), SUM(total_amount)
+            FROM orders
+            GROUP BY 1, 2
+        """)
+    return int(result.split()[-1])
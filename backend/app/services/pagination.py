@@ -0,0 +1,169 @@
+"""Offset and keyset (cursor) pagination helpers.
+
+List queries order by (created_at DESC, id DESC). A cursor is the opaque,
+URL-safe encoding of the last row's (created_at, id); the next page seeks
+with `(created_at, id) < ($n, $n+1)` on the matching composite index, so a
+deep page costs the same as the first one instead of walking and discarding
+every preceding row as OFFSET does.
+
+How the total is obtained is chosen per request (`count`):
+- "exact": a window count in the page statement itself (one round trip);
+  in cursor mode, where the page is filtered by the seek condition, a
+  separate count.
+- "cached": a separate count, cached briefly per table and filter values
+  and retired when this worker writes to the table.
+- "none": no total; `has_next` alone tells whether another page follows.
+"""
+import base64
+from datetime import datetime
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+from uuid import UUID
+
+from app.config import settings
+from app.database import db
+from app.services.cache import TTLCache
+from app.services.query import ListQuery
+from app.statements import Statement
+
+
+COUNT_MODES = ("exact", "cached", "none")
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client supplies a cursor this service did not issue."""
+
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """Encode a row position as an opaque cursor."""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a cursor into the (created_at, id) to seek past."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+class CountCache:
+    """Short-lived cache of list totals keyed by table and filter values.
+    
+    Writes made through this worker bump the table's version, which retires
+    its cached totals at once; the TTL bounds staleness from other workers.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[str, int] = {}
+    
+    def invalidate(self, *tables: str) -> None:
+        """Retire cached totals after a write to any of the tables."""
+        for table in tables:
+            self._versions[table] = self._versions.get(table, 0) + 1
+    
+    async def count(self, statement: Statement, table: str, params: Sequence) -> int:
+        """Return the cached total, running the count statement on a miss."""
+        key = (table, self._versions.get(table, 0), statement.name, tuple(params))
+        total = self._cache.get(key)
+        if total is None:
+            total = await db.fetchval(statement, *params, replica=True)
+            self._cache.set(key, total)
+        return total
+    
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+# Global list total cache
+count_cache = CountCache(
+    maxsize=settings.list_count_cache_size,
+    ttl=settings.list_count_cache_ttl_seconds,
+)
+
+
+def page_params(page: int, page_size: int, cursor: Optional[str]) -> list:
+    """Trailing bind parameters for a page query.
+    
+    One extra row is requested to tell whether another page follows.
+    """
+    if cursor:
+        return [*decode_cursor(cursor), page_size + 1]
+    return [page_size + 1, (page - 1) * page_size]
+
+
+def build_page(
+    rows: Sequence,
+    total: Optional[int],
+    page: int,
+    page_size: int,
+    cursor: Optional[str] = None
+) -> dict:
+    """Assemble a list response from up to page_size + 1 rows."""
+    items = [dict(row) for row in rows[:page_size]]
+    for item in items:
+        item.pop("total_count", None)
+    
+    has_next = len(rows) > page_size
+    next_cursor = None
+    if has_next:
+        last = items[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+    
+    pages = None
+    if total is not None and not cursor:
+        pages = (total + page_size - 1) // page_size if total > 0 else 1
+    
+    return {
+        "items": items,
+        "total": total,
+        "page": None if cursor else page,
+        "page_size": page_size,
+        "pages": pages,
+        "has_next": has_next,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+    }
+
+
+async def paginate(
+    query: ListQuery,
+    filters: Mapping[str, object],
+    page: int = 1,
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    count: str = "exact",
+    sort: Optional[str] = None
+) -> dict:
+    """Fetch one page of a list query, obtaining the total as `count` asks.
+    
+    Filters whose value is None are not applied.
+    """
+    if count not in COUNT_MODES:
+        raise ValueError(f"Unknown count mode: {count}")
+    
+    present, params = query.bind(filters)
+    total = None
+    with_total = count == "exact" and not cursor
+    if count == "exact" and cursor:
+        total = await db.fetchval(query.count(present), *params, replica=True)
+    elif count == "cached":
+        total = await count_cache.count(query.count(present), query.table, params)
+    
+    rows = await db.fetch(
+        query.page(present, sort=sort, cursor=bool(cursor), total=with_total),
+        *params, *page_params(page, page_size, cursor),
+        replica=True
+    )
+    
+    if with_total:
+        if rows:
+            total = rows[0]["total_count"]
+        else:
+            # Past the last page: no row to carry the window count
+            total = await db.fetchval(query.count(present), *params, replica=True)
+    
+    return build_page(rows, total, page, page_size, cursor)
@@ -0,0 +1,87 @@
+"""Bounded worker pool for bcrypt password hashing.
+
+bcrypt is deliberately slow (~200ms per call) and would block the event loop
+if called inline from async handlers. The bcrypt backend releases the GIL,
+so a small thread pool gives real parallelism without blocking requests.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from app.config import settings
+from app.metrics import Histogram
+
+T = TypeVar("T")
+
+
+class PasswordPoolSaturated(Exception):
+    """Raised when too many password operations are already queued."""
+
+
+class PasswordWorkerPool:
+    """Runs password hashing in a dedicated executor with a queue-depth limit."""
+    
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.rejected = 0
+        self.queue_wait = Histogram()
+        self.hash_time = Histogram()
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="password",
+            )
+        return self._executor
+    
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """Run a password function in the pool, failing fast when saturated."""
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordPoolSaturated("Password worker pool is saturated")
+        
+        submitted = time.perf_counter()
+        
+        def timed() -> T:
+            started = time.perf_counter()
+            self.queue_wait.observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                self.hash_time.observe(time.perf_counter() - started)
+        
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), timed)
+        finally:
+            self._pending -= 1
+    
+    def shutdown(self) -> None:
+        """Stop the executor threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def stats(self) -> dict:
+        """Return pool occupancy and timing metrics."""
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "queue_wait": self.queue_wait.snapshot(),
+            "hash_time": self.hash_time.snapshot(),
+        }
+
+
+# Global password pool instance
+password_pool = PasswordWorkerPool(
+    workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+)
@@ -4,6 +4,64 @@ from uuid import UUID
 from decimal import Decimal
 
 from app.database import db
+from app.services.catalog import PRODUCT_FIELDS, catalog
+from app.services.pagination import count_cache, paginate
+from app.services.query import Filter, ListQuery
+from app.statements import statements
+
+
+PRODUCT_COLUMNS = ", ".join(PRODUCT_FIELDS)
+
+INSERT_PRODUCT = statements.register("products.insert", f"""
+    INSERT INTO products (name, category, price, unit, min_order_quantity, description, image_url, stock, is_active)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    RETURNING {PRODUCT_COLUMNS}
+""")
+
+GET_PRODUCT = statements.register("products.get_by_id", f"""
+    SELECT {PRODUCT_COLUMNS}
+    FROM products WHERE id = $1
+""", read_only=True)
+
+# NULL parameters leave the column unchanged, so one statement covers every
+# combination of updated fields.
+UPDATE_PRODUCT = statements.register("products.update", f"""
+    UPDATE products SET
+        name = COALESCE($2, name),
+        category = COALESCE($3, category),
+        price = COALESCE($4, price),
+        unit = COALESCE($5, unit),
+        min_order_quantity = COALESCE($6, min_order_quantity),
+        description = COALESCE($7, description),
+        image_url = COALESCE($8, image_url),
+        stock = COALESCE($9, stock),
+        is_active = COALESCE($10, is_active),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = $1
+    RETURNING {PRODUCT_COLUMNS}
+""")
+
+DELETE_PRODUCT = statements.register("products.delete", "DELETE FROM products WHERE id = $1")
+
+LIST_CATEGORIES = statements.register(
+    "products.categories",
+    "SELECT DISTINCT category FROM products WHERE is_active = true ORDER BY category",
+    read_only=True,
+)
+
+PRODUCT_LIST = ListQuery(
+    "products.list",
+    table="products",
+    columns=PRODUCT_COLUMNS,
+    source="products",
+    filters=[
+        Filter("category", "category = {0}"),
+        Filter("search", "(name ILIKE {0} OR description ILIKE {0})"),
+        Filter("is_active", "is_active = {0}"),
+    ],
+    sorts={"newest": "created_at DESC, id DESC"},
+    keyset=("created_at", "id"),
+)
 
 
 async def create_product(
@@ -19,25 +77,23 @@ async def create_product(
 ) -> dict:
     """Create a new product."""
     product = await db.fetchrow(
-        """
-        INSERT INTO products (name, category, price, unit, min_order_quantity, description, image_url, stock, is_active)
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-        RETURNING id, name, category, price, unit, min_order_quantity, description, image_url, stock, is_active, created_at, updated_at
-        """,
+        INSERT_PRODUCT,
         name, category, price, unit, min_order_quantity, description, image_url, stock, is_active
     )
+    count_cache.invalidate("products")
+    catalog.invalidate()
     return dict(product)
 
 
-async def get_product_by_id(product_id: UUID) -> Optional[dict]:
-    """Get product by ID."""
-    product = await db.fetchrow(
-        """
-        SELECT id, name, category, price, unit, min_order_quantity, description, image_url, stock, is_active, created_at, updated_at
-        FROM products WHERE id = $1
-        """,
-        product_id
-    )
+async def get_product_by_id(product_id: UUID, cached: bool = True) -> Optional[dict]:
+    """Get product by ID.
+    
+    Served from the catalog mirror when loaded; `cached=False` reads the
+    database, for callers about to write based on the result.
+    """
+    if cached and await catalog.ready():
+        return await catalog.get(product_id)
+    product = await db.fetchrow(GET_PRODUCT, product_id)
     return dict(product) if product else None
 
 
@@ -54,50 +110,21 @@ async def update_product(
     is_active: Optional[bool] = None
 ) -> Optional[dict]:
     """Update product information."""
-    updates = []
-    params = []
-    param_count = 1
-    
-    field_map = {
-        "name": name,
-        "category": category,
-        "price": price,
-        "unit": unit,
-        "min_order_quantity": min_order_quantity,
-        "description": description,
-        "image_url": image_url,
-        "stock": stock,
-        "is_active": is_active,
-    }
-    
-    for field, value in field_map.items():
-        if value is not None:
-            updates.append(f"{field} = ${param_count}")
-            params.append(value)
-            param_count += 1
-    
-    if not updates:
+    fields = (name, category, price, unit, min_order_quantity, description, image_url, stock, is_active)
+    if all(value is None for value in fields):
         return await get_product_by_id(product_id)
     
-    updates.append("updated_at = CURRENT_TIMESTAMP")
-    params.append(product_id)
-    
-    query = f"""
-        UPDATE products SET {', '.join(updates)}
-        WHERE id = ${param_count}
-        RETURNING id, name, category, price, unit, min_order_quantity, description, image_url, stock, is_active, created_at, updated_at
-    """
-    
-    product = await db.fetchrow(query, *params)
+    product = await db.fetchrow(UPDATE_PRODUCT, product_id, *fields)
+    count_cache.invalidate("products")
+    catalog.invalidate()
     return dict(product) if product else None
 
 
 async def delete_product(product_id: UUID) -> bool:
     """Delete a product."""
-    result = await db.execute(
-        "DELETE FROM products WHERE id = $1",
-        product_id
-    )
+    result = await db.execute(DELETE_PRODUCT, product_id)
+    count_cache.invalidate("products")
+    catalog.invalidate()
     return "DELETE 1" in result
 
 
@@ -106,62 +133,33 @@ async def list_products(
     page_size: int = 20,
     category: Optional[str] = None,
     search: Optional[str] = None,
-    is_active: Optional[bool] = None
+    is_active: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    count: str = "exact"
 ) -> dict:
-    """List products with pagination and filtering."""
-    offset = (page - 1) * page_size
-    
-    conditions = []
-    params = []
-    param_count = 1
-    
-    if category:
-        conditions.append(f"category = ${param_count}")
-        params.append(category)
-        param_count += 1
-    
-    if search:
-        conditions.append(f"(name ILIKE ${param_count} OR description ILIKE ${param_count})")
-        params.append(f"%{search}%")
-        param_count += 1
+    """List products with page or cursor pagination and filtering.
     
-    if is_active is not None:
-        conditions.append(f"is_active = ${param_count}")
-        params.append(is_active)
-        param_count += 1
-    
-    where_clause = ""
-    if conditions:
-        where_clause = "WHERE " + " AND ".join(conditions)
-    
-    # Get total count
-    count_query = f"SELECT COUNT(*) FROM products {where_clause}"
-    total = await db.fetchval(count_query, *params)
-    
-    # Get products
-    params.extend([page_size, offset])
-    query = f"""
-        SELECT id, name, category, price, unit, min_order_quantity, description, image_url, stock, is_active, created_at, updated_at
-        FROM products {where_clause}
-        ORDER BY created_at DESC
-        LIMIT ${param_count} OFFSET ${param_count + 1}
+    Served from the catalog mirror when loaded, except searches and
+    inactive-only listings.
     """
-    
-    products = await db.fetch(query, *params)
-    
-    return {
-        "items": [dict(p) for p in products],
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "pages": (total + page_size - 1) // page_size if total > 0 else 1
+    if not search and is_active is not False and await catalog.ready():
+        return await catalog.page(
+            category=category or None, active_only=is_active is True,
+            page=page, page_size=page_size, cursor=cursor, count=count
+        )
+    filters = {
+        "category": category or None,
+        "search": f"%{search}%" if search else None,
+        "is_active": is_active,
     }
+    return await paginate(
+        PRODUCT_LIST, filters,
+        page=page, page_size=page_size, cursor=cursor, count=count
+    )
 
 
 async def get_categories() -> List[str]:
     """Get list of unique product categories."""
-    rows = await db.fetch(
-        "SELECT DISTINCT category FROM products WHERE is_active = true ORDER BY category"
-    )
+    rows = await db.fetch(LIST_CATEGORIES, replica=True)
     return [row["category"] for row in rows]
 
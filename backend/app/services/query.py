@@ -0,0 +1,176 @@
+"""Compiled list queries.
+
+A ListQuery describes a list endpoint once: its select list, source, optional
+filters and sort orders. The SQL for each combination of present filters,
+sort, cursor and total options (or for an unpaginated select) is compiled
+on first use, registered as a named statement and memoized, so requests do
+no string building and the number of distinct statements is bounded by the
+spec rather than by the requests.
+"""
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+from app.statements import Statement, statements
+
+
+class Filter:
+    """An optional WHERE condition.
+    
+    `condition` uses `{0}`, `{1}`, ... for its bind parameters, e.g.
+    "(name ILIKE {0} OR description ILIKE {0})".
+    """
+    
+    __slots__ = ("name", "condition", "arity")
+    
+    def __init__(self, name: str, condition: str, arity: int = 1):
+        self.name = name
+        self.condition = condition
+        self.arity = arity
+
+
+class ListQuery:
+    """Filterable, paginated SELECT compiled into a bounded set of statements.
+    
+    Sorts map a name to an ORDER BY clause; the first is the default and the
+    only one cursor pagination may seek on, using the `keyset` columns.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        table: str,
+        columns: str,
+        source: str,
+        filters: Sequence[Filter],
+        sorts: Mapping[str, str],
+        keyset: Tuple[str, str],
+        count_source: Optional[str] = None,
+    ):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.source = source
+        self.count_source = count_source or source
+        self.filters = tuple(filters)
+        self.sorts = dict(sorts)
+        self.default_sort = next(iter(self.sorts))
+        self.keyset = keyset
+        self._compiled: Dict[tuple, Statement] = {}
+    
+    def bind(self, values: Mapping[str, object]) -> Tuple[frozenset, list]:
+        """Select the filters to apply (those with a non-None value) and their parameters."""
+        present = []
+        params = []
+        for f in self.filters:
+            value = values.get(f.name)
+            if value is not None:
+                present.append(f.name)
+                params.append(value)
+        return frozenset(present), params
+    
+    def _where(self, present: frozenset, cursor: bool) -> Tuple[str, int]:
+        conditions = []
+        param_count = 1
+        for f in self.filters:
+            if f.name in present:
+                placeholders = [f"${param_count + i}" for i in range(f.arity)]
+                conditions.append(f.condition.format(*placeholders))
+                param_count += f.arity
+        
+        if cursor:
+            conditions.append(f"({self.keyset[0]}, {self.keyset[1]}) < (${param_count}, ${param_count + 1})")
+            # Implied by the row comparison, but only a plain bound on the
+            # leading column prunes partitions ranged on it
+            conditions.append(f"{self.keyset[0]} <= ${param_count}")
+            param_count += 2
+        
+        where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return where_clause, param_count
+    
+    def count(self, present: frozenset) -> Statement:
+        """COUNT(*) statement for a filter combination."""
+        key = ("count", present)
+        statement = self._compiled.get(key)
+        if statement is None:
+            where_clause, _ = self._where(present, cursor=False)
+            sql = f"SELECT COUNT(*) FROM {self.count_source} {where_clause}"
+            statement = self._compiled[key] = statements.register(
+                f"{self.name}.count[{_label(present)}]", sql, read_only=True
+            )
+        return statement
+    
+    def page(
+        self,
+        present: frozenset,
+        sort: Optional[str] = None,
+        cursor: bool = False,
+        total: bool = False,
+    ) -> Statement:
+        """Page statement for a filter combination.
+        
+        Parameters after the filters are LIMIT and OFFSET, or with `cursor`
+        the two keyset values followed by LIMIT. With `total`, each row
+        carries the filtered row count as `total_count`.
+        """
+        key = (present, sort, cursor, total)
+        statement = self._compiled.get(key)
+        if statement is None:
+            statement = self._compiled[key] = self._compile_page(present, sort, cursor, total)
+        return statement
+    
+    def _compile_page(self, present: frozenset, sort: Optional[str], cursor: bool, total: bool) -> Statement:
+        sort = sort or self.default_sort
+        if sort not in self.sorts:
+            raise ValueError(f"Unknown sort: {sort}")
+        if cursor and sort != self.default_sort:
+            raise ValueError(f"Cursor pagination requires sort {self.default_sort!r}")
+        
+        where_clause, param_count = self._where(present, cursor)
+        offset = "" if cursor else f"OFFSET ${param_count + 1}"
+        total_column = ", COUNT(*) OVER() AS total_count" if total else ""
+        sql = f"""
+            SELECT {self.columns}{total_column}
+            FROM {self.source}
+            {where_clause}
+            ORDER BY {self.sorts[sort]}
+            LIMIT ${param_count} {offset}
+        """
+        
+        options = [sort] + (["cursor"] if cursor else []) + (["total"] if total else [])
+        return statements.register(
+            f"{self.name}.page[{_label(present)};{';'.join(options)}]", sql, read_only=True
+        )
+    
+    def select(self, present: frozenset, sort: Optional[str] = None) -> Statement:
+        """Unpaginated statement for a filter combination, e.g. to stream through a cursor."""
+        key = ("select", present, sort)
+        statement = self._compiled.get(key)
+        if statement is None:
+            sort = sort or self.default_sort
+            if sort not in self.sorts:
+                raise ValueError(f"Unknown sort: {sort}")
+            where_clause, _ = self._where(present, cursor=False)
+            sql = f"""
+                SELECT {self.columns}
+                FROM {self.source}
+                {where_clause}
+                ORDER BY {self.sorts[sort]}
+            """
+            statement = self._compiled[key] = statements.register(
+                f"{self.name}.select[{_label(present)};{sort}]", sql, read_only=True
+            )
+        return statement
+    
+    def compiled_statements(self) -> int:
+        """Number of distinct statements compiled so far."""
+        return len({statement.name for statement in self._compiled.values()})
+    
+    def max_statements(self) -> int:
+        """Upper bound on distinct statements this query can compile."""
+        combinations = 2 ** len(self.filters)
+        # cursor is only valid with the default sort
+        page_variants = len(self.sorts) * 2 + 2
+        return combinations * (1 + page_variants + len(self.sorts))
+
+
+def _label(present: frozenset) -> str:
+    return ",".join(sorted(present)) or "-"
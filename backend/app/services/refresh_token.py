@@ -0,0 +1,168 @@
+"""Refresh token rotation with reuse detection.
+
+Every refresh token is recorded in `refresh_tokens` and may be used once.
+Rotation marks the presented token as used and inserts its successor in a
+single statement, so the refresh path costs one write and no reads. If the
+presented token was already used (a replay) or its family was revoked, the
+whole family is revoked.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+from uuid import UUID, uuid4
+
+import asyncpg
+
+from app.config import settings
+from app.database import db
+from app.services.auth import create_refresh_token
+from app.statements import statements
+
+
+logger = logging.getLogger("app.refresh_token")
+
+LOAD_REVOKED = statements.register("refresh_tokens.load_revoked", """
+    SELECT family_id, MAX(expires_at) AS expires_at
+    FROM refresh_tokens
+    WHERE revoked_at IS NOT NULL AND expires_at > CURRENT_TIMESTAMP
+    GROUP BY family_id
+""", read_only=True)
+
+INSERT_TOKEN = statements.register("refresh_tokens.insert", """
+    INSERT INTO refresh_tokens (jti, family_id, user_id, expires_at)
+    VALUES ($1, $2, $3, $4)
+""")
+
+ROTATE_TOKEN = statements.register("refresh_tokens.rotate", """
+    WITH used AS (
+        UPDATE refresh_tokens SET used_at = CURRENT_TIMESTAMP
+        WHERE jti = $1 AND family_id = $2
+          AND used_at IS NULL AND revoked_at IS NULL
+        RETURNING family_id, user_id
+    )
+    INSERT INTO refresh_tokens (jti, family_id, user_id, expires_at)
+    SELECT $3, family_id, user_id, $4 FROM used
+    RETURNING jti
+""")
+
+REVOKE_FAMILIES = statements.register("refresh_tokens.revoke_families", """
+    UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+    WHERE family_id = ANY($1::uuid[]) AND revoked_at IS NULL
+    RETURNING family_id, expires_at
+""")
+
+REVOKE_USER = statements.register("refresh_tokens.revoke_user", """
+    UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+    WHERE user_id = $1 AND revoked_at IS NULL AND expires_at > CURRENT_TIMESTAMP
+    RETURNING family_id, expires_at
+""")
+
+
+class RevocationSet:
+    """In-memory set of revoked refresh token families.
+    
+    Lets replayed or logged-out tokens be rejected without a database read.
+    Entries are kept only until the family's last token expires. The database
+    remains authoritative: rotation re-checks revocation atomically, so
+    revocations made by other workers are still enforced.
+    """
+    
+    def __init__(self):
+        self._families: dict = {}
+        self.loaded = False
+    
+    def __contains__(self, family_id: UUID) -> bool:
+        return family_id in self._families
+    
+    def __len__(self) -> int:
+        return len(self._families)
+    
+    def add(self, family_id: UUID, expires_at: datetime) -> None:
+        """Record a revoked family until its tokens expire."""
+        current = self._families.get(family_id)
+        if current is None or expires_at > current:
+            self._families[family_id] = expires_at
+    
+    def prune(self) -> None:
+        """Forget families whose tokens have all expired."""
+        now = datetime.now(timezone.utc)
+        self._families = {
+            family_id: expires_at
+            for family_id, expires_at in self._families.items()
+            if expires_at > now
+        }
+    
+    async def load(self) -> None:
+        """Rebuild the set from the database.
+        
+        Before migrations have created `refresh_tokens` this only logs, and
+        the set is loaded on first use instead.
+        """
+        try:
+            rows = await db.fetch(LOAD_REVOKED)
+        except asyncpg.UndefinedTableError as e:
+            logger.warning("revoked refresh token families not loaded: %s", e)
+            return
+        self._families = {row["family_id"]: row["expires_at"] for row in rows}
+        self.loaded = True
+    
+    async def ensure_loaded(self) -> None:
+        """Load the set if startup could not."""
+        if not self.loaded:
+            await self.load()
+
+
+# Global revoked family set, loaded at startup
+revoked_families = RevocationSet()
+
+
+def _refresh_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(days=settings.jwt_refresh_expire_days)
+
+
+def _encode(claims: dict, jti: UUID, family_id: UUID, expires_at: datetime) -> str:
+    token_data = {**claims, "jti": str(jti), "fid": str(family_id)}
+    return create_refresh_token(token_data, expires_at)
+
+
+async def issue_refresh_token(claims: dict) -> str:
+    """Start a new token family (on login) and return its first refresh token."""
+    jti, family_id, expires_at = uuid4(), uuid4(), _refresh_expiry()
+    await db.execute(INSERT_TOKEN, jti, family_id, UUID(claims["sub"]), expires_at)
+    return _encode(claims, jti, family_id, expires_at)
+
+
+async def rotate_refresh_token(payload: dict, claims: dict) -> Optional[str]:
+    """Exchange a refresh token for its successor.
+    
+    Returns None if the token is unknown, revoked or being replayed; in the
+    latter cases the whole family is revoked.
+    """
+    jti, family_id = UUID(payload["jti"]), UUID(payload["fid"])
+    await revoked_families.ensure_loaded()
+    if family_id in revoked_families:
+        return None
+    
+    new_jti, expires_at = uuid4(), _refresh_expiry()
+    rotated = await db.fetchval(ROTATE_TOKEN, jti, family_id, new_jti, expires_at)
+    
+    if rotated is None:
+        await revoke_refresh_families([family_id])
+        return None
+    
+    return _encode(claims, new_jti, family_id, expires_at)
+
+
+async def revoke_refresh_families(family_ids: Iterable[UUID]) -> None:
+    """Revoke every token in the given families."""
+    rows = await db.fetch(REVOKE_FAMILIES, list(family_ids))
+    for row in rows:
+        revoked_families.add(row["family_id"], row["expires_at"])
+
+
+async def revoke_user_refresh_tokens(user_id: UUID) -> None:
+    """Revoke all of a user's active refresh token families."""
+    rows = await db.fetch(REVOKE_USER, user_id)
+    for row in rows:
+        revoked_families.add(row["family_id"], row["expires_at"])
+    revoked_families.prune()
@@ -3,7 +3,59 @@ from typing import Optional, List
 from uuid import UUID
 
 from app.database import db
-from app.services.auth import hash_password
+from app.services.auth import hash_password, invalidate_principal, token_versions
+from app.services.pagination import count_cache, paginate
+from app.services.query import Filter, ListQuery
+from app.statements import statements
+
+
+USER_COLUMNS = "id, username, email, role, is_active, created_at, updated_at"
+
+INSERT_USER = statements.register("users.insert", f"""
+    INSERT INTO users (username, email, password_hash, role, is_active)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING {USER_COLUMNS}
+""")
+
+GET_USER = statements.register("users.get_by_id", f"""
+    SELECT {USER_COLUMNS}
+    FROM users WHERE id = $1
+""", read_only=True)
+
+GET_USER_BY_USERNAME = statements.register("users.get_by_username", f"""
+    SELECT {USER_COLUMNS}
+    FROM users WHERE username = $1
+""", read_only=True)
+
+GET_USER_BY_EMAIL = statements.register("users.get_by_email", f"""
+    SELECT {USER_COLUMNS}
+    FROM users WHERE email = $1
+""", read_only=True)
+
+# NULL parameters leave the column unchanged; $5 bumps the token version.
+UPDATE_USER = statements.register("users.update", f"""
+    UPDATE users SET
+        email = COALESCE($2, email),
+        password_hash = COALESCE($3, password_hash),
+        is_active = COALESCE($4, is_active),
+        token_version = token_version + CASE WHEN $5 THEN 1 ELSE 0 END,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = $1
+    RETURNING {USER_COLUMNS}, token_version
+""")
+
+DELETE_USER = statements.register("users.delete", "DELETE FROM users WHERE id = $1")
+
+
+USER_LIST = ListQuery(
+    "users.list",
+    table="users",
+    columns=USER_COLUMNS,
+    source="users",
+    filters=[Filter("role", "role = {0}")],
+    sorts={"newest": "created_at DESC, id DESC"},
+    keyset=("created_at", "id"),
+)
 
 
 async def create_user(
@@ -14,52 +66,28 @@ async def create_user(
     is_active: bool = True
 ) -> dict:
     """Create a new user."""
-    password_hash = hash_password(password)
+    password_hash = await hash_password(password)
     
-    user = await db.fetchrow(
-        """
-        INSERT INTO users (username, email, password_hash, role, is_active)
-        VALUES ($1, $2, $3, $4, $5)
-        RETURNING id, username, email, role, is_active, created_at, updated_at
-        """,
-        username, email, password_hash, role, is_active
-    )
+    user = await db.fetchrow(INSERT_USER, username, email, password_hash, role, is_active)
+    count_cache.invalidate("users", "dealers")
     return dict(user)
 
 
 async def get_user_by_id(user_id: UUID) -> Optional[dict]:
     """Get user by ID."""
-    user = await db.fetchrow(
-        """
-        SELECT id, username, email, role, is_active, created_at, updated_at
-        FROM users WHERE id = $1
-        """,
-        user_id
-    )
+    user = await db.fetchrow(GET_USER, user_id)
     return dict(user) if user else None
 
 
 async def get_user_by_username(username: str) -> Optional[dict]:
     """Get user by username."""
-    user = await db.fetchrow(
-        """
-        SELECT id, username, email, role, is_active, created_at, updated_at
-        FROM users WHERE username = $1
-        """,
-        username
-    )
+    user = await db.fetchrow(GET_USER_BY_USERNAME, username)
     return dict(user) if user else None
 
 
 async def get_user_by_email(email: str) -> Optional[dict]:
     """Get user by email."""
-    user = await db.fetchrow(
-        """
-        SELECT id, username, email, role, is_active, created_at, updated_at
-        FROM users WHERE email = $1
-        """,
-        email
-    )
+    user = await db.fetchrow(GET_USER_BY_EMAIL, email)
     return dict(user) if user else None
 
 
@@ -70,87 +98,44 @@ async def update_user(
     is_active: Optional[bool] = None
 ) -> Optional[dict]:
     """Update user information."""
-    updates = []
-    params = []
-    param_count = 1
-    
-    if email is not None:
-        updates.append(f"email = ${param_count}")
-        params.append(email)
-        param_count += 1
-    
-    if password is not None:
-        updates.append(f"password_hash = ${param_count}")
-        params.append(hash_password(password))
-        param_count += 1
-    
-    if is_active is not None:
-        updates.append(f"is_active = ${param_count}")
-        params.append(is_active)
-        param_count += 1
-    
-    if not updates:
+    if email is None and password is None and is_active is None:
         return await get_user_by_id(user_id)
     
-    updates.append("updated_at = CURRENT_TIMESTAMP")
-    params.append(user_id)
+    password_hash = await hash_password(password) if password is not None else None
     
-    query = f"""
-        UPDATE users SET {', '.join(updates)}
-        WHERE id = ${param_count}
-        RETURNING id, username, email, role, is_active, created_at, updated_at
-    """
+    # Password or activation changes revoke previously issued access tokens
+    revoke = password is not None or is_active is not None
     
-    user = await db.fetchrow(query, *params)
-    return dict(user) if user else None
+    user = await db.fetchrow(UPDATE_USER, user_id, email, password_hash, is_active, revoke)
+    invalidate_principal(user_id)
+    count_cache.invalidate("users", "dealers")
+    if not user:
+        return None
+    
+    user = dict(user)
+    token_versions.set(user_id, user.pop("token_version"))
+    return user
 
 
 async def list_users(
     page: int = 1,
     page_size: int = 20,
-    role: Optional[str] = None
+    role: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = "exact"
 ) -> dict:
-    """List users with pagination."""
-    offset = (page - 1) * page_size
-    
-    where_clause = ""
-    params = [page_size, offset]
-    
-    if role:
-        where_clause = "WHERE role = $3"
-        params.append(role)
-    
-    # Get total count
-    count_query = f"SELECT COUNT(*) FROM users {where_clause}"
-    if role:
-        total = await db.fetchval(count_query, role)
-    else:
-        total = await db.fetchval("SELECT COUNT(*) FROM users")
-    
-    # Get users
-    query = f"""
-        SELECT id, username, email, role, is_active, created_at, updated_at
-        FROM users {where_clause}
-        ORDER BY created_at DESC
-        LIMIT $1 OFFSET $2
-    """
-    
-    users = await db.fetch(query, *params)
-    
-    return {
-        "items": [dict(u) for u in users],
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "pages": (total + page_size - 1) // page_size if total > 0 else 1
-    }
+    """List users with page or cursor pagination."""
+    return await paginate(
+        USER_LIST, {"role": role or None},
+        page=page, page_size=page_size, cursor=cursor, count=count
+    )
 
 
 async def delete_user(user_id: UUID) -> bool:
     """Delete a user."""
-    result = await db.execute(
-        "DELETE FROM users WHERE id = $1",
-        user_id
-    )
+    result = await db.execute(DELETE_USER, user_id)
+    invalidate_principal(user_id)
+    count_cache.invalidate("users", "dealers")
+    token_versions.discard(user_id)
     return "DELETE 1" in result
 
@@ -0,0 +1,57 @@
+"""Registry of named SQL statements prepared on every pooled connection.
+
+Services register their SQL once at import time and execute it by passing
+the returned Statement to the Database methods. Each new pooled connection
+prepares every registered statement into its statement cache in its init
+hook, so requests never pay a parse/plan round trip. Filtered list queries
+are compiled per filter combination by app.services.query and registered
+the same way; those compiled after a connection was opened are prepared on
+their first use on it.
+"""
+from typing import Dict, Iterator
+
+
+class Statement:
+    """A named, registered SQL statement.
+    
+    `read_only` statements have no side effects, so they may be run again
+    (e.g. under EXPLAIN ANALYZE); anything else, including a SELECT calling
+    pg_notify(), must not be.
+    """
+    
+    __slots__ = ("name", "sql", "read_only")
+    
+    def __init__(self, name: str, sql: str, read_only: bool = False):
+        self.name = name
+        self.sql = sql
+        self.read_only = read_only
+    
+    def __repr__(self) -> str:
+        return f"Statement({self.name!r})"
+
+
+class StatementRegistry:
+    """Collection of all statements to prepare per connection."""
+    
+    def __init__(self):
+        self._statements: Dict[str, Statement] = {}
+    
+    def register(self, name: str, sql: str, read_only: bool = False) -> Statement:
+        """Register a statement under a unique name."""
+        existing = self._statements.get(name)
+        if existing is not None:
+            if existing.sql != sql or existing.read_only != read_only:
+                raise ValueError(f"Statement {name!r} already registered with different SQL")
+            return existing
+        statement = self._statements[name] = Statement(name, sql, read_only)
+        return statement
+    
+    def __iter__(self) -> Iterator[Statement]:
+        return iter(list(self._statements.values()))
+    
+    def __len__(self) -> int:
+        return len(self._statements)
+
+
+# Global statement registry
+statements = StatementRegistry()
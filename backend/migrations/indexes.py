@@ -0,0 +1,22 @@
+"""Index helpers shared by migrations."""
+from typing import Iterable, Mapping
+
+from alembic import op
+
+
+def create_indexes_concurrently(indexes: Mapping[str, str]):
+    """Create each index (name -> "table (columns)") unless it exists.
+    
+    Built concurrently so the tables stay writable; this cannot run inside
+    the migration transaction, so each index is committed on its own.
+    """
+    with op.get_context().autocommit_block():
+        for name, definition in indexes.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+
+def drop_indexes_concurrently(names: Iterable[str]):
+    """Drop each named index if it exists, without blocking writes."""
+    with op.get_context().autocommit_block():
+        for name in names:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,27 @@
+"""Add users.token_version for access-token revocation
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bumped whenever previously issued access tokens must stop being honoured
+    # (logout, deactivation, password change, dealer status change).
+    op.execute("""
+        ALTER TABLE users
+        ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0
+    """)
+
+
+def downgrade():
+    op.execute("ALTER TABLE users DROP COLUMN IF EXISTS token_version")
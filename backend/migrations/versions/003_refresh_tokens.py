@@ -0,0 +1,40 @@
+"""Add refresh_tokens table for rotation and reuse detection
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per issued refresh token; tokens from the same login share a
+    # family_id. Presenting an already used token revokes the whole family.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            jti UUID PRIMARY KEY,
+            family_id UUID NOT NULL,
+            user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            issued_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            used_at TIMESTAMP WITH TIME ZONE,
+            revoked_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family_id ON refresh_tokens (family_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens (user_id)")
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_refresh_tokens_revoked
+        ON refresh_tokens (expires_at) WHERE revoked_at IS NOT NULL
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS refresh_tokens")
@@ -0,0 +1,41 @@
+"""Add order_number_counters table for order number allocation
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Last order number handed out per business day. Workers reserve blocks
+    # by incrementing last_value, so allocation never scans orders.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS order_number_counters (
+            day DATE PRIMARY KEY,
+            last_value INTEGER NOT NULL
+        )
+    """)
+    
+    # Continue numbering after the orders that already exist
+    op.execute("""
+        INSERT INTO order_number_counters (day, last_value)
+        SELECT to_date(substring(order_no FROM 4 FOR 8), 'YYYYMMDD'),
+               MAX(substring(order_no FROM 12)::int)
+        FROM orders
+        WHERE order_no ~ '^ORD[0-9]{11,}$'
+        GROUP BY 1
+        ON CONFLICT (day) DO UPDATE
+        SET last_value = GREATEST(order_number_counters.last_value, EXCLUDED.last_value)
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS order_number_counters")
@@ -0,0 +1,35 @@
+"""Add composite indexes for keyset pagination
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from migrations.indexes import create_indexes_concurrently, drop_indexes_concurrently
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+# List endpoints order by (created_at DESC, id DESC) and seek past a cursor
+# with (created_at, id) < ($n, $m); the filtered variants lead with the
+# filter column.
+INDEXES = {
+    "ix_products_created_at_id": "products (created_at DESC, id DESC)",
+    "ix_orders_created_at_id": "orders (created_at DESC, id DESC)",
+    "ix_orders_dealer_created_at_id": "orders (dealer_id, created_at DESC, id DESC)",
+    "ix_orders_status_created_at_id": "orders (status, created_at DESC, id DESC)",
+    "ix_dealers_created_at_id": "dealers (created_at DESC, id DESC)",
+    "ix_users_created_at_id": "users (created_at DESC, id DESC)",
+}
+
+
+def upgrade():
+    create_indexes_concurrently(INDEXES)
+
+
+def downgrade():
+    drop_indexes_concurrently(INDEXES)
@@ -0,0 +1,40 @@
+"""Add indexes for the hot service query shapes
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from migrations.indexes import create_indexes_concurrently, drop_indexes_concurrently
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+# Foreign keys are not indexed by PostgreSQL itself: order_items.order_id is
+# read by every order detail, order_items.product_id is checked on product
+# deletes and dealers.user_id is the dealer lookup of every dealer request.
+# Public product lists only ever show active products, so their indexes are
+# partial; the filtered list variants lead with the filter column.
+INDEXES = {
+    "ix_order_items_order_id": "order_items (order_id)",
+    "ix_order_items_product_id": "order_items (product_id)",
+    "ix_dealers_user_id": "dealers (user_id)",
+    "ix_dealers_status_created_at_id": "dealers (status, created_at DESC, id DESC)",
+    "ix_users_role_created_at_id": "users (role, created_at DESC, id DESC)",
+    "ix_products_active_created_at_id": "products (created_at DESC, id DESC) WHERE is_active",
+    "ix_products_active_category_created_at_id": (
+        "products (category, created_at DESC, id DESC) WHERE is_active"
+    ),
+}
+
+
+def upgrade():
+    create_indexes_concurrently(INDEXES)
+
+
+def downgrade():
+    drop_indexes_concurrently(INDEXES)
@@ -0,0 +1,112 @@
+"""Add trigger-maintained order_daily_stats rollup
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+import os
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+# Same setting the app reads; `python -m scripts.rebuild_order_stats`
+# redefines the day function and rebuilds the rollup after it changes.
+BUSINESS_TIMEZONE = os.getenv("BUSINESS_TIMEZONE", "UTC")
+
+
+def _upsert(deltas: str) -> str:
+    # Buckets are locked in key order so concurrent writers cannot deadlock
+    return f"""
+                INSERT INTO order_daily_stats AS s (day, status, order_count, revenue)
+                SELECT day, status, SUM(n), SUM(amount)
+                FROM ({deltas}) AS d(day, status, n, amount)
+                GROUP BY day, status
+                HAVING SUM(n) <> 0 OR SUM(amount) <> 0
+                ORDER BY day, status
+                ON CONFLICT (day, status) DO UPDATE
+                SET order_count = s.order_count + EXCLUDED.order_count,
+                    revenue = s.revenue + EXCLUDED.revenue;"""
+
+
+def upgrade():
+    # Order count and revenue per business day and status. Triggers on
+    # orders keep it current in the writing transaction, so the dashboard
+    # reads O(days) rows however many orders there are.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS order_daily_stats (
+            day DATE NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, status)
+        )
+    """)
+    
+    tz = BUSINESS_TIMEZONE.replace("'", "''")
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION order_stats_day(ts TIMESTAMP WITH TIME ZONE) RETURNS DATE
+        LANGUAGE sql IMMUTABLE
+        AS $$ SELECT (ts AT TIME ZONE '{tz}')::date $$
+    """)
+    
+    # Statement-level triggers see every changed row through transition
+    # tables, so a statement writing many orders costs one grouped upsert.
+    # An update moves orders out of their old (day, status) bucket and into
+    # the new one; rows are never removed, so counts may drop to zero.
+    old_deltas = "SELECT order_stats_day(created_at), status, -1, -total_amount FROM old_rows"
+    new_deltas = "SELECT order_stats_day(created_at), status, 1, total_amount FROM new_rows"
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION order_daily_stats_apply() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                {_upsert(new_deltas)}
+            ELSIF TG_OP = 'DELETE' THEN
+                {_upsert(old_deltas)}
+            ELSE
+                {_upsert(old_deltas + " UNION ALL " + new_deltas)}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_daily_stats_insert
+        AFTER INSERT ON orders REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION order_daily_stats_apply()
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_daily_stats_update
+        AFTER UPDATE ON orders REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION order_daily_stats_apply()
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_daily_stats_delete
+        AFTER DELETE ON orders REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION order_daily_stats_apply()
+    """)
+    
+    # Backfill from the orders that already exist; creating the triggers
+    # locked out writers until this transaction commits.
+    op.execute("""
+        INSERT INTO order_daily_stats (day, status, order_count, revenue)
+        SELECT order_stats_day(created_at), status, COUNT(*), SUM(total_amount)
+        FROM orders
+        GROUP BY 1, 2
+    """)
+
+
+def downgrade():
+    for trigger in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS orders_daily_stats_{trigger} ON orders")
+    op.execute("DROP FUNCTION IF EXISTS order_daily_stats_apply()")
+    op.execute("DROP TABLE IF EXISTS order_daily_stats")
+    op.execute("DROP FUNCTION IF EXISTS order_stats_day(TIMESTAMP WITH TIME ZONE)")
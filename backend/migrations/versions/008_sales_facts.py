@@ -0,0 +1,218 @@
+"""Add trigger-maintained dealer and product daily sales facts
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+# Sales exclude cancelled orders. Days come from order_stats_day (007).
+TABLES = {
+    "dealer_sales_daily": "dealer_id",
+    "product_sales_daily": "product_id",
+}
+
+
+def _upsert(table: str, deltas: str) -> str:
+    # `deltas` selects (day, key, order_count, units, revenue) changes.
+    # Buckets are locked in key order so concurrent writers cannot deadlock.
+    key = TABLES[table]
+    return f"""
+        INSERT INTO {table} AS s (day, {key}, order_count, units, revenue)
+        SELECT day, key, SUM(n), SUM(units), SUM(revenue)
+        FROM ({deltas}) AS d(day, key, n, units, revenue)
+        GROUP BY day, key
+        HAVING SUM(n) <> 0 OR SUM(units) <> 0 OR SUM(revenue) <> 0
+        ORDER BY day, key
+        ON CONFLICT (day, {key}) DO UPDATE
+        SET order_count = s.order_count + EXCLUDED.order_count,
+            units = s.units + EXCLUDED.units,
+            revenue = s.revenue + EXCLUDED.revenue;"""
+
+
+def _order_deltas(rows: str, sign: str) -> str:
+    """Dealer facts of whole orders in `rows`."""
+    return f"""
+        SELECT order_stats_day(r.created_at), r.dealer_id, {sign}1,
+               {sign}COALESCE((SELECT SUM(i.quantity) FROM order_items i WHERE i.order_id = r.id), 0),
+               {sign}r.total_amount
+        FROM {rows} r
+        WHERE r.status <> 'cancelled'"""
+
+
+def _order_product_deltas(rows: str, sign: str) -> str:
+    """Product facts of the items of whole orders in `rows`."""
+    return f"""
+        SELECT order_stats_day(r.created_at), i.product_id, {sign}COUNT(DISTINCT r.id),
+               {sign}SUM(i.quantity), {sign}SUM(i.subtotal)
+        FROM {rows} r
+        JOIN order_items i ON i.order_id = r.id
+        WHERE r.status <> 'cancelled'
+        GROUP BY 1, 2"""
+
+
+def _item_deltas(rows: str, sign: str) -> str:
+    """Dealer units of individual items in `rows`; the order itself is unchanged."""
+    return f"""
+        SELECT order_stats_day(o.created_at), o.dealer_id, 0, {sign}SUM(i.quantity), 0
+        FROM {rows} i
+        JOIN orders o ON o.id = i.order_id
+        WHERE o.status <> 'cancelled'
+        GROUP BY 1, 2"""
+
+
+def _item_product_deltas(rows: str, sign: str) -> str:
+    """Product facts of individual items in `rows`."""
+    return f"""
+        SELECT order_stats_day(o.created_at), i.product_id, {sign}COUNT(DISTINCT o.id),
+               {sign}SUM(i.quantity), {sign}SUM(i.subtotal)
+        FROM {rows} i
+        JOIN orders o ON o.id = i.order_id
+        WHERE o.status <> 'cancelled'
+        GROUP BY 1, 2"""
+
+
+def _both(deltas) -> str:
+    """Deltas moving rows from old_rows to new_rows."""
+    return deltas("old_rows", "-") + "\nUNION ALL" + deltas("new_rows", "")
+
+
+# The row being deleted, shaped like a transition table row
+DELETED_ORDER = """(
+            SELECT OLD.id AS id, OLD.dealer_id AS dealer_id, OLD.status AS status,
+                   OLD.created_at AS created_at, OLD.total_amount AS total_amount
+        )"""
+
+
+def upgrade():
+    for table, key in TABLES.items():
+        op.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                day DATE NOT NULL,
+                {key} UUID NOT NULL,
+                order_count INTEGER NOT NULL DEFAULT 0,
+                units INTEGER NOT NULL DEFAULT 0,
+                revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, {key})
+            )
+        """)
+    
+    # Orders: statement-level, through transition tables. An order's items
+    # are inserted after it, so a new order contributes no units or product
+    # facts until its items arrive.
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION sales_facts_apply_orders() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                {_upsert("dealer_sales_daily", _order_deltas("new_rows", ""))}
+            ELSE
+                {_upsert("dealer_sales_daily", _both(_order_deltas))}
+                {_upsert("product_sales_daily", _both(_order_product_deltas))}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    
+    # Deleting an order cascades to its items before any AFTER trigger runs,
+    # so the order's facts are removed row by row while its items still exist.
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION sales_facts_remove_order() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            {_upsert("dealer_sales_daily", _order_deltas(DELETED_ORDER, "-"))}
+            {_upsert("product_sales_daily", _order_product_deltas(DELETED_ORDER, "-"))}
+            RETURN OLD;
+        END
+        $$
+    """)
+    
+    # Items whose order is gone (a cascade from the delete above) join no
+    # order and change nothing.
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION sales_facts_apply_items() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                {_upsert("dealer_sales_daily", _item_deltas("new_rows", ""))}
+                {_upsert("product_sales_daily", _item_product_deltas("new_rows", ""))}
+            ELSIF TG_OP = 'DELETE' THEN
+                {_upsert("dealer_sales_daily", _item_deltas("old_rows", "-"))}
+                {_upsert("product_sales_daily", _item_product_deltas("old_rows", "-"))}
+            ELSE
+                {_upsert("dealer_sales_daily", _both(_item_deltas))}
+                {_upsert("product_sales_daily", _both(_item_product_deltas))}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    
+    op.execute("""
+        CREATE TRIGGER orders_sales_facts_insert
+        AFTER INSERT ON orders REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION sales_facts_apply_orders()
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_sales_facts_update
+        AFTER UPDATE ON orders REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION sales_facts_apply_orders()
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_sales_facts_delete
+        BEFORE DELETE ON orders
+        FOR EACH ROW EXECUTE FUNCTION sales_facts_remove_order()
+    """)
+    for event, referencing in [
+        ("insert", "NEW TABLE AS new_rows"),
+        ("update", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("delete", "OLD TABLE AS old_rows"),
+    ]:
+        op.execute(f"""
+            CREATE TRIGGER order_items_sales_facts_{event}
+            AFTER {event.upper()} ON order_items REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION sales_facts_apply_items()
+        """)
+    
+    # Backfill; creating the triggers locked out writers until commit
+    op.execute("""
+        INSERT INTO dealer_sales_daily (day, dealer_id, order_count, units, revenue)
+        SELECT order_stats_day(o.created_at), o.dealer_id, COUNT(*),
+               COALESCE(SUM((SELECT SUM(i.quantity) FROM order_items i WHERE i.order_id = o.id)), 0),
+               SUM(o.total_amount)
+        FROM orders o
+        WHERE o.status <> 'cancelled'
+        GROUP BY 1, 2
+    """)
+    op.execute("""
+        INSERT INTO product_sales_daily (day, product_id, order_count, units, revenue)
+        SELECT order_stats_day(o.created_at), i.product_id, COUNT(DISTINCT o.id),
+               SUM(i.quantity), SUM(i.subtotal)
+        FROM orders o
+        JOIN order_items i ON i.order_id = o.id
+        WHERE o.status <> 'cancelled'
+        GROUP BY 1, 2
+    """)
+
+
+def downgrade():
+    for event in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS orders_sales_facts_{event} ON orders")
+        op.execute(f"DROP TRIGGER IF EXISTS order_items_sales_facts_{event} ON order_items")
+    op.execute("DROP FUNCTION IF EXISTS sales_facts_apply_orders()")
+    op.execute("DROP FUNCTION IF EXISTS sales_facts_remove_order()")
+    op.execute("DROP FUNCTION IF EXISTS sales_facts_apply_items()")
+    for table in TABLES:
+        op.execute(f"DROP TABLE IF EXISTS {table}")
@@ -0,0 +1,37 @@
+"""Add idempotency_keys table for retried writes
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Response (serialized JSON) of the first completed request per
+    # client-chosen key. The row is written in the same transaction as the
+    # write it guards, so a concurrent request with the same key waits on it
+    # and then replays.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            scope VARCHAR(100) NOT NULL,
+            key VARCHAR(255) NOT NULL,
+            request_hash CHAR(64) NOT NULL,
+            response TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (scope, key)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON idempotency_keys (expires_at)")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS idempotency_keys")
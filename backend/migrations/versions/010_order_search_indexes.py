@@ -0,0 +1,50 @@
+"""Add order number prefix and trigram search indexes
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+from migrations.indexes import create_indexes_concurrently, drop_indexes_concurrently
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+# The unique index on order_no only serves LIKE 'prefix%' under the C
+# collation; text_pattern_ops makes prefix matching indexable in any locale.
+PATTERN_INDEXES = {
+    "ix_orders_order_no_pattern": "orders (order_no text_pattern_ops)",
+}
+
+# Substring search (ILIKE '%term%') over order number, shipping address and
+# dealer company. pg_trgm ships with the PostgreSQL contrib modules; where
+# it is missing, search still works, only without these indexes.
+TRIGRAM_INDEXES = {
+    "ix_orders_order_no_trgm": "orders USING gin (order_no gin_trgm_ops)",
+    "ix_orders_shipping_address_trgm": "orders USING gin (shipping_address gin_trgm_ops)",
+    "ix_dealers_company_name_trgm": "dealers USING gin (company_name gin_trgm_ops)",
+}
+
+
+def upgrade():
+    trigram = op.get_bind().exec_driver_sql(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    ).scalar()
+    
+    indexes = dict(PATTERN_INDEXES)
+    if trigram:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        indexes.update(TRIGRAM_INDEXES)
+    
+    create_indexes_concurrently(indexes)
+
+
+def downgrade():
+    # pg_trgm is left installed; other objects may depend on it
+    drop_indexes_concurrently([*PATTERN_INDEXES, *TRIGRAM_INDEXES])
@@ -0,0 +1,27 @@
+"""Add order_items.order_created_at for monthly partitioning
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The creation time of the item's order: the partition key of
+    # order_items once `python -m scripts.partition_orders convert` has run,
+    # so items share their order's month. New items are written with it;
+    # the conversion fills it in for existing items as it copies them.
+    # Adding a nullable column does not rewrite the table.
+    op.execute("ALTER TABLE order_items ADD COLUMN IF NOT EXISTS order_created_at TIMESTAMP WITH TIME ZONE")
+
+
+def downgrade():
+    op.execute("ALTER TABLE order_items DROP COLUMN IF EXISTS order_created_at")
@@ -0,0 +1,91 @@
+"""Add catalog versions for the in-process product catalog mirror
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Every statement that writes to products bumps the single version row
+    # and records the new version against each product it touched. The row
+    # lock on the version is held until commit, so versions commit in order:
+    # a reader that sees a version sees every lower one, and can catch up
+    # with `WHERE version > <last seen>`.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    op.execute("INSERT INTO catalog_version DEFAULT VALUES ON CONFLICT DO NOTHING")
+    
+    # One row per product ever written (deleted ones included), so it stays
+    # the size of the catalog
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS product_catalog_changes (
+            product_id UUID PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_product_catalog_changes_version
+        ON product_catalog_changes (version)
+    """)
+    
+    op.execute("""
+        CREATE OR REPLACE FUNCTION catalog_record_changes() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            new_version BIGINT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM 1 FROM old_rows LIMIT 1;
+            ELSE
+                PERFORM 1 FROM new_rows LIMIT 1;
+            END IF;
+            IF NOT FOUND THEN
+                RETURN NULL;
+            END IF;
+            
+            UPDATE catalog_version SET version = version + 1 RETURNING version INTO new_version;
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO product_catalog_changes (product_id, version)
+                SELECT id, new_version FROM old_rows ORDER BY id
+                ON CONFLICT (product_id) DO UPDATE SET version = EXCLUDED.version;
+            ELSE
+                INSERT INTO product_catalog_changes (product_id, version)
+                SELECT id, new_version FROM new_rows ORDER BY id
+                ON CONFLICT (product_id) DO UPDATE SET version = EXCLUDED.version;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for event, referencing in [
+        ("insert", "NEW TABLE AS new_rows"),
+        ("update", "NEW TABLE AS new_rows"),
+        ("delete", "OLD TABLE AS old_rows"),
+    ]:
+        op.execute(f"""
+            CREATE TRIGGER products_catalog_{event}
+            AFTER {event.upper()} ON products REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION catalog_record_changes()
+        """)
+
+
+def downgrade():
+    for event in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS products_catalog_{event} ON products")
+    op.execute("DROP FUNCTION IF EXISTS catalog_record_changes()")
+    op.execute("DROP TABLE IF EXISTS product_catalog_changes")
+    op.execute("DROP TABLE IF EXISTS catalog_version")
@@ -0,0 +1,67 @@
+"""Add order_numbers to keep order numbers unique across partitions
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A partitioned orders table can only enforce (order_no, created_at)
+    # unique, as its unique keys must include the partition key. Every order
+    # number is also written here, by statement triggers in the inserting
+    # transaction, so a duplicate fails on order_numbers_pkey whether or not
+    # orders is partitioned. Numbers of detached (archived) months stay
+    # taken; order numbers are never updated.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS order_numbers (
+            order_no VARCHAR(50) PRIMARY KEY
+        )
+    """)
+    
+    op.execute("""
+        CREATE OR REPLACE FUNCTION order_numbers_apply() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO order_numbers (order_no) SELECT order_no FROM new_rows;
+            ELSE
+                DELETE FROM order_numbers WHERE order_no IN (SELECT order_no FROM old_rows);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for event, referencing in [
+        ("insert", "NEW TABLE AS new_rows"),
+        ("delete", "OLD TABLE AS old_rows"),
+    ]:
+        op.execute(f"""
+            CREATE TRIGGER orders_order_numbers_{event}
+            AFTER {event.upper()} ON orders REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION order_numbers_apply()
+        """)
+    
+    # Backfill; creating the triggers locked out writers until commit.
+    # Duplicates already admitted by a partitioned table are kept once.
+    op.execute("""
+        INSERT INTO order_numbers (order_no)
+        SELECT DISTINCT order_no FROM orders
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def downgrade():
+    for event in ("insert", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS orders_order_numbers_{event} ON orders")
+    op.execute("DROP FUNCTION IF EXISTS order_numbers_apply()")
+    op.execute("DROP TABLE IF EXISTS order_numbers")
@@ -0,0 +1,55 @@
+"""Count a new order's units from its items only
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # An order and its items can now be inserted by one statement, after
+    # which the order's AFTER INSERT trigger already sees the items. Their
+    # units are added by the items' own trigger, so a new order contributes
+    # only its count and revenue here. Updates are unchanged (008).
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_facts_insert_orders() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            INSERT INTO dealer_sales_daily AS s (day, dealer_id, order_count, units, revenue)
+            SELECT order_stats_day(r.created_at), r.dealer_id, COUNT(*), 0, SUM(r.total_amount)
+            FROM new_rows r
+            WHERE r.status <> 'cancelled'
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+            ON CONFLICT (day, dealer_id) DO UPDATE
+            SET order_count = s.order_count + EXCLUDED.order_count,
+                revenue = s.revenue + EXCLUDED.revenue;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("DROP TRIGGER IF EXISTS orders_sales_facts_insert ON orders")
+    op.execute("""
+        CREATE TRIGGER orders_sales_facts_insert
+        AFTER INSERT ON orders REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION sales_facts_insert_orders()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS orders_sales_facts_insert ON orders")
+    op.execute("""
+        CREATE TRIGGER orders_sales_facts_insert
+        AFTER INSERT ON orders REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION sales_facts_apply_orders()
+    """)
+    op.execute("DROP FUNCTION IF EXISTS sales_facts_insert_orders()")
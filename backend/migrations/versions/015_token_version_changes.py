@@ -0,0 +1,91 @@
+"""Add token version changes for incremental token version reloads
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # As for the catalog (012): every statement that adds, deletes or
+    # changes the token version of users bumps the single clock row and
+    # records the new clock against each user it touched. The row lock on
+    # the clock is held until commit, so a reader can catch up with
+    # `WHERE version > <last seen>` without missing a change.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS token_version_clock (
+            id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    op.execute("INSERT INTO token_version_clock DEFAULT VALUES ON CONFLICT DO NOTHING")
+    
+    # One row per user ever written (deleted ones included)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS token_version_changes (
+            user_id UUID PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_token_version_changes_version
+        ON token_version_changes (version)
+    """)
+    
+    # Transition tables rule out `UPDATE OF token_version`, so updates
+    # compare the old and new rows instead; other user updates are ignored.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION token_version_record_changes() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            changed UUID[];
+            new_version BIGINT;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(id ORDER BY id) INTO changed FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(id ORDER BY id) INTO changed FROM old_rows;
+            ELSE
+                SELECT array_agg(n.id ORDER BY n.id) INTO changed
+                FROM new_rows n JOIN old_rows o ON o.id = n.id
+                WHERE n.token_version IS DISTINCT FROM o.token_version;
+            END IF;
+            IF changed IS NULL THEN
+                RETURN NULL;
+            END IF;
+            
+            UPDATE token_version_clock SET version = version + 1 RETURNING version INTO new_version;
+            INSERT INTO token_version_changes (user_id, version)
+            SELECT unnest(changed), new_version
+            ON CONFLICT (user_id) DO UPDATE SET version = EXCLUDED.version;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for event, referencing in [
+        ("insert", "NEW TABLE AS new_rows"),
+        ("update", "NEW TABLE AS new_rows OLD TABLE AS old_rows"),
+        ("delete", "OLD TABLE AS old_rows"),
+    ]:
+        op.execute(f"""
+            CREATE TRIGGER users_token_version_{event}
+            AFTER {event.upper()} ON users REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION token_version_record_changes()
+        """)
+
+
+def downgrade():
+    for event in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS users_token_version_{event} ON users")
+    op.execute("DROP FUNCTION IF EXISTS token_version_record_changes()")
+    op.execute("DROP TABLE IF EXISTS token_version_changes")
+    op.execute("DROP TABLE IF EXISTS token_version_clock")
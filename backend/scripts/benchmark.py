@@ -0,0 +1,858 @@
+#!/usr/bin/env python3
+"""Performance benchmarks against a running database.
+
+Usage:
+    python -m scripts.benchmark auth [--requests N]
+    python -m scripts.benchmark decode [--requests N]
+    python -m scripts.benchmark orders [--requests N]
+    python -m scripts.benchmark order-numbers [--requests N] [--workers N]
+    python -m scripts.benchmark pagination [--requests N] [--rows N]
+    python -m scripts.benchmark stats [--requests N] [--rows N]
+    python -m scripts.benchmark analytics [--requests N] [--rows N]
+    python -m scripts.benchmark batch-status [--requests N]
+    python -m scripts.benchmark export [--rows N]
+    python -m scripts.benchmark idempotency [--requests N] [--workers N]
+    python -m scripts.benchmark search [--requests N] [--rows N]
+    python -m scripts.benchmark query-build [--requests N]
+    python -m scripts.benchmark catalog [--requests N] [--products N]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.database import db
+
+
+@contextmanager
+def count_queries():
+    """Count statements sent through the global Database instance."""
+    counter = {"queries": 0}
+    original = db._timed
+    
+    def wrapper(*args, **kwargs):
+        counter["queries"] += 1
+        return original(*args, **kwargs)
+    
+    db._timed = wrapper
+    try:
+        yield counter
+    finally:
+        del db._timed
+
+
+def report(label: str, requests: int, elapsed: float, queries: Optional[int] = None):
+    """Print a single benchmark result line."""
+    line = (
+        f"{label:<32} {requests / elapsed:>10.0f} req/s   "
+        f"{elapsed / requests * 1e6:>8.1f} us/req"
+    )
+    if queries is not None:
+        line += f"   {queries / requests:>5.2f} queries/req"
+    print(line)
+
+
+async def ensure_partitions(days: int):
+    """Partitions for synthetic orders back-dated up to `days`, if orders is partitioned."""
+    from datetime import timedelta
+    from app.services import order_partitions
+    
+    if await order_partitions.is_partitioned():
+        month = order_partitions.current_month()
+        await order_partitions.create_partitions(month - timedelta(days=days), month)
+
+
+async def bench_auth(args):
+    """Compare per-request DB queries for legacy and claims-carrying tokens."""
+    from app.routers.auth import get_current_user
+    from app.services.auth import (
+        create_access_token, build_token_claims, get_user_with_dealer,
+        principal_cache,
+    )
+    
+    user_id = await db.fetchval(
+        "SELECT user_id FROM dealers WHERE status = 'approved' LIMIT 1"
+    )
+    if not user_id:
+        print("No approved dealer found; run scripts.seed_data first.")
+        return
+    
+    user = await get_user_with_dealer(user_id)
+    legacy_token = create_access_token({"sub": str(user_id), "role": user["role"]})
+    claims_token = create_access_token(build_token_claims(user))
+    
+    cases = [
+        ("legacy token, uncached", legacy_token, True),
+        ("legacy token, principal cache", legacy_token, False),
+        ("claims token", claims_token, False),
+    ]
+    for label, token, clear_cache in cases:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        await get_current_user(credentials)
+        
+        with count_queries() as counter:
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                if clear_cache:
+                    principal_cache.clear()
+                await get_current_user(credentials)
+            elapsed = time.perf_counter() - start
+        
+        report(label, args.requests, elapsed, counter["queries"])
+
+
+async def bench_decode(args):
+    """Compare token verification cost with and without the verified-token cache."""
+    from app.services.auth import create_access_token, decode_token, verified_token_cache
+    from app.services.jwt_backend import JWT_BACKENDS
+    from app.config import settings
+    
+    claims = {"sub": "00000000-0000-0000-0000-000000000000", "role": "dealer"}
+    token = create_access_token(claims)
+    
+    for name, backend_class in sorted(JWT_BACKENDS.items()):
+        try:
+            backend = backend_class(settings.jwt_secret_key, settings.jwt_algorithm)
+        except ImportError:
+            print(f"{name + ' backend, uncached':<32} (not installed)")
+            continue
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            backend.decode(token)
+        report(f"{name} backend, uncached", args.requests, time.perf_counter() - start)
+    
+    verified_token_cache.clear()
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        decode_token(token)
+    report(f"{settings.jwt_backend} backend, cached", args.requests, time.perf_counter() - start)
+
+
+async def _create_order_per_item(dealer_id, items):
+    """Previous create_order shape: one INSERT per line item, no transaction."""
+    from decimal import Decimal
+    from app.services.order import generate_order_no
+    
+    total_amount = sum(Decimal(str(item["unit_price"])) * item["quantity"] for item in items)
+    order = await db.fetchrow(
+        """
+        INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address, notes)
+        VALUES ($1, $2, 'pending', $3, $4, $5)
+        RETURNING id, created_at
+        """,
+        await generate_order_no(), dealer_id, total_amount, "benchmark", None
+    )
+    for item in items:
+        await db.fetchrow(
+            """
+            INSERT INTO order_items (order_id, product_id, product_name, quantity, unit_price, subtotal, order_created_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            RETURNING id
+            """,
+            order["id"], item["product_id"], item["product_name"], item["quantity"],
+            item["unit_price"], item["unit_price"] * item["quantity"], order["created_at"]
+        )
+    return order
+
+
+async def bench_orders(args):
+    """Orders/sec versus line-item count for batched and per-item creation.
+    
+    Exits non-zero if batched creation is slower than per-item creation at
+    any line-item count, the single-item order included.
+    """
+    from app.services.order import create_order
+    
+    dealer_id = await db.fetchval("SELECT id FROM dealers WHERE status = 'approved' LIMIT 1")
+    products = await db.fetch("SELECT id, name, price FROM products ORDER BY name")
+    if not dealer_id or not products:
+        print("No approved dealer or products found; run scripts.seed_data first.")
+        return
+    
+    requests = max(1, args.requests // 10)
+    
+    async def batched(items):
+        return await create_order(dealer_id, items, "benchmark")
+    
+    async def per_item(items):
+        return await _create_order_per_item(dealer_id, items)
+    
+    created = []
+    failures = 0
+    try:
+        for line_items in (1, 10, 40):
+            items = [
+                {
+                    "product_id": product["id"],
+                    "product_name": product["name"],
+                    "quantity": 1,
+                    "unit_price": product["price"],
+                }
+                for product in (products * line_items)[:line_items]
+            ]
+            elapsed = {}
+            for label, create in (("batched", batched), ("per-item", per_item)):
+                with count_queries() as counter:
+                    start = time.perf_counter()
+                    for _ in range(requests):
+                        created.append((await create(items))["id"])
+                    elapsed[label] = time.perf_counter() - start
+                report(f"{line_items:>2} items, {label}", requests, elapsed[label], counter["queries"])
+            speedup = elapsed["per-item"] / elapsed["batched"]
+            status = "ok" if speedup >= 1 else "SLOWER"
+            failures += speedup < 1
+            print(f"{line_items:>2} items: batched {speedup:.2f}x per-item   {status}")
+    finally:
+        await db.execute("DELETE FROM orders WHERE id = ANY($1::uuid[])", created)
+    
+    if failures:
+        sys.exit(1)
+
+
+async def bench_order_numbers(args):
+    """Fire concurrent order creates across simulated workers; check numbers are unique."""
+    from app.config import settings
+    from app.services import order as order_service
+    from app.services.order_number import OrderNumberAllocator
+    
+    dealer_id = await db.fetchval("SELECT id FROM dealers WHERE status = 'approved' LIMIT 1")
+    product = await db.fetchrow("SELECT id, name, price FROM products LIMIT 1")
+    if not dealer_id or not product:
+        print("No approved dealer or products found; run scripts.seed_data first.")
+        return
+    
+    items = [{
+        "product_id": product["id"],
+        "product_name": product["name"],
+        "quantity": 1,
+        "unit_price": product["price"],
+    }]
+    
+    # Each simulated worker has its own allocator, as separate processes would
+    allocators = [
+        OrderNumberAllocator(settings.order_number_block_size, settings.business_timezone)
+        for _ in range(args.workers)
+    ]
+    
+    async def create(i):
+        allocator = allocators[i % len(allocators)]
+        order_no = await allocator.allocate()
+        order = await order_service._insert_order(db, order_no, dealer_id, items, "benchmark", None)
+        return order["id"], order_no
+    
+    created = []
+    try:
+        with count_queries() as counter:
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(create(i) for i in range(args.requests)), return_exceptions=True
+            )
+            elapsed = time.perf_counter() - start
+        
+        errors = [r for r in results if isinstance(r, BaseException)]
+        created = [r[0] for r in results if not isinstance(r, BaseException)]
+        numbers = [r[1] for r in results if not isinstance(r, BaseException)]
+        report(f"{args.workers} workers, concurrent", args.requests, elapsed, counter["queries"])
+        
+        reservations = sum(allocator.reservations for allocator in allocators)
+        duplicates = len(numbers) - len(set(numbers))
+        failures = len(errors) + duplicates
+        print(f"block reservations: {reservations}, errors: {len(errors)}, duplicates: {duplicates}")
+        for error in errors[:5]:
+            print(f"  {type(error).__name__}: {error}")
+        
+        # The full path, including the item insert, through the global allocator
+        with count_queries() as counter:
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(order_service.create_order(dealer_id, items, "benchmark") for _ in range(args.requests)),
+                return_exceptions=True
+            )
+            elapsed = time.perf_counter() - start
+        
+        errors = [r for r in results if isinstance(r, BaseException)]
+        created += [r["id"] for r in results if not isinstance(r, BaseException)]
+        failures += len(errors)
+        report("create_order, concurrent", args.requests, elapsed, counter["queries"])
+        print(f"errors: {len(errors)}")
+        for error in errors[:5]:
+            print(f"  {type(error).__name__}: {error}")
+    finally:
+        await db.execute("DELETE FROM orders WHERE id = ANY($1::uuid[])", created)
+    
+    if failures:
+        sys.exit(1)
+
+
+async def bench_pagination(args):
+    """Order page latency at offset 0 and at a deep offset, OFFSET versus cursor.
+    
+    Times the page statement only; the total count is the same in every mode.
+    """
+    from app.services.order import ORDER_LIST
+    from app.services.pagination import encode_cursor, page_params
+    
+    dealer_id = await db.fetchval("SELECT id FROM dealers WHERE status = 'approved' LIMIT 1")
+    if not dealer_id:
+        print("No approved dealer found; run scripts.seed_data first.")
+        return
+    
+    print(f"inserting {args.rows} synthetic orders...")
+    await ensure_partitions(args.rows // 86400 + 1)
+    await db.execute(
+        """
+        INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address, created_at)
+        SELECT 'BENCH' || g, $1, 'pending', 0, 'benchmark',
+               CURRENT_TIMESTAMP - g * interval '1 second'
+        FROM generate_series(1, $2) AS g
+        """,
+        dealer_id, args.rows
+    )
+    await db.execute("ANALYZE orders")
+    
+    page_size = 20
+    requests = max(1, args.requests // 100)
+    try:
+        deep = await db.fetchrow(
+            "SELECT created_at, id FROM orders ORDER BY created_at DESC, id DESC OFFSET $1 LIMIT 1",
+            args.rows - page_size
+        )
+        deep_page = (args.rows - page_size) // page_size
+        cases = [
+            ("offset 0", ORDER_LIST.page(frozenset()), page_params(1, page_size, None)),
+            (
+                f"offset {deep_page * page_size}",
+                ORDER_LIST.page(frozenset()),
+                page_params(deep_page, page_size, None),
+            ),
+            (
+                f"cursor at row {args.rows - page_size}",
+                ORDER_LIST.page(frozenset(), cursor=True),
+                page_params(1, page_size, encode_cursor(deep["created_at"], deep["id"])),
+            ),
+        ]
+        for label, statement, params in cases:
+            await db.fetch(statement, *params)
+            start = time.perf_counter()
+            for _ in range(requests):
+                await db.fetch(statement, *params)
+            report(label, requests, time.perf_counter() - start)
+    finally:
+        await db.execute("DELETE FROM orders WHERE order_no LIKE 'BENCH%'")
+
+
+# Previous get_order_stats: aggregates over the whole orders table
+LEGACY_STATS_QUERIES = [
+    "SELECT status, COUNT(*) as count FROM orders GROUP BY status",
+    "SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE status != 'cancelled'",
+    "SELECT COUNT(*) FROM orders WHERE DATE(created_at) = CURRENT_DATE",
+]
+
+
+async def bench_stats(args):
+    """Dashboard statistics from the rollup versus aggregating orders."""
+    from app.services.order import RECENT_ORDERS, get_order_stats
+    
+    dealer_id = await db.fetchval("SELECT id FROM dealers WHERE status = 'approved' LIMIT 1")
+    if not dealer_id:
+        print("No approved dealer found; run scripts.seed_data first.")
+        return
+    
+    print(f"inserting {args.rows} synthetic orders over a year...")
+    await ensure_partitions(365)
+    await db.execute(
+        """
+        INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address, created_at)
+        SELECT 'BENCH' || g, $1,
+               (ARRAY['pending', 'confirmed', 'shipped', 'delivered', 'cancelled'])[1 + g % 5],
+               100, 'benchmark', CURRENT_TIMESTAMP - (g % 365) * interval '1 day'
+        FROM generate_series(1, $2) AS g
+        """,
+        dealer_id, args.rows
+    )
+    await db.execute("ANALYZE orders")
+    
+    async def legacy():
+        for query in LEGACY_STATS_QUERIES:
+            await db.fetch(query)
+        await db.fetch(RECENT_ORDERS)
+    
+    requests = max(1, args.requests // 100)
+    try:
+        for label, fn in [("aggregate orders", legacy), ("daily rollup", get_order_stats)]:
+            await fn()
+            start = time.perf_counter()
+            for _ in range(requests):
+                await fn()
+            report(label, requests, time.perf_counter() - start)
+    finally:
+        await db.execute("DELETE FROM orders WHERE order_no LIKE 'BENCH%'")
+
+
+async def bench_analytics(args):
+    """Year-long sales reports served from the daily sales facts."""
+    from app.services.analytics import BREAKDOWNS, get_sales
+    
+    dealer_id = await db.fetchval("SELECT id FROM dealers WHERE status = 'approved' LIMIT 1")
+    if not dealer_id:
+        print("No approved dealer found; run scripts.seed_data first.")
+        return
+    
+    print(f"inserting {args.rows} synthetic orders with items over a year...")
+    await ensure_partitions(365)
+    await db.execute(
+        """
+        INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address, created_at)
+        SELECT 'BENCH' || g, $1, 'confirmed', 100, 'benchmark',
+               CURRENT_TIMESTAMP - (g % 365) * interval '1 day'
+        FROM generate_series(1, $2) AS g
+        """,
+        dealer_id, args.rows
+    )
+    await db.execute(
+        """
+        WITH product AS (
+            SELECT id, name, row_number() OVER () - 1 AS n FROM products
+        )
+        INSERT INTO order_items (order_id, product_id, product_name, quantity, unit_price, subtotal, order_created_at)
+        SELECT o.id, product.id, product.name, 2, 25, 50, o.created_at
+        FROM orders o
+        CROSS JOIN generate_series(0, 1) AS i
+        JOIN product ON product.n = (abs(hashtext(o.order_no)) + i) % (SELECT count(*) FROM product)
+        WHERE o.order_no LIKE 'BENCH%'
+        """
+    )
+    
+    end = await db.fetchval("SELECT CURRENT_DATE")
+    start = end.replace(year=end.year - 1)
+    requests = max(1, args.requests // 100)
+    try:
+        for breakdown in (None, *BREAKDOWNS):
+            for interval in ("day", "month"):
+                await get_sales(start, end, interval, breakdown)
+                started = time.perf_counter()
+                for _ in range(requests):
+                    await get_sales(start, end, interval, breakdown)
+                report(f"{breakdown or 'total'} by {interval}", requests, time.perf_counter() - started)
+    finally:
+        await db.execute("DELETE FROM orders WHERE order_no LIKE 'BENCH%'")
+
+
+async def bench_batch_status(args):
+    """Confirm `--requests` orders one PUT-equivalent at a time versus in one batch."""
+    from app.services.order import update_order_status, update_order_statuses
+    
+    dealer_id = await db.fetchval("SELECT id FROM dealers WHERE status = 'approved' LIMIT 1")
+    if not dealer_id:
+        print("No approved dealer found; run scripts.seed_data first.")
+        return
+    
+    async def insert_pending(prefix):
+        rows = await db.fetch(
+            """
+            INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address)
+            SELECT $1 || g, $2, 'pending', 0, 'benchmark'
+            FROM generate_series(1, $3) AS g
+            RETURNING id
+            """,
+            prefix, dealer_id, args.requests
+        )
+        return [row["id"] for row in rows]
+    
+    try:
+        order_ids = await insert_pending("BENCH-SINGLE-")
+        with count_queries() as counter:
+            start = time.perf_counter()
+            for order_id in order_ids:
+                await update_order_status(order_id, "confirmed")
+            report("one statement per order", len(order_ids), time.perf_counter() - start, counter["queries"])
+        
+        order_ids = await insert_pending("BENCH-BATCH-")
+        with count_queries() as counter:
+            start = time.perf_counter()
+            results = await update_order_statuses(
+                [{"order_id": order_id, "status": "confirmed"} for order_id in order_ids]
+            )
+            report("one batch", len(order_ids), time.perf_counter() - start, counter["queries"])
+        
+        if not all(result["updated"] for result in results):
+            print("batch left orders unconfirmed")
+            sys.exit(1)
+    finally:
+        await db.execute("DELETE FROM orders WHERE order_no LIKE 'BENCH-%'")
+
+
+async def bench_export(args):
+    """Stream `--rows` orders as CSV; report first-chunk latency and peak memory."""
+    import tracemalloc
+    from app.services.order import export_orders
+    
+    dealer_id = await db.fetchval("SELECT id FROM dealers WHERE status = 'approved' LIMIT 1")
+    if not dealer_id:
+        print("No approved dealer found; run scripts.seed_data first.")
+        return
+    
+    print(f"inserting {args.rows} synthetic orders...")
+    await ensure_partitions(args.rows // 86400 + 1)
+    await db.execute(
+        """
+        INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address, created_at)
+        SELECT 'BENCH' || g, $1, 'pending', 0, 'benchmark',
+               CURRENT_TIMESTAMP - g * interval '1 second'
+        FROM generate_series(1, $2) AS g
+        """,
+        dealer_id, args.rows
+    )
+    
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        first_chunk = None
+        size = 0
+        async for chunk in export_orders("csv", dealer_id=dealer_id):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            size += len(chunk)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        report("csv export", args.rows, elapsed)
+        print(f"first chunk after {first_chunk * 1e3:.1f} ms, {size / 1e6:.1f} MB streamed, "
+              f"peak traced memory {peak / 1e6:.1f} MB")
+    finally:
+        await db.execute("DELETE FROM orders WHERE order_no LIKE 'BENCH%'")
+
+
+async def bench_idempotency(args):
+    """Time keyed creates and replays; check concurrent retries create one order."""
+    from app.config import settings
+    from app.services import order as order_service
+    from app.services.idempotency import IdempotencyStore
+    
+    dealer_id = await db.fetchval("SELECT id FROM dealers WHERE status = 'approved' LIMIT 1")
+    product = await db.fetchrow("SELECT id, name, price FROM products LIMIT 1")
+    if not dealer_id or not product:
+        print("No approved dealer or products found; run scripts.seed_data first.")
+        return
+    
+    items = [{
+        "product_id": product["id"],
+        "product_name": product["name"],
+        "quantity": 1,
+        "unit_price": product["price"],
+    }]
+    address = "benchmark-idempotency"
+    requests = max(1, args.requests // 10)
+    
+    async def create_once(key):
+        return await order_service.create_order_once(dealer_id, key, items, address)
+    
+    try:
+        with count_queries() as counter:
+            start = time.perf_counter()
+            for i in range(requests):
+                await create_once(f"bench-new-{i}")
+            report("new keys", requests, time.perf_counter() - start, counter["queries"])
+        
+        await create_once("bench-replay")
+        with count_queries() as counter:
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                await create_once("bench-replay")
+            report("replay, worker cache", args.requests, time.perf_counter() - start, counter["queries"])
+        
+        # A worker that has not seen the key reads it from the table
+        uncached = IdempotencyStore(ttl=settings.idempotency_key_ttl_seconds, cache_size=0)
+        request_hash = order_service._request_hash(items, address, None)
+        with count_queries() as counter:
+            start = time.perf_counter()
+            for _ in range(requests):
+                await uncached.run(f"orders:{dealer_id}", "bench-replay", request_hash, None)
+            report("replay, database", requests, time.perf_counter() - start, counter["queries"])
+        
+        # Retries of one key racing within and across simulated workers
+        stores = [
+            IdempotencyStore(ttl=settings.idempotency_key_ttl_seconds, cache_size=1000)
+            for _ in range(args.workers)
+        ]
+        
+        async def retry(store, key, order_no):
+            async def write(tx):
+                return await order_service._insert_order(tx, order_no, dealer_id, items, address, None)
+            return await store.run(f"orders:{dealer_id}", key, request_hash, write)
+        
+        keys = [f"bench-race-{i}" for i in range(20)]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            retry(stores[i % len(stores)], key, f"BENCH-{key}-{i}")
+            for key in keys
+            for i in range(args.workers * 5)
+        ))
+        report(f"{args.workers} workers, racing retries", len(results), time.perf_counter() - start)
+        
+        created = await db.fetchval(
+            "SELECT COUNT(*) FROM orders WHERE order_no LIKE 'BENCH-bench-race-%'"
+        )
+        replayed = sum(replayed for _, replayed in results)
+        print(f"{len(keys)} keys: {created} orders created, {replayed} replays")
+        if created != len(keys):
+            print("racing retries created duplicate orders")
+            sys.exit(1)
+    finally:
+        await db.execute("DELETE FROM orders WHERE shipping_address = $1", address)
+        await db.execute("DELETE FROM idempotency_keys WHERE key LIKE 'bench-%'")
+
+
+# The order list filter before prefix and trigram search
+LEGACY_ORDER_NO_SEARCH = """
+    SELECT o.id, o.order_no, o.status, o.created_at, d.company_name as dealer_company
+    FROM orders o JOIN dealers d ON d.id = o.dealer_id
+    WHERE o.order_no ILIKE $1
+    ORDER BY o.created_at DESC, o.id DESC
+    LIMIT 20
+"""
+
+
+async def bench_search(args):
+    """Order number and text search over `--rows` synthetic orders."""
+    from app.services.order import list_orders
+    
+    dealer_id = await db.fetchval("SELECT id FROM dealers WHERE status = 'approved' LIMIT 1")
+    company = await db.fetchval("SELECT company_name FROM dealers WHERE id = $1", dealer_id)
+    if not dealer_id:
+        print("No approved dealer found; run scripts.seed_data first.")
+        return
+    
+    trigram = await db.fetchval("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    if not trigram:
+        print("pg_trgm is not installed: substring search runs without its indexes")
+    
+    print(f"inserting {args.rows} synthetic orders...")
+    await ensure_partitions(args.rows // 86400 + 1)
+    await db.execute(
+        """
+        INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address, created_at)
+        SELECT 'BENCH' || lpad(g::text, 8, '0'), $1, 'pending', 100,
+               'Room ' || g % 997 || ', ' || (ARRAY['Harbour', 'Garden', 'Station', 'Market'])[1 + g % 4]
+                   || ' Road, District ' || g % 37,
+               CURRENT_TIMESTAMP - g * interval '1 second'
+        FROM generate_series(1, $2) AS g
+        """,
+        dealer_id, args.rows
+    )
+    await db.execute("ANALYZE orders")
+    
+    middle = f"{args.rows // 2:08d}"
+    searches = [
+        ("order_no exact", {"order_no": f"BENCH{middle}"}),
+        ("order_no prefix", {"order_no": f"BENCH{middle[:-2]}"}),
+        ("search order_no substring", {"search": middle[1:]}),
+        ("search shipping address", {"search": "Room 123, Station"}),
+        ("search dealer company", {"search": company[1:]}),
+    ]
+    
+    requests = max(1, args.requests // 100)
+    try:
+        await db.fetch(LEGACY_ORDER_NO_SEARCH, f"%BENCH{middle}%")
+        start = time.perf_counter()
+        for _ in range(requests):
+            await db.fetch(LEGACY_ORDER_NO_SEARCH, f"%BENCH{middle}%")
+        report("legacy order_no ILIKE", requests, time.perf_counter() - start)
+        
+        for label, filters in searches:
+            await list_orders(page_size=20, count="none", **filters)
+            start = time.perf_counter()
+            for _ in range(requests):
+                await list_orders(page_size=20, count="none", **filters)
+            report(label, requests, time.perf_counter() - start)
+    finally:
+        await db.execute("DELETE FROM orders WHERE order_no LIKE 'BENCH%'")
+
+
+async def bench_catalog(args):
+    """Product catalog reads from the in-process mirror versus the database.
+    
+    Adds `--products` synthetic products (deleted afterwards) across ten
+    categories, then times dealer listing, category, deep page and detail
+    requests through the product service, with the mirror unloaded and loaded.
+    """
+    from app.services import product as product_service
+    from app.services.catalog import catalog
+    
+    print(f"inserting {args.products} synthetic products...")
+    await db.execute(
+        """
+        INSERT INTO products (name, category, price, unit, description, stock, created_at)
+        SELECT 'BENCH' || g, 'BENCH' || g % 10, 10, 'box', 'benchmark product', 100,
+               CURRENT_TIMESTAMP - g * interval '1 minute'
+        FROM generate_series(1, $1) AS g
+        """,
+        args.products
+    )
+    await db.execute("ANALYZE products")
+    product_id = await db.fetchval("SELECT id FROM products WHERE name = 'BENCH1'")
+    deep_page = max(1, args.products // 20 // 2)
+    cases = [
+        ("list page 1", lambda: product_service.list_products(is_active=True)),
+        ("list category", lambda: product_service.list_products(category="BENCH3", is_active=True)),
+        (f"list page {deep_page}", lambda: product_service.list_products(page=deep_page, is_active=True)),
+        ("detail", lambda: product_service.get_product_by_id(product_id)),
+    ]
+    
+    try:
+        for mode in ("database", "mirror"):
+            if mode == "mirror":
+                await catalog.load()
+            else:
+                catalog.unload()
+            for label, request in cases:
+                await request()
+                with count_queries() as counter:
+                    start = time.perf_counter()
+                    for _ in range(args.requests):
+                        await request()
+                    elapsed = time.perf_counter() - start
+                report(f"{mode}: {label}", args.requests, elapsed, counter["queries"])
+        print(f"mirror: {catalog.stats()}")
+    finally:
+        catalog.unload()
+        await db.execute("DELETE FROM products WHERE name LIKE 'BENCH%'")
+
+
+def _build_orders_query_inline(dealer_id, status, order_no):
+    """Previous list_orders shape: WHERE clause assembled on every call."""
+    conditions = []
+    params = []
+    param_count = 1
+    
+    if dealer_id:
+        conditions.append(f"o.dealer_id = ${param_count}")
+        params.append(dealer_id)
+        param_count += 1
+    
+    if status:
+        conditions.append(f"o.status = ${param_count}")
+        params.append(status)
+        param_count += 1
+    
+    if order_no:
+        conditions.append(f"o.order_no ILIKE ${param_count}")
+        params.append(f"%{order_no}%")
+        param_count += 1
+    
+    where_clause = ""
+    if conditions:
+        where_clause = "WHERE " + " AND ".join(conditions)
+    
+    query = f"""
+        SELECT o.id, o.order_no, o.dealer_id, o.status, o.total_amount,
+               o.shipping_address, o.notes, o.created_at, o.updated_at,
+               d.company_name as dealer_company
+        FROM orders o
+        JOIN dealers d ON d.id = o.dealer_id
+        {where_clause}
+        ORDER BY o.created_at DESC
+        LIMIT ${param_count} OFFSET ${param_count + 1}
+    """
+    return query, params
+
+
+async def bench_query_build(args):
+    """SQL build cost per request, and a check that compiled statements stay bounded.
+    
+    Exits non-zero if any list query compiles more distinct statements
+    than its spec allows.
+    """
+    import itertools
+    import random
+    from uuid import uuid4
+    from app.services.order import ORDER_LIST
+    from app.services.product import PRODUCT_LIST
+    from app.services.dealer import DEALER_LIST
+    from app.services.user import USER_LIST
+    from app.statements import statements
+    
+    dealer_id = uuid4()
+    combos = list(itertools.product((None, dealer_id), (None, "pending"), (None, "ORD2026")))
+    
+    start = time.perf_counter()
+    for i in range(args.requests):
+        _build_orders_query_inline(*combos[i % len(combos)])
+    report("inline f-string build", args.requests, time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    for i in range(args.requests):
+        d, st, no = combos[i % len(combos)]
+        present, params = ORDER_LIST.bind(
+            {"dealer_id": d, "status": st, "order_no": f"%{no}%" if no else None}
+        )
+        ORDER_LIST.page(present, total=True)
+    report("compiled, memoized", args.requests, time.perf_counter() - start)
+    
+    # Drive every list query through random filter/option combinations
+    rng = random.Random(0)
+    failures = 0
+    for query in (PRODUCT_LIST, ORDER_LIST, DEALER_LIST, USER_LIST):
+        for _ in range(args.requests):
+            present = frozenset(f.name for f in query.filters if rng.random() < 0.5)
+            cursor = rng.random() < 0.5
+            query.count(present)
+            query.page(present, cursor=cursor, total=not cursor and rng.random() < 0.5)
+        compiled = query.compiled_statements()
+        bound = query.max_statements()
+        status = "ok" if compiled <= bound else "EXCEEDED"
+        failures += compiled > bound
+        print(f"{query.name:<32} {compiled:>4} statements (bound {bound}) {status}")
+    print(f"registered statements: {len(statements)}")
+    
+    if failures:
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    "auth": bench_auth,
+    "decode": bench_decode,
+    "orders": bench_orders,
+    "order-numbers": bench_order_numbers,
+    "pagination": bench_pagination,
+    "stats": bench_stats,
+    "analytics": bench_analytics,
+    "batch-status": bench_batch_status,
+    "export": bench_export,
+    "idempotency": bench_idempotency,
+    "search": bench_search,
+    "query-build": bench_query_build,
+    "catalog": bench_catalog,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4, help="simulated workers (order-numbers, idempotency)")
+    parser.add_argument("--rows", type=int, default=500000, help="synthetic orders (pagination, stats, analytics, export, search)")
+    parser.add_argument("--products", type=int, default=3000, help="synthetic products (catalog)")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    await db.connect()
+    try:
+        await BENCHMARKS[args.benchmark](args)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Check that the hot service queries are planned on indexes.
+
+Loads a synthetic dataset inside a transaction, runs EXPLAIN on each service
+statement with representative parameters and fails if any of them reads one
+of the large tables with a sequential scan. When orders are partitioned, it
+also shows how many monthly partitions each plan reads after pruning. The
+transaction is rolled back, so the database is left as it was.
+
+Usage:
+    python -m scripts.check_plans [--orders N]
+"""
+import argparse
+import asyncio
+import sys
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterator
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import db
+from app.services import auth, dealer, order, order_partitions, product, user
+from app.services.order_partitions import parent_table, partition_month
+from app.services.pagination import page_params
+
+
+PREFIX = "plancheck"
+
+# Every status the app writes, spread evenly over the synthetic rows
+STATUSES = {"dealers": list(dealer.DEALER_STATUSES), "orders": list(order.TRANSITIONS)}
+
+DATASET = [
+    ("users", """
+    INSERT INTO users (username, email, password_hash, role, created_at)
+    SELECT '{prefix}' || g, '{prefix}' || g || '@example.com', 'x',
+           CASE WHEN g % 100 = 0 THEN 'admin' ELSE 'dealer' END,
+           CURRENT_TIMESTAMP - g * interval '1 hour'
+    FROM generate_series(1, $1) AS g
+    """),
+    ("dealers", """
+    INSERT INTO dealers (user_id, company_name, contact_name, phone, status, created_at)
+    SELECT u.id, u.username, u.username, '000',
+           ($1::text[])[1 + abs(hashtext(u.username)) % cardinality($1::text[])],
+           u.created_at
+    FROM users u
+    WHERE u.username LIKE '{prefix}%' AND u.role = 'dealer'
+    """),
+    ("products", """
+    INSERT INTO products (name, category, price, unit, stock, is_active, created_at)
+    SELECT '{prefix} product ' || g, 'category ' || g % 20, 10, 'pcs', 100,
+           g % 10 <> 0, CURRENT_TIMESTAMP - g * interval '1 hour'
+    FROM generate_series(1, $1) AS g
+    """),
+    ("orders", """
+    WITH dealer AS (
+        SELECT id, row_number() OVER () - 1 AS n FROM dealers WHERE company_name LIKE '{prefix}%'
+    )
+    INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address, created_at)
+    SELECT '{prefix}' || g, dealer.id,
+           ($2::text[])[1 + g % cardinality($2::text[])],
+           100, 'plan check ' || g % 1000 || ' street', CURRENT_TIMESTAMP - g * interval '1 minute'
+    FROM generate_series(1, $1) AS g
+    JOIN dealer ON dealer.n = g % (SELECT count(*) FROM dealer)
+    """),
+    ("order_items", """
+    WITH product AS (
+        SELECT id, row_number() OVER () - 1 AS n FROM products WHERE name LIKE '{prefix}%'
+    )
+    INSERT INTO order_items (order_id, product_id, product_name, quantity, unit_price, subtotal, order_created_at)
+    SELECT o.id, product.id, 'item', 1, 50, 50, o.created_at
+    FROM orders o
+    CROSS JOIN generate_series(1, 2) AS i
+    JOIN product ON product.n = (abs(hashtext(o.order_no)) + i) % (SELECT count(*) FROM product)
+    WHERE o.order_no LIKE '{prefix}%'
+    """),
+]
+
+# Tables large enough in production that a sequential scan is a regression
+LARGE_TABLES = {"orders", "order_items", "products", "dealers", "users"}
+
+
+def seq_scans(plan: dict, empty: frozenset = frozenset()) -> Iterator[str]:
+    """Relations read by a Seq Scan anywhere in a plan tree (partitions as their table).
+    
+    Scans of `empty` relations (future partitions) are free and skipped.
+    """
+    if plan["Node Type"] == "Seq Scan" and plan["Relation Name"] not in empty:
+        yield parent_table(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child, empty)
+
+
+def partitions_read(plan: dict) -> Iterator[str]:
+    """Monthly orders (not order_items) partitions read anywhere in a plan tree."""
+    name = plan.get("Relation Name", "")
+    if partition_month(name) and parent_table(name) == "orders":
+        yield name
+    for child in plan.get("Plans", ()):
+        yield from partitions_read(child)
+
+
+async def sample(conn) -> dict:
+    """Representative parameter values from the synthetic dataset."""
+    row = await conn.fetchrow(
+        """
+        SELECT o.id AS order_id, o.order_no, o.dealer_id, o.created_at, d.user_id, u.username
+        FROM orders o
+        JOIN dealers d ON d.id = o.dealer_id
+        JOIN users u ON u.id = d.user_id
+        WHERE o.order_no = $1
+        """,
+        f"{PREFIX}1000"
+    )
+    trigram = await conn.fetchval("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    return {**row, "trigram": bool(trigram)}
+
+
+def cases(s: dict) -> list:
+    """(label, statement, params) for each hot query shape."""
+    first = page_params(1, 20, None)
+    seek = [s["created_at"], s["order_id"], 21]
+    checks = [
+        ("order by id", order.GET_ORDER, [s["order_id"]]),
+        ("order by number", order.GET_ORDER_BY_NO, [s["order_no"]]),
+        (
+            "order by number and day",
+            order.GET_ORDER_BY_NO_IN_RANGE,
+            [s["order_no"], s["created_at"] - timedelta(days=1), s["created_at"] + timedelta(days=1)],
+        ),
+        ("recent orders", order.RECENT_ORDERS, []),
+        ("order list", order.ORDER_LIST.page(frozenset()), first),
+        ("order list, cursor", order.ORDER_LIST.page(frozenset(), cursor=True), seek),
+        (
+            "order list by dealer",
+            order.ORDER_LIST.page(frozenset({"dealer_id"}), total=True),
+            [s["dealer_id"], *first],
+        ),
+        (
+            "order list by status, cursor",
+            order.ORDER_LIST.page(frozenset({"status"}), cursor=True),
+            ["pending", *seek],
+        ),
+        ("order count by dealer", order.ORDER_LIST.count(frozenset({"dealer_id"})), [s["dealer_id"]]),
+        (
+            "order list by number prefix",
+            order.ORDER_LIST.page(frozenset({"order_no"})),
+            [s["order_no"][:-1] + "%", *first],
+        ),
+        ("active products", product.PRODUCT_LIST.page(frozenset({"is_active"})), [True, *first]),
+        (
+            "active products by category",
+            product.PRODUCT_LIST.page(frozenset({"category", "is_active"})),
+            ["category 7", True, *first],
+        ),
+        ("dealer by user", dealer.GET_DEALER_BY_USER, [s["user_id"]]),
+        ("dealer list by status", dealer.DEALER_LIST.page(frozenset({"status"})), ["approved", *first]),
+        ("user for login", auth.GET_USER_FOR_LOGIN, [s["username"]]),
+        ("user with dealer", auth.GET_USER_WITH_DEALER, [s["user_id"]]),
+        ("user list by role", user.USER_LIST.page(frozenset({"role"})), ["admin", *first]),
+    ]
+    if s["trigram"]:
+        # Without pg_trgm, substring search has no index to use
+        checks.append((
+            "order search",
+            order.ORDER_LIST.page(frozenset({"search"}), total=True),
+            ["%check 123 str%", *first],
+        ))
+    return checks
+
+
+async def check(args) -> int:
+    failures = 0
+    async with db.connection() as conn:
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            print(f"loading {args.orders} synthetic orders...")
+            partitioned = await conn.fetchval(order_partitions.IS_PARTITIONED.sql)
+            if partitioned:
+                # Orders go back one minute each
+                month = order_partitions.current_month()
+                await order_partitions.create_partitions(
+                    month - timedelta(minutes=args.orders), month, conn=conn
+                )
+            params = {
+                "users": [args.orders // 50],
+                "dealers": [STATUSES["dealers"]],
+                "products": [args.orders // 20],
+                "orders": [args.orders, STATUSES["orders"]],
+            }
+            for table, sql in DATASET:
+                await conn.execute(sql.format(prefix=PREFIX), *params.get(table, []))
+                # Fresh statistics for the next step's triggers as well as the checks
+                await conn.execute(f"ANALYZE {table}")
+            
+            empty = frozenset()
+            if partitioned:
+                empty = frozenset(
+                    row["name"] for row in await conn.fetch(order_partitions.LIST_PARTITIONS.sql)
+                    if row["estimated_rows"] == 0
+                )
+            
+            for label, statement, params in cases(await sample(conn)):
+                plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {statement.sql}", *params)
+                scanned = sorted(set(seq_scans(plan[0]["Plan"], empty)) & LARGE_TABLES)
+                if scanned:
+                    failures += 1
+                    print(f"{label:<32} SEQ SCAN on {', '.join(scanned)}   ({statement.name})")
+                elif partitioned:
+                    read = len(set(partitions_read(plan[0]["Plan"])))
+                    print(f"{label:<32} ok   ({read} order partitions)")
+                else:
+                    print(f"{label:<32} ok")
+        finally:
+            await transaction.rollback()
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200000, help="synthetic orders")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    await db.connect()
+    try:
+        failures = await check(args)
+    finally:
+        await db.disconnect()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""Convert orders and order_items to monthly partitions, and manage partitions.
+
+The conversion runs online in three steps, each of which can be re-run:
+
+1. prepare: create partitioned shadow tables (orders_partitioned and
+   order_items_partitioned) with the indexes of the live tables, monthly
+   partitions from the oldest order through the months ahead, and row
+   triggers on the live tables that mirror every write into the shadows.
+2. copy: copy existing orders and their items in batches, in (created_at,
+   id) order. A batch share-locks only its own source rows until it
+   commits, so other writes continue and none is lost. Progress is recorded
+   with each batch, so an interrupted copy resumes where it stopped.
+3. swap: finish the copy and compare row counts, then in one short
+   transaction rename the live tables to *_unpartitioned, rename the shadows
+   into place and move the rollup triggers onto them. Only the renames hold
+   an exclusive lock, and waiting for it is bounded by --lock-timeout.
+
+After the swap, `drop-unpartitioned` removes the old tables and restores the
+original index and constraint names.
+
+The partitioned orders table enforces uniqueness per (order_no, created_at),
+as partitioned unique keys must include the partition key; order numbers
+stay unique overall through the order_numbers table, whose triggers move
+with the others. Items without an order are not copied.
+
+Usage:
+    python -m scripts.partition_orders convert [--batch-size N] [--pause SECONDS]
+    python -m scripts.partition_orders prepare|copy|swap [...]
+    python -m scripts.partition_orders status
+    python -m scripts.partition_orders ensure [--months-ahead N] [--since YYYY-MM-DD]
+    python -m scripts.partition_orders detach --before YYYY-MM-DD [--archive-schema NAME]
+    python -m scripts.partition_orders drop-unpartitioned
+"""
+import argparse
+import asyncio
+import re
+import sys
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.database import db
+from app.services import order_partitions
+from app.services.order_partitions import ITEMS_ORDER_FKEY, add_months, current_month
+
+
+SHADOWS = {"orders": "orders_partitioned", "order_items": "order_items_partitioned"}
+OLD_SUFFIX = "_unpartitioned"
+# Shadow indexes and constraints carry this suffix until the old tables are dropped
+SHADOW_SUFFIX = "_p"
+MIRROR_TRIGGER = "partition_mirror"
+
+# Same columns, in the same order, as the live tables (so `SELECT *` copies
+# and cached statements keep their row shape across the swap).
+SHADOW_TABLES = [
+    f"""
+    CREATE TABLE IF NOT EXISTS orders_partitioned (
+        id UUID NOT NULL DEFAULT gen_random_uuid(),
+        order_no VARCHAR(50) NOT NULL,
+        dealer_id UUID REFERENCES dealers(id) ON DELETE RESTRICT,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        total_amount DECIMAL(12, 2) NOT NULL,
+        shipping_address TEXT NOT NULL,
+        notes TEXT,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT orders_pkey{SHADOW_SUFFIX} PRIMARY KEY (id, created_at),
+        CONSTRAINT orders_order_no_created_at_key UNIQUE (order_no, created_at)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS order_items_partitioned (
+        id UUID NOT NULL DEFAULT gen_random_uuid(),
+        order_id UUID NOT NULL,
+        product_id UUID REFERENCES products(id) ON DELETE RESTRICT,
+        product_name VARCHAR(255) NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit_price DECIMAL(10, 2) NOT NULL,
+        subtotal DECIMAL(12, 2) NOT NULL,
+        order_created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        CONSTRAINT order_items_pkey{SHADOW_SUFFIX} PRIMARY KEY (id, order_created_at),
+        CONSTRAINT {ITEMS_ORDER_FKEY} FOREIGN KEY (order_id, order_created_at)
+            REFERENCES orders_partitioned (id, created_at) ON DELETE CASCADE ON UPDATE CASCADE
+    ) PARTITION BY RANGE (order_created_at)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS orders_partition_progress (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        last_created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT '-infinity',
+        last_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+        copied_orders BIGINT NOT NULL DEFAULT 0,
+        copied_items BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT INTO orders_partition_progress DEFAULT VALUES ON CONFLICT DO NOTHING",
+]
+
+# Writes to the live tables, replayed on the shadows. Updates and deletes of
+# rows not copied yet find nothing; the copy picks up their current state.
+MIRROR_FUNCTIONS = [
+    """
+    CREATE OR REPLACE FUNCTION orders_partition_mirror() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM orders_partitioned WHERE id = OLD.id;
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'UPDATE' THEN
+            UPDATE orders_partitioned p
+            SET order_no = NEW.order_no, dealer_id = NEW.dealer_id, status = NEW.status,
+                total_amount = NEW.total_amount, shipping_address = NEW.shipping_address,
+                notes = NEW.notes, created_at = NEW.created_at, updated_at = NEW.updated_at
+            WHERE p.id = OLD.id;
+            IF FOUND THEN
+                RETURN NULL;
+            END IF;
+        END IF;
+        INSERT INTO orders_partitioned SELECT NEW.* ON CONFLICT DO NOTHING;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION order_items_partition_mirror() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM order_items_partitioned WHERE id = OLD.id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.order_id IS NOT NULL THEN
+            -- The order itself may not have been copied yet
+            INSERT INTO orders_partitioned
+            SELECT o.* FROM orders o WHERE o.id = NEW.order_id
+            ON CONFLICT DO NOTHING;
+            INSERT INTO order_items_partitioned
+            SELECT NEW.id, NEW.order_id, NEW.product_id, NEW.product_name, NEW.quantity,
+                   NEW.unit_price, NEW.subtotal, o.created_at
+            FROM orders o WHERE o.id = NEW.order_id
+            ON CONFLICT DO NOTHING;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+]
+
+# One batch of orders after the recorded progress, with their items
+COPY_ORDERS = """
+    WITH batch AS (
+        SELECT * FROM orders
+        WHERE (created_at, id) > ($1, $2)
+        ORDER BY created_at, id
+        LIMIT $3
+        FOR SHARE
+    ), copied AS (
+        INSERT INTO orders_partitioned SELECT * FROM batch
+        ON CONFLICT DO NOTHING
+    )
+    SELECT id, created_at FROM batch ORDER BY created_at, id
+"""
+
+COPY_ITEMS = """
+    WITH batch AS (
+        SELECT i.id, i.order_id, i.product_id, i.product_name, i.quantity,
+               i.unit_price, i.subtotal, o.created_at
+        FROM order_items i
+        JOIN orders o ON o.id = i.order_id
+        WHERE i.order_id = ANY($1::uuid[])
+        FOR SHARE OF i
+    )
+    INSERT INTO order_items_partitioned SELECT * FROM batch
+    ON CONFLICT DO NOTHING
+"""
+
+# User triggers of a table (the rollups and any mirror), with their definitions
+TABLE_TRIGGERS = """
+    SELECT tgname, pg_get_triggerdef(oid) AS definition
+    FROM pg_trigger
+    WHERE tgrelid = to_regclass($1) AND NOT tgisinternal
+"""
+
+# Secondary indexes of a table, to be recreated on its shadow
+TABLE_INDEXES = """
+    SELECT c.relname AS name, pg_get_indexdef(i.indexrelid) AS definition
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = to_regclass($1) AND NOT i.indisprimary AND NOT i.indisunique
+"""
+
+
+def _on_table(definition: str, table: str, target: str) -> str:
+    """Point an index or trigger definition at `target` instead of `table`."""
+    return re.sub(rf" ON (\w+\.)?{table} ", f" ON {target} ", definition, count=1)
+
+
+async def _shadow_exists() -> bool:
+    return await db.fetchval("SELECT to_regclass('orders_partitioned') IS NOT NULL")
+
+
+async def prepare(args) -> None:
+    if await order_partitions.is_partitioned():
+        print("orders is already partitioned")
+        return
+    
+    # The partition key must not be NULL
+    fixed = await db.execute(
+        "UPDATE orders SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL"
+    )
+    if fixed != "UPDATE 0":
+        print(f"set missing created_at: {fixed}")
+    
+    async with db.transaction() as tx:
+        for sql in SHADOW_TABLES:
+            await tx.execute(sql)
+        for table, shadow in SHADOWS.items():
+            for row in await tx.fetch(TABLE_INDEXES, table):
+                definition = _on_table(row["definition"], table, shadow)
+                definition = definition.replace(
+                    f"INDEX {row['name']} ", f"INDEX IF NOT EXISTS {row['name']}{SHADOW_SUFFIX} ", 1
+                )
+                await tx.execute(definition)
+        
+        oldest = await tx.fetchval("SELECT MIN(created_at) FROM orders") or datetime.now()
+        this_month = current_month()
+        created = await order_partitions.create_partitions(
+            min(oldest.date(), this_month),
+            add_months(this_month, args.months_ahead),
+            parents=SHADOWS,
+            conn=tx,
+        )
+        
+        for sql in MIRROR_FUNCTIONS:
+            await tx.execute(sql)
+        for table in SHADOWS:
+            await tx.execute(f"DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {table}")
+            await tx.execute(f"""
+                CREATE TRIGGER {MIRROR_TRIGGER}
+                AFTER INSERT OR UPDATE OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION {table}_partition_mirror()
+            """)
+    print(f"prepared shadow tables with {len(created)} new partitions; writes are mirrored")
+
+
+async def _copy_batch(tx, batch_size: int):
+    """Copy the next batch and record progress; returns (orders copied, last order) or None."""
+    progress = await tx.fetchrow("SELECT * FROM orders_partition_progress FOR UPDATE")
+    batch = await tx.fetch(COPY_ORDERS, progress["last_created_at"], progress["last_id"], batch_size)
+    if not batch:
+        return None
+    items = int((await tx.execute(COPY_ITEMS, [row["id"] for row in batch])).split()[-1])
+    last = batch[-1]
+    await tx.execute(
+        """
+        UPDATE orders_partition_progress
+        SET last_created_at = $1, last_id = $2,
+            copied_orders = copied_orders + $3, copied_items = copied_items + $4
+        """,
+        last["created_at"], last["id"], len(batch), items
+    )
+    return progress["copied_orders"] + len(batch), last
+
+
+async def copy(args) -> None:
+    if not await _shadow_exists():
+        print("run prepare first")
+        sys.exit(1)
+    
+    started = time.perf_counter()
+    while True:
+        async with db.transaction() as tx:
+            copied = await _copy_batch(tx, args.batch_size)
+        if copied is None:
+            break
+        total, last = copied
+        print(
+            f"copied {total} orders through {last['created_at']:%Y-%m-%d %H:%M} "
+            f"({time.perf_counter() - started:.0f}s)"
+        )
+        if args.pause:
+            await asyncio.sleep(args.pause)
+    print("copy complete")
+
+
+async def _verify() -> bool:
+    # One statement, one snapshot: a mirrored write is counted on both sides or neither
+    counts = await db.fetchrow("""
+        SELECT (SELECT COUNT(*) FROM orders) AS orders,
+               (SELECT COUNT(*) FROM orders_partitioned) AS orders_partitioned,
+               (SELECT COUNT(*) FROM order_items WHERE order_id IS NOT NULL) AS order_items,
+               (SELECT COUNT(*) FROM order_items_partitioned) AS order_items_partitioned
+    """)
+    print(
+        f"orders {counts['orders']} -> {counts['orders_partitioned']}, "
+        f"order_items {counts['order_items']} -> {counts['order_items_partitioned']}"
+    )
+    return (
+        counts["orders"] == counts["orders_partitioned"]
+        and counts["order_items"] == counts["order_items_partitioned"]
+    )
+
+
+async def swap(args) -> None:
+    if not await _shadow_exists():
+        print("run prepare and copy first")
+        sys.exit(1)
+    
+    # Catch up and compare without the lock; later writes are mirrored
+    await copy(args)
+    if not await _verify():
+        print("shadow tables do not match; run prepare and copy again")
+        sys.exit(1)
+    
+    async with db.transaction() as tx:
+        await tx.execute(f"SET LOCAL lock_timeout = '{int(args.lock_timeout * 1000)}ms'")
+        await tx.execute("LOCK TABLE orders, order_items IN ACCESS EXCLUSIVE MODE")
+        # Orders added since the last batch are already mirrored; this only
+        # moves the progress marker past them
+        while await _copy_batch(tx, args.batch_size):
+            pass
+        
+        for table, shadow in SHADOWS.items():
+            await tx.execute(f"DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {table}")
+            for row in await tx.fetch(TABLE_TRIGGERS, table):
+                await tx.execute(f"DROP TRIGGER {row['tgname']} ON {table}")
+                await tx.execute(_on_table(row["definition"], table, shadow))
+        for table, shadow in SHADOWS.items():
+            await tx.execute(f"ALTER TABLE {table} RENAME TO {table}{OLD_SUFFIX}")
+            await tx.execute(f"ALTER TABLE {shadow} RENAME TO {table}")
+    print("swapped: orders and order_items are partitioned; old tables kept as *_unpartitioned")
+
+
+async def convert(args) -> None:
+    await prepare(args)
+    if await order_partitions.is_partitioned():
+        return
+    await swap(args)
+
+
+async def drop_unpartitioned(args) -> None:
+    if not await order_partitions.is_partitioned():
+        print("orders is not partitioned; nothing to drop")
+        sys.exit(1)
+    
+    async with db.transaction() as tx:
+        await tx.execute(f"DROP TABLE IF EXISTS order_items{OLD_SUFFIX}, orders{OLD_SUFFIX}")
+        await tx.execute("DROP TABLE IF EXISTS orders_partition_progress")
+        for table in SHADOWS:
+            await tx.execute(f"DROP FUNCTION IF EXISTS {table}_partition_mirror()")
+            await tx.execute(
+                f"ALTER TABLE {table} RENAME CONSTRAINT {table}_pkey{SHADOW_SUFFIX} TO {table}_pkey"
+            )
+            for row in await tx.fetch(TABLE_INDEXES, table):
+                if row["name"].endswith(SHADOW_SUFFIX):
+                    await tx.execute(
+                        f"ALTER INDEX {row['name']} RENAME TO {row['name'][:-len(SHADOW_SUFFIX)]}"
+                    )
+    print("dropped the unpartitioned tables")
+
+
+async def status(args) -> None:
+    if await _shadow_exists():
+        progress = await db.fetchrow("SELECT * FROM orders_partition_progress")
+        print(
+            f"converting: {progress['copied_orders']} orders and {progress['copied_items']} items copied "
+            f"through {progress['last_created_at']}"
+        )
+    elif not await order_partitions.is_partitioned():
+        print("orders is not partitioned")
+        return
+    
+    for row in await order_partitions.list_partitions():
+        print(f"{row['name']:<28} {row['estimated_rows']:>12}  {row['bounds']}")
+
+
+async def ensure(args) -> None:
+    if not await order_partitions.is_partitioned():
+        print("orders is not partitioned")
+        sys.exit(1)
+    this_month = current_month()
+    created = await order_partitions.create_partitions(
+        min(args.since or this_month, this_month), add_months(this_month, args.months_ahead)
+    )
+    print(f"created {len(created)} partitions: {', '.join(created) or '-'}")
+
+
+async def detach(args) -> None:
+    if not await order_partitions.is_partitioned():
+        print("orders is not partitioned")
+        sys.exit(1)
+    detached = await order_partitions.detach_partitions(args.before, args.archive_schema)
+    print(f"detached {len(detached)} partitions: {', '.join(detached) or '-'}")
+
+
+COMMANDS = {
+    "convert": convert,
+    "prepare": prepare,
+    "copy": copy,
+    "swap": swap,
+    "status": status,
+    "ensure": ensure,
+    "detach": detach,
+    "drop-unpartitioned": drop_unpartitioned,
+}
+
+
+def identifier(value: str) -> str:
+    if not re.fullmatch(r"[a-z_][a-z0-9_]*", value):
+        raise argparse.ArgumentTypeError(f"not a plain identifier: {value}")
+    return value
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=list(COMMANDS))
+    parser.add_argument("--batch-size", type=int, default=5000, help="orders per copy batch")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between copy batches")
+    parser.add_argument("--lock-timeout", type=float, default=5.0, help="seconds to wait for the swap lock")
+    parser.add_argument("--months-ahead", type=int, default=settings.order_partition_months_ahead)
+    parser.add_argument("--since", type=date.fromisoformat, help="also create partitions back to this date (ensure)")
+    parser.add_argument("--before", type=date.fromisoformat, help="detach months before this date's month")
+    parser.add_argument("--archive-schema", type=identifier, default="archive")
+    args = parser.parse_args()
+    if args.command == "detach" and args.before is None:
+        parser.error("detach requires --before")
+    return args
+
+
+async def main():
+    args = parse_args()
+    await db.connect()
+    try:
+        await COMMANDS[args.command](args)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Rebuild the order rollups (order_daily_stats and the sales facts) from orders.
+
+Run after changing BUSINESS_TIMEZONE, or if a rollup is suspected to have
+drifted. Writes to orders wait for the rebuild; reads are not blocked.
+
+Usage:
+    python -m scripts.rebuild_order_stats
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.database import db
+from app.services.analytics import rebuild_sales_facts
+from app.services.order_stats import rebuild_order_stats
+
+
+async def main():
+    await db.connect()
+    try:
+        # Redefines the business day function the sales facts use
+        stats_rows = await rebuild_order_stats()
+        fact_rows = await rebuild_sales_facts()
+    finally:
+        await db.disconnect()
+    print(f"order_daily_stats rebuilt: {stats_rows} rows (business timezone {settings.business_timezone})")
+    print(f"sales facts rebuilt: {fact_rows} rows")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,13 +4,13 @@ import json
 import sys
 from pathlib import Path
 from decimal import Decimal
-from datetime import datetime, timezone
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.database import db
 from app.services.auth import hash_password
+from app.services.order_number import order_numbers
 
 
 def get_seed_path():
@@ -56,7 +56,7 @@ async def seed_users():
             """,
             user["username"],
             user["email"],
-            hash_password(user["password"]),
+            await hash_password(user["password"]),
             user.get("role", "admin"),
             True
         )
@@ -151,7 +151,7 @@ async def seed_dealers():
             """,
             dealer["username"],
             dealer["email"],
-            hash_password(dealer["password"]),
+            await hash_password(dealer["password"]),
             "dealer",
             True
         )
@@ -198,7 +198,7 @@ async def seed_orders(dealer_map):
     products = await db.fetch("SELECT id, name, price FROM products")
     product_map = {p["name"]: {"id": p["id"], "price": p["price"]} for p in products}
     
-    for i, order in enumerate(orders_data):
+    for order in orders_data:
         dealer_username = order["dealer_username"]
         dealer_id = dealer_map.get(dealer_username)
         
@@ -232,13 +232,14 @@ async def seed_orders(dealer_map):
             print(f"No valid items for order, skipping...")
             continue
         
-        order_no = f"ORD{datetime.now(timezone.utc).strftime('%Y%m%d')}{(i + 1):03d}"
+        # Through the allocator, so the app's own numbering continues after these
+        order_no = await order_numbers.allocate()
         
         order_record = await db.fetchrow(
             """
             INSERT INTO orders (order_no, dealer_id, status, total_amount, shipping_address, notes)
             VALUES ($1, $2, $3, $4, $5, $6)
-            RETURNING id
+            RETURNING id, created_at
             """,
             order_no,
             dealer_id,
@@ -252,15 +253,16 @@ async def seed_orders(dealer_map):
         for item in order_items:
             await db.execute(
                 """
-                INSERT INTO order_items (order_id, product_id, product_name, quantity, unit_price, subtotal)
-                VALUES ($1, $2, $3, $4, $5, $6)
+                INSERT INTO order_items (order_id, product_id, product_name, quantity, unit_price, subtotal, order_created_at)
+                VALUES ($1, $2, $3, $4, $5, $6, $7)
                 """,
                 order_record["id"],
                 item["product_id"],
                 item["product_name"],
                 item["quantity"],
                 item["unit_price"],
-                item["subtotal"]
+                item["subtotal"],
+                order_record["created_at"]
             )
         
         print(f"Created order: {order_no} ({order['status']}) - {len(order_items)} items, ¥{total:.2f}")
@@ -43,6 +43,7 @@ export interface OrdersParams {
   page_size?: number
   status?: string
   order_no?: string
+  search?: string
 }
 
 export interface OrderStats {